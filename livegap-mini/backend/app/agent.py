@@ -1,97 +1,32 @@
 import asyncio
 import os
 import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Callable
 
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, BrowserContext
 
-from .models import Goal, Step, SiteResult
+from .models import Goal, Step, SiteResult, VideoSettings, ResourceStats, PlanCacheStats, LLMUsage
 from .runner import Site
 from .llm import plan_next_action, classify_success
+from .success_config import get_success_url_set
 from .url_matcher import normalize_url
 from .s3_storage import upload_video_to_s3
+from .browser_pool import get_browser_pool
+from .recording import resolve_video_settings, context_options, should_keep
+from .resource_policy import install_resource_blocker
+from .page_digest import extract_page_digest
+from .settle import settle, pause
+from .playbooks import PlaybookStep, get_playbook_store
 
 
-def render_report(site: Site, goal: Goal, result: SiteResult) -> str:
-    """Produce a human-readable markdown narrative of the agent's attempt."""
-    lines: list[str] = []
-    lines.append(f"# {site.name} — Goal: {goal.value}")
-    lines.append(f"**Final Result:** {'✅ SUCCESS' if result.success else '❌ FAILURE'}")
-    lines.append("")
-    
-    # Performance summary
-    total_steps = len(result.steps or [])
-    total_time = sum(s.duration_ms or 0 for s in (result.steps or [])) / 1000.0
-    lines.append("## Summary")
-    lines.append(f"- **Steps taken:** {total_steps}")
-    if total_time > 0:
-        lines.append(f"- **Total time:** {total_time:.1f}s")
-    lines.append(f"- **Starting URL:** {site.url}")
-    lines.append("")
-    
-    # Step details
-    lines.append("## Step-by-Step Execution")
-    for step in (result.steps or []):
-        lines.append(f"### Step {step.index + 1}: {step.action}")
-        
-        # AI Reasoning
-        if step.reasoning:
-            lines.append(f"**🤖 AI Reasoning:** {step.reasoning}")
-        
-        # Target
-        if step.target:
-            lines.append(f"**Target:** `{step.target}`")
-        
-        # URL tracking
-        if step.url_before:
-            lines.append(f"**Page URL:** `{step.url_before}`")
-        if step.url_after and step.url_after != step.url_before:
-            lines.append(f"**→ Navigated to:** `{step.url_after}`")
-        
-        # Observation
-        lines.append(f"**Observation:** {step.observation or 'No observation recorded'}")
-        
-        # Timing
-        if step.duration_ms:
-            lines.append(f"**Duration:** {step.duration_ms / 1000:.2f}s")
-        
-        # Success check
-        if step.succeeded is True:
-            lines.append("**✅ Success check:** Goal achieved at this step")
-        elif step.succeeded is False:
-            lines.append("**❌ Success check:** Not at goal URL yet")
-        else:
-            lines.append("**⏳ Success check:** In progress")
-        
-        # Error details
-        if step.error_type:
-            lines.append(f"**⚠️ Error Type:** {step.error_type}")
-        
-        lines.append("")
-    
-    # Final outcome
-    lines.append("## Final Outcome")
-    if result.success:
-        lines.append("### 🎉 Success!")
-        lines.append(f"Successfully reached goal URL: `{result.reason}`")
-    else:
-        lines.append("### ⚠️ Failed to Complete Goal")
-        lines.append(f"**Reason:** {result.reason}")
-        
-        # Add suggestions for common failures
-        if "Time limit" in result.reason:
-            lines.append("")
-            lines.append("**Suggestion:** The agent ran out of time. The page may load slowly or require more steps.")
-        elif "Navigation" in result.reason:
-            lines.append("")
-            lines.append("**Suggestion:** Could not load the initial page. Check if the URL is accessible.")
-    
-    return "\n".join(lines)
-
 MAX_STEPS = int(os.getenv("LLM_MAX_STEPS", "8"))
 MAX_SECONDS = int(os.getenv("AGENT_MAX_SECONDS", "30"))  # hard wall for run duration
 NAV_TIMEOUT_MS = int(os.getenv("AGENT_NAV_TIMEOUT", "15000"))  # initial navigation cap
+# Plan the next step while a SCROLL settles; kept only if the settled page reads the same
+PIPELINE_PLANNING = os.getenv("AGENT_PIPELINE_PLANNING", "true").lower() == "true"
+SPECULATIVE_ACTIONS = ("SCROLL",)  # same-URL actions followed by a settle wait to hide the plan behind
 
 
 def _safe_text(text: str | None, limit: int = 1400) -> str:
@@ -100,243 +35,613 @@ def _safe_text(text: str | None, limit: int = 1400) -> str:
     return " ".join(text.split())[:limit]
 
 
-async def run_llm_agent_on_site(site: Site, goal: Goal) -> SiteResult:
-    """Iterative LLM-driven planning loop using real browser (Playwright)."""
-    steps: List[Step] = []
+@asynccontextmanager
+async def _browser_context(**context_options) -> AsyncIterator[BrowserContext]:
+    """Borrow a context from the shared browser pool, or launch a one-off browser when no pool runs."""
+    pool = get_browser_pool()
+    if pool is not None:
+        async with pool.context(**context_options) as context:
+            yield context
+        return
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            context = await browser.new_context(**context_options)
+            try:
+                yield context
+            finally:
+                await context.close()
+        finally:
+            await browser.close()
+
+
+async def _read_page_text(page) -> str:
+    """Planner input for the current page: the compact DOM digest, or trimmed body text as a fallback."""
+    digest = await extract_page_digest(page)
+    if digest is not None and (digest.elements or digest.headings):
+        return digest.to_text()
+    body_text = await page.locator("body").inner_text(timeout=5000)
+    return _safe_text(body_text)
+
+
+class _SuccessWatcher:
+    """Flags the moment the main frame navigates to a success URL, even mid-step."""
+
+    def __init__(self, page, site_id: str, goal: Goal):
+        self.page = page
+        self.targets = get_success_url_set(site_id, goal)
+        self.reached = asyncio.Event()
+        self.url: str | None = None
+        if self.targets:
+            page.on("framenavigated", self._on_navigated)
+
+    def _on_navigated(self, frame) -> None:
+        if frame.parent_frame is not None or self.reached.is_set():
+            return
+        if normalize_url(frame.url) in self.targets:
+            self.url = frame.url
+            self.reached.set()
+            print(f"[Agent] Success URL reached via navigation event: {frame.url}")
+
+    def detach(self) -> None:
+        if self.targets:
+            try:
+                self.page.remove_listener("framenavigated", self._on_navigated)
+            except Exception:
+                pass
+
+    async def until_success(self, coro):
+        """Await ``coro`` unless a success URL is reached first; returns None in that case."""
+        task = asyncio.ensure_future(coro)
+        if not self.targets:
+            return await task
+        waiter = asyncio.ensure_future(self.reached.wait())
+        try:
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        if task.done():
+            return task.result()
+        task.cancel()
+        return None
+
+
+class _SpeculativePlan:
+    """Next-step planner call started right after a non-navigating action, before the page settles."""
+
+    def __init__(self, task: "asyncio.Future[Dict[str, Any]]", url: str, text: str):
+        self.task = task
+        self.url = url
+        self.text = text
+        self.started = time.monotonic()
+        self.finished: float | None = None
+        task.add_done_callback(self._done)
+
+    def _done(self, _task) -> None:
+        self.finished = time.monotonic()
+
+    def matches(self, url: str, text: str) -> bool:
+        return url == self.url and text == self.text
+
+    def overlap_ms(self, needed_at: float) -> int:
+        """Planning time that ran before the plan was needed, i.e. off the critical path."""
+        end = min(self.finished or needed_at, needed_at)
+        return int((end - self.started) * 1000)
+
+    def cancel(self) -> None:
+        self.task.cancel()
+
+
+async def _start_speculative_plan(
+    page, goal: Goal, recent: List[Dict[str, Any]], action: str, target, step_index: int, deadline: float,
+) -> _SpeculativePlan | None:
+    """Ask for the plan of step ``step_index + 1`` from the page as it reads right after the action."""
+    if not PIPELINE_PLANNING or action not in SPECULATIVE_ACTIONS or step_index + 1 >= MAX_STEPS:
+        return None
+    try:
+        text = await _read_page_text(page)
+    except Exception as e:
+        print(f"[Agent] Could not read page for speculative planning: {e!r}")
+        return None
+    upcoming = recent + [{"action": action, "target": target, "failed": False}]
+    task = asyncio.ensure_future(plan_next_action(goal, page.url, text, upcoming, step_index + 1, MAX_STEPS, deadline=deadline))
+    return _SpeculativePlan(task, page.url, text)
+
+
+async def _run_goal_loop(
+    page,
+    site: Site,
+    goal: Goal,
+    steps: List[Step],
+    start_time: float,
+    landing_url: str | None = None,
+    landing_text: str | None = None,
+    on_step: Callable[[Goal, Step], None] | None = None,
+) -> tuple[bool, str]:
+    """Plan/act loop for one goal on an already-loaded page. Appends to ``steps``; returns (success, reason).
+
+    ``landing_text`` is the page text captured when the site was first loaded; it is reused as
+    the first planning input while the page is still on ``landing_url``. A recorded playbook for
+    the (site, goal) is replayed first, and the outcome updates it (see app.playbooks).
+    """
+    store = get_playbook_store()
+    playbook = await asyncio.to_thread(store.get, site.id, goal) if store else None
+    if playbook:
+        print(f"[Agent] Replaying {len(playbook.steps)} recorded step(s) for site={site.id} goal={goal.name}")
+    watcher = _SuccessWatcher(page, site.id, goal)
+    try:
+        success, reason = await _run_steps(
+            page, site, goal, steps, start_time, watcher, landing_url, landing_text,
+            replay=playbook.steps if playbook else None, on_step=on_step,
+        )
+    finally:
+        watcher.detach()
+    if store:
+        await asyncio.to_thread(store.record, site.id, goal, success, steps)
+    return success, reason
+
+
+async def _run_steps(
+    page,
+    site: Site,
+    goal: Goal,
+    steps: List[Step],
+    start_time: float,
+    watcher: _SuccessWatcher,
+    landing_url: str | None,
+    landing_text: str | None,
+    replay: List[PlaybookStep] | None = None,
+    on_step: Callable[[Goal, Step], None] | None = None,
+) -> tuple[bool, str]:
     success = False
+    replay = list(replay or [])  # recorded steps still to replay before planning
     reason = "Not finished"
-    video_url = None
+    recent: List[Dict[str, Any]] = []
+    last_scroll_amt = 800
+    alternatives: List[Dict[str, Any]] = []  # untried candidates from the last planner call
+    candidate_rank = 0
+    prev_text: str | None = None
+    speculative: _SpeculativePlan | None = None  # next plan requested while the last action settles
 
-    api_present = bool(os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_KEY"))
-    print(f"[Agent] Start site_id={site.id} goal={goal.value} openai_key_present={api_present}")
+    try:
+        for i in range(MAX_STEPS):
+            # A late navigation from the previous step may already have reached the goal
+            if watcher.reached.is_set():
+                success = True
+                reason = normalize_url(watcher.url)
+                if steps:
+                    steps[-1].succeeded = True
+                    steps[-1].done = True
+                break
 
-    videos_dir = Path(__file__).with_name("videos")
-    videos_dir.mkdir(exist_ok=True)
+            # Enforce global time limit prior to planning next action
+            elapsed = time.monotonic() - start_time
+            if elapsed >= MAX_SECONDS:
+                reason = f"Time limit ({MAX_SECONDS}s) reached"
+                print(f"[Agent] Halting at step {i} due to time limit; elapsed={elapsed:.2f}s")
+                break
 
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(record_video_dir=str(videos_dir), viewport={"width":1280,"height":900})
-            page = await context.new_page()
-            start_time = time.monotonic()
-            try:
-                await page.goto(site.url, timeout=NAV_TIMEOUT_MS)
-            except Exception as _nav_err:
-                print(f"[Agent] Navigation issue: {_nav_err.__class__.__name__}: {_nav_err}")
-                if time.monotonic() - start_time >= MAX_SECONDS:
-                    reason = f"Time limit ({MAX_SECONDS}s) reached during initial navigation"
-                    success = False
-                    result_obj = SiteResult(
-                        site_id=site.id,
-                        site_name=site.name,
-                        url=site.url,
-                        success=success,
-                        reason=reason,
-                        video_url=None,
-                        steps=steps or None,
-                    )
-                    try:
-                        result_obj.report = render_report(site, goal, result_obj)
-                    except Exception:
-                        pass
-                    return result_obj
-
-            recent: List[Dict[str, Any]] = []
-            last_scroll_amt = 800
-
-            for i in range(MAX_STEPS):
-                # Enforce global time limit prior to planning next action
-                elapsed = time.monotonic() - start_time
-                if elapsed >= MAX_SECONDS:
-                    reason = f"Time limit ({MAX_SECONDS}s) reached"
-                    print(f"[Agent] Halting at step {i} due to time limit; elapsed={elapsed:.2f}s")
-                    break
-                
-                # Capture state before action
-                step_start_time = time.monotonic()
-                url_before = page.url
-                
-                body_text = await page.locator("body").inner_text(timeout=5000)
-                body_text = _safe_text(body_text)
-
-                plan = plan_next_action(goal, page.url, body_text, recent, i, MAX_STEPS)
-                action = (plan.get("action") or "SCROLL").upper()
-                target = plan.get("target")
-                plan_reason = plan.get("reason") or ""
-
-                observation = ""
-                error_type = None
-
-                if action == "CLICK":
-                    locator = page.get_by_text(str(target), exact=False).first if target else None
-                    try:
-                        if locator:
-                            await locator.scroll_into_view_if_needed()
-                            box = await locator.bounding_box()
-                            if box:
-                                x = box["x"] + box["width"] / 2
-                                y = box["y"] + box["height"] / 2
-                                await page.mouse.move(x, y)
-                                await page.wait_for_timeout(150)
-                                # Temporary outline highlight
-                                try:
-                                    await locator.evaluate("el => { el.style.outline = '3px solid red'; el.style.transition='outline 0.25s'; setTimeout(()=>{el.style.outline='';},800); }")
-                                except Exception:
-                                    pass
-                                await page.mouse.down()
-                                await page.mouse.up()
-                            else:
-                                # Fallback if no bounding box
-                                await locator.click(timeout=4000)
-                            await page.wait_for_timeout(600)
-                            observation = f"Clicked '{str(target)[:50]}'"
-                        else:
-                            observation = "CLICK failed: no target locator"
-                            error_type = "ElementNotFound"
-                    except Exception as e:
-                        observation = f"CLICK failed: {e.__class__.__name__}"
-                        error_type = e.__class__.__name__
-                elif action == "SCROLL":
-                    try:
-                        amt = int(target) if target and str(target).isdigit() else last_scroll_amt
-                    except Exception:
-                        amt = last_scroll_amt
-                    if steps and steps[-1].action == "SCROLL":
-                        amt = int(amt * 1.4)  # escalate repeated scroll
-                    last_scroll_amt = amt
-                    await page.mouse.wheel(0, amt)
-                    await page.wait_for_timeout(300)
-                    observation = f"Scrolled {amt}px"
-                elif action == "TYPE":
-                    # Enhanced TYPE support with highlight and cursor movement
-                    try:
-                        inputs = page.locator("input")
-                        chosen = None
-                        count = await inputs.count()
-                        if count:
-                            # Attempt placeholder match first
-                            for idx in range(min(count, 12)):
-                                handle = inputs.nth(idx)
-                                try:
-                                    placeholder = await handle.get_attribute("placeholder")
-                                except Exception:
-                                    placeholder = None
-                                if placeholder and target and str(target).lower() in placeholder.lower():
-                                    chosen = handle
-                                    break
-                            if chosen is None:
-                                chosen = inputs.first
-                        if chosen and await chosen.count() > 0:
-                            await chosen.scroll_into_view_if_needed()
-                            box = await chosen.bounding_box()
-                            if box:
-                                x = box["x"] + box["width"] / 2
-                                y = box["y"] + box["height"] / 2
-                                await page.mouse.move(x, y)
-                                await page.wait_for_timeout(120)
+            # Capture state before action
+            step_start_time = time.monotonic()
+            url_before = page.url
+            overlap_ms = None
+            speculation = None
+
+            last = steps[-1] if steps else None
+            last_failed = last is not None and last.error_type is not None
+            if replay and ((last_failed and last.replayed) or not replay[0].matches(page.url)):
+                print(f"[Agent] step={i} page diverged from the recorded path at {page.url}; planning from here")
+                replay = []
+            if replay:
+                recorded = replay.pop(0)
+                plan = {"action": recorded.action, "target": recorded.target, "reason": "Replaying recorded path", "replayed": True}
+                alternatives, candidate_rank, prev_text = [], 0, None
+            else:
+                if i == 0 and landing_text is not None and page.url == landing_url:
+                    body_text = landing_text
+                elif alternatives and last_failed and prev_text is not None:
+                    body_text = prev_text  # the failed action left the page as it was
+                else:
+                    body_text = await _read_page_text(page)
+
+                # A CLICK that threw, or left URL and page text unchanged, moves on to the next candidate locally
+                no_effect = last is not None and last.action == "CLICK" and (
+                    last_failed or (page.url == last.url_before and body_text == prev_text)
+                )
+                if alternatives and no_effect:
+                    plan = alternatives.pop(0)
+                    candidate_rank += 1
+                    print(f"[Agent] step={i} previous CLICK had no effect; trying candidate #{candidate_rank + 1} without replanning")
+                else:
+                    pending, speculative = speculative, None
+                    if pending is not None and pending.matches(page.url, body_text):
+                        overlap_ms = pending.overlap_ms(time.monotonic())
+                        speculation = "used"
+                        planning = pending.task
+                        print(f"[Agent] step={i} using the plan requested while the last action settled (overlap {overlap_ms}ms)")
+                    else:
+                        if pending is not None:
+                            pending.cancel()
+                            speculation = "discarded"
+                            print(f"[Agent] step={i} page changed while settling; discarding the speculative plan")
+                        planning = plan_next_action(
+                            goal, page.url, body_text, recent, i, MAX_STEPS, deadline=start_time + MAX_SECONDS,
+                        )
+                    plan = await watcher.until_success(planning)
+                    if plan is None:
+                        continue  # success URL reached while planning; handled at the top of the loop
+                    alternatives = list(plan.get("alternatives") or [])
+                    candidate_rank = 0
+                prev_text = body_text
+            if speculative is not None:
+                speculative.cancel()  # a replayed or alternative step replaced it
+                speculative = None
+            action = (plan.get("action") or "SCROLL").upper()
+            target = plan.get("target")
+            plan_reason = plan.get("reason") or ""
+
+            observation = ""
+            error_type = None
+            settle_ms = None
+
+            if action == "CLICK":
+                locator = page.get_by_text(str(target), exact=False).first if target else None
+                try:
+                    if locator:
+                        await locator.scroll_into_view_if_needed()
+                        box = await locator.bounding_box()
+                        if box:
+                            x = box["x"] + box["width"] / 2
+                            y = box["y"] + box["height"] / 2
+                            await page.mouse.move(x, y)
+                            await pause(150, watcher.reached)
+                            # Temporary outline highlight
                             try:
-                                await chosen.evaluate("el => { el.style.outline='3px solid blue'; el.style.transition='outline 0.25s'; setTimeout(()=>{el.style.outline='';},1000); }")
+                                await locator.evaluate("el => { el.style.outline = '3px solid red'; el.style.transition='outline 0.25s'; setTimeout(()=>{el.style.outline='';},800); }")
                             except Exception:
                                 pass
-                            await chosen.fill(str(target)[:80])
-                            observation = f"Typed '{str(target)[:30]}'"
+                            await page.mouse.down()
+                            await page.mouse.up()
                         else:
-                            observation = "No input found"
-                            error_type = "ElementNotFound"
-                    except Exception as e:
-                        observation = f"TYPE failed: {e.__class__.__name__}"
-                        error_type = e.__class__.__name__
-                elif action == "DONE":
-                    reason = plan_reason or "Planner indicated DONE"
-                    url_after = page.url
-                    duration_ms = int((time.monotonic() - step_start_time) * 1000)
-                    steps.append(Step(
-                        index=i, 
-                        action=action, 
-                        target=target, 
-                        observation=reason, 
-                        reasoning=plan_reason, 
-                        succeeded=None, 
-                        done=True,
-                        url_before=url_before,
-                        url_after=url_after,
-                        duration_ms=duration_ms
-                    ))
-                    print(f"[Agent] step={i} action={action} target={target} done=True")
-                    break
-                else:
-                    observation = f"Unknown action {action}; treating as NOOP"
-
-                # Capture state after action
+                            # Fallback if no bounding box
+                            await locator.click(timeout=4000)
+                        settle_ms = await settle(page, url_before, 600, watcher.reached)
+                        observation = f"Clicked '{str(target)[:50]}'"
+                    else:
+                        observation = "CLICK failed: no target locator"
+                        error_type = "ElementNotFound"
+                except Exception as e:
+                    observation = f"CLICK failed: {e.__class__.__name__}"
+                    error_type = e.__class__.__name__
+            elif action == "SCROLL":
+                try:
+                    amt = int(target) if target and str(target).isdigit() else last_scroll_amt
+                except Exception:
+                    amt = last_scroll_amt
+                if steps and steps[-1].action == "SCROLL":
+                    amt = int(amt * 1.4)  # escalate repeated scroll
+                last_scroll_amt = amt
+                await page.mouse.wheel(0, amt)
+                if not replay:
+                    speculative = await _start_speculative_plan(page, goal, recent, action, target, i, start_time + MAX_SECONDS)
+                settle_ms = await settle(page, url_before, 300, watcher.reached)
+                observation = f"Scrolled {amt}px"
+            elif action == "TYPE":
+                # Enhanced TYPE support with highlight and cursor movement
+                try:
+                    inputs = page.locator("input")
+                    chosen = None
+                    count = await inputs.count()
+                    if count:
+                        # Attempt placeholder match first
+                        for idx in range(min(count, 12)):
+                            handle = inputs.nth(idx)
+                            try:
+                                placeholder = await handle.get_attribute("placeholder")
+                            except Exception:
+                                placeholder = None
+                            if placeholder and target and str(target).lower() in placeholder.lower():
+                                chosen = handle
+                                break
+                        if chosen is None:
+                            chosen = inputs.first
+                    if chosen and await chosen.count() > 0:
+                        await chosen.scroll_into_view_if_needed()
+                        box = await chosen.bounding_box()
+                        if box:
+                            x = box["x"] + box["width"] / 2
+                            y = box["y"] + box["height"] / 2
+                            await page.mouse.move(x, y)
+                            await pause(120, watcher.reached)
+                        try:
+                            await chosen.evaluate("el => { el.style.outline='3px solid blue'; el.style.transition='outline 0.25s'; setTimeout(()=>{el.style.outline='';},1000); }")
+                        except Exception:
+                            pass
+                        await chosen.fill(str(target)[:80])
+                        observation = f"Typed '{str(target)[:30]}'"
+                    else:
+                        observation = "No input found"
+                        error_type = "ElementNotFound"
+                except Exception as e:
+                    observation = f"TYPE failed: {e.__class__.__name__}"
+                    error_type = e.__class__.__name__
+            elif action == "DONE":
+                reason = plan_reason or "Planner indicated DONE"
                 url_after = page.url
                 duration_ms = int((time.monotonic() - step_start_time) * 1000)
-                
-                # Success heuristic mid-loop
-                success_mid = await classify_success(page, goal, site.id)
-                step_obj = Step(
+                steps.append(Step(
                     index=i, 
                     action=action, 
                     target=target, 
-                    observation=observation or plan_reason, 
+                    observation=reason, 
                     reasoning=plan_reason, 
-                    succeeded=success_mid, 
-                    done=success_mid,
+                    succeeded=None, 
+                    done=True,
                     url_before=url_before,
                     url_after=url_after,
                     duration_ms=duration_ms,
-                    error_type=error_type
-                )
-                steps.append(step_obj)
-                print(f"[Agent] step={i} action={action} target={target} success={success_mid}")
-                if success_mid:
-                    success = True
-                    reason = normalize_url(page.url)
-                    break
-
-            # Capture video path and upload to S3
-            # NO local fallback - S3 upload is required
-            try:
-                if page.video:
-                    raw = await page.video.path()
-                    video_filename = Path(raw).name
-                    
-                    # Upload to S3 and get CloudFront URL
-                    cloudfront_url = upload_video_to_s3(raw, video_filename)
-                    
-                    if cloudfront_url:
-                        # Use CloudFront URL directly
-                        video_url = cloudfront_url
-                    else:
-                        # S3 upload failed - no video available
-                        print(f"[Agent] WARNING: S3 upload failed for {video_filename}, no video available")
-                        video_url = None
-            except Exception as e:
-                print(f"[Agent] Video handling error: {e}")
-                video_url = None
+                    plan_cached=plan.get("cached"),
+                    candidate_rank=candidate_rank,
+                    llm=plan.get("llm"),
+                    replayed=plan.get("replayed"),
+                    overlap_ms=overlap_ms,
+                    speculation=speculation,
+                ))
+                if on_step:
+                    on_step(goal, steps[-1])
+                print(f"[Agent] step={i} action={action} target={target} done=True")
+                break
+            else:
+                observation = f"Unknown action {action}; treating as NOOP"
 
-            await context.close()
-            await browser.close()
+            # Capture state after action
+            url_after = page.url
+            duration_ms = int((time.monotonic() - step_start_time) * 1000)
+
+            # Success heuristic mid-loop
+            success_mid = watcher.reached.is_set() or await classify_success(page, goal, site.id)
+            step_obj = Step(
+                index=i, 
+                action=action, 
+                target=target, 
+                observation=observation or plan_reason, 
+                reasoning=plan_reason, 
+                succeeded=success_mid, 
+                done=success_mid,
+                url_before=url_before,
+                url_after=url_after,
+                duration_ms=duration_ms,
+                error_type=error_type,
+                settle_ms=settle_ms,
+                plan_cached=plan.get("cached"),
+                candidate_rank=candidate_rank,
+                llm=plan.get("llm"),
+                replayed=plan.get("replayed"),
+                overlap_ms=overlap_ms,
+                speculation=speculation,
+            )
+            steps.append(step_obj)
+            if on_step:
+                on_step(goal, step_obj)
+            recent.append({"action": action, "target": target, "failed": error_type is not None})
+            print(f"[Agent] step={i} action={action} target={target} settle_ms={settle_ms} success={success_mid}")
+            if success_mid:
+                success = True
+                reason = normalize_url(watcher.url or page.url)
+                break
+    finally:
+        if speculative is not None:
+            speculative.cancel()  # also when the run is cancelled mid-step
+    return success, reason
+
+
+async def _upload_video(video) -> str | None:
+    """Upload a finished recording to S3. NO local fallback - S3 upload is required."""
+    if not video:
+        return None
+    try:
+        raw = await video.path()
+        video_filename = Path(raw).name
+
+        # Upload to S3 and get CloudFront URL (boto3 is blocking, keep it off the event loop)
+        cloudfront_url = await asyncio.to_thread(upload_video_to_s3, raw, video_filename)
+        if not cloudfront_url:
+            # S3 upload failed - no video available
+            print(f"[Agent] WARNING: S3 upload failed for {video_filename}, no video available")
+        return cloudfront_url
+    except Exception as e:
+        print(f"[Agent] Video handling error: {e}")
+        return None
+
+
+async def _discard_video(video) -> None:
+    if not video:
+        return
+    try:
+        await video.delete()
     except Exception as e:
-        reason = f"Agent crashed: {e.__class__.__name__}: {e}" if reason == "Not finished" else reason
-        success = False
+        print(f"[Agent] Could not delete discarded video: {e!r}")
 
+
+def _build_result(
+    site: Site,
+    goal: Goal,
+    steps: List[Step],
+    success: bool,
+    reason: str,
+    video_url: str | None,
+    resources: ResourceStats | None = None,
+) -> SiteResult:
     if not success and reason == "Not finished":
         # Distinguish cause: time vs steps (time handled earlier)
         reason = "Max steps exhausted without success"
 
+    cache_flags = [s.plan_cached for s in steps or [] if s.plan_cached is not None]
+    plan_cache = PlanCacheStats(
+        hits=sum(1 for f in cache_flags if f),
+        misses=sum(1 for f in cache_flags if not f),
+    ) if cache_flags else None
+    llm_calls = [s.llm for s in steps or [] if s.llm is not None]
+    llm_usage = LLMUsage.from_calls(
+        llm_calls,
+        step_ms=sum(s.duration_ms or 0 for s in steps or []),
+        overlap_ms=sum(s.overlap_ms or 0 for s in steps or []),
+    ) if llm_calls else None
+
     result_obj = SiteResult(
         site_id=site.id,
         site_name=site.name,
         url=site.url,
+        goal=goal,
         success=success,
         reason=reason,
         video_url=video_url,
         steps=steps or None,
+        resources=resources,
+        plan_cache=plan_cache,
+        llm_usage=llm_usage,
     )
-    try:
-        result_obj.report = render_report(site, goal, result_obj)
-    except Exception as _e:
-        print(f"[Agent] Failed to render report for {site.id}: {_e!r}")
     return result_obj
 
-__all__ = ["run_llm_agent_on_site"]
+
+# Headers describing the original transfer; Playwright hands back the decoded body and the cookies are already set
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+
+async def _capture_document(response) -> Dict[str, Any] | None:
+    """Status, headers and body of a loaded document, in the form ``route.fulfill`` takes."""
+    if response is None or not response.ok:
+        return None
+    try:
+        body = await response.body()
+    except Exception as e:
+        print(f"[Agent] Could not keep landing document: {e!r}")
+        return None
+    headers = {k: v for k, v in response.headers.items() if k.lower() not in _TRANSFER_HEADERS}
+    return {"status": response.status, "headers": headers, "body": body}
+
+
+async def _open_landing(page, landing_url: str, document: Dict[str, Any] | None) -> None:
+    """Navigate ``page`` to the landing URL, answering its document request from ``document`` when kept."""
+    if document is not None:
+        async def serve(route) -> None:
+            if route.request.resource_type == "document":
+                await route.fulfill(**document)
+            else:
+                await route.fallback()
+
+        await page.route(lambda url: url == landing_url, serve, times=1)
+    try:
+        await page.goto(landing_url, timeout=NAV_TIMEOUT_MS)
+    except Exception as _nav_err:
+        print(f"[Agent] Navigation issue: {_nav_err.__class__.__name__}: {_nav_err}")
+
+
+async def run_llm_agent_matrix_on_site(
+    site: Site,
+    goals: List[Goal],
+    video: VideoSettings | None = None,
+    on_step: Callable[[Goal, Step], None] | None = None,
+) -> List[SiteResult]:
+    """Check several goals on one site in one browser context.
+
+    The landing page is loaded once: its URL, text and document are kept and the first goal
+    runs on that tab. Every further goal runs in a fresh tab of the same context (its own video;
+    cookies and storage carry over) whose landing document is served from the kept copy, so only
+    its scripts and stylesheets go back to the network, and whose first planning step reuses the
+    landing text. Results come back in ``goals`` order.
+    ``video`` overrides the deployment recording policy (see app.recording); ``on_step`` is
+    called with every step as soon as it is recorded.
+    """
+    api_present = bool(os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_KEY"))
+    print(f"[Agent] Start site_id={site.id} goals={[g.name for g in goals]} openai_key_present={api_present}")
+
+    video_settings = resolve_video_settings(video)
+    videos_dir = Path(__file__).with_name("videos")
+
+    steps_by_goal: Dict[Goal, List[Step]] = {g: [] for g in goals}
+    outcomes: Dict[Goal, tuple[bool, str]] = {}
+    videos: Dict[Goal, Any] = {}
+    resources: Dict[Goal, ResourceStats] = {}
+    crash_reason = "Not finished"
+
+    try:
+        async with _browser_context(**context_options(video_settings, videos_dir)) as context:
+            # Abort images/media/fonts and third-party trackers before the first request goes out
+            blocker = await install_resource_blocker(context, site.id)
+            blocked_start = blocker.snapshot() if blocker else None
+            landing_page = await context.new_page()
+            start_time = time.monotonic()
+            landing_response = None
+            try:
+                landing_response = await landing_page.goto(site.url, timeout=NAV_TIMEOUT_MS)
+            except Exception as _nav_err:
+                print(f"[Agent] Navigation issue: {_nav_err.__class__.__name__}: {_nav_err}")
+                if time.monotonic() - start_time >= MAX_SECONDS:
+                    reason = f"Time limit ({MAX_SECONDS}s) reached during initial navigation"
+                    return [_build_result(site, g, [], False, reason, None) for g in goals]
+
+            # Snapshot of the landing state shared by every goal's first planning step
+            landing_url = landing_page.url
+            try:
+                landing_text = await _read_page_text(landing_page)
+            except Exception as e:
+                print(f"[Agent] Could not snapshot landing page: {e!r}")
+                landing_text = None
+            landing_document = await _capture_document(landing_response) if len(goals) > 1 else None
+
+            for idx, goal in enumerate(goals):
+                if idx == 0:
+                    page, goal_start = landing_page, start_time
+                else:
+                    page, goal_start = await context.new_page(), time.monotonic()
+                    await _open_landing(page, landing_url, landing_document)
+                videos[goal] = page.video
+                try:
+                    outcomes[goal] = await _run_goal_loop(
+                        page, site, goal, steps_by_goal[goal], goal_start,
+                        landing_url=landing_url, landing_text=landing_text, on_step=on_step,
+                    )
+                except Exception as e:
+                    outcomes[goal] = (False, f"Agent crashed: {e.__class__.__name__}: {e}")
+                if blocker:
+                    resources[goal] = blocker.stats_since(blocked_start)
+                    blocked_start = blocker.snapshot()
+                if len(goals) > 1:
+                    # Closing the tab finalizes its video before the next goal starts
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+    except asyncio.CancelledError:
+        # The run was cancelled: the context is closed by now; drop recordings instead of uploading them
+        for video in videos.values():
+            await _discard_video(video)
+        raise
+    except Exception as e:
+        crash_reason = f"Agent crashed: {e.__class__.__name__}: {e}"
+
+    results: List[SiteResult] = []
+    for goal in goals:
+        success, reason = outcomes.get(goal, (False, crash_reason))
+        # Videos are uploaded once the context is closed and the files are complete
+        video_url = None
+        if goal in outcomes and should_keep(video_settings, success):
+            video_url = await _upload_video(videos.get(goal))
+        else:
+            await _discard_video(videos.get(goal))
+        results.append(_build_result(site, goal, steps_by_goal[goal], success, reason, video_url, resources.get(goal)))
+    return results
+
+
+async def run_llm_agent_on_site(
+    site: Site,
+    goal: Goal,
+    video: VideoSettings | None = None,
+    on_step: Callable[[Goal, Step], None] | None = None,
+) -> SiteResult:
+    """Iterative LLM-driven planning loop using real browser (Playwright)."""
+    results = await run_llm_agent_matrix_on_site(site, [goal], video=video, on_step=on_step)
+    return results[0]
+
+__all__ = ["run_llm_agent_on_site", "run_llm_agent_matrix_on_site"]
@@ -0,0 +1,83 @@
+"""
+Planner latency benchmark against the local fake endpoint.
+
+Starts ``app.fake_llm`` on a loopback port and times ``plan_next_action``
+with buffered and streamed completions:
+
+  python -m app.bench_planner --calls 20 --token-ms 15 --trailing-tokens 40
+
+``--token-ms`` is the simulated generation time per token and
+``--trailing-tokens`` how much the model writes after its JSON answer.
+Buffered calls wait for every token; streamed calls return as soon as the
+answer object closes and drop the rest.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import time
+from typing import Dict, List
+
+import uvicorn
+
+from . import fake_llm, llm, plan_cache
+from .models import Goal
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _time_calls(calls: int, stream: bool) -> Dict[str, float]:
+    llm.OPENAI_STREAM = stream
+    fake_llm.fake.tokens_sent = 0
+    samples: List[float] = []
+    for i in range(calls):
+        started = time.monotonic()
+        plan = await llm.plan_next_action(Goal.PRICING, f"https://example.com/{i}", "[link] Pricing -> /pricing", [], 0, 8)
+        samples.append((time.monotonic() - started) * 1000)
+        if plan["llm"].fallback:
+            raise RuntimeError("planner fell back to the heuristic; is the fake endpoint up?")
+    samples.sort()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "tokens_read": fake_llm.fake.tokens_sent / calls,
+    }
+
+
+async def run(calls: int, token_ms: int, trailing_tokens: int) -> Dict[str, Dict[str, float]]:
+    port = _free_port()
+    fake_llm.fake.token_ms = token_ms
+    fake_llm.fake.trailing = " ..." * trailing_tokens  # 4 characters = one simulated token
+    os.environ["OPENAI_ENDPOINT"] = f"http://127.0.0.1:{port}/v1/chat/completions"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    plan_cache.PLAN_CACHE_ENABLED = False  # every call must reach the endpoint
+    server = uvicorn.Server(uvicorn.Config(fake_llm.app, host="127.0.0.1", port=port, log_level="warning"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        return {mode: await _time_calls(calls, mode == "streamed") for mode in ("buffered", "streamed")}
+    finally:
+        await llm.aclose_http_client()
+        server.should_exit = True
+        await serve
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Planner time-to-action, buffered vs streamed")
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--token-ms", type=int, default=15)
+    parser.add_argument("--trailing-tokens", type=int, default=40)
+    args = parser.parse_args()
+    results = asyncio.run(run(args.calls, args.token_ms, args.trailing_tokens))
+    for mode, r in results.items():
+        print(f"[Bench] {mode:<8} p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms tokens_read/call={r['tokens_read']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Process-wide Chromium pool handing out fresh BrowserContexts.
+
+Launching Chromium is the largest fixed cost of checking a site, so the API
+starts one pool in its lifespan and every agent run borrows an isolated
+context from it instead of launching its own browser. A browser is retired
+after it has served BROWSER_MAX_CONTEXTS contexts, or once its process tree
+grows past BROWSER_MAX_MEMORY_MB; retired browsers are closed as soon as their
+last context is released.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from playwright.async_api import async_playwright, Browser, BrowserContext
+
+try:  # memory-based recycling is skipped when psutil is unavailable
+    import psutil
+except ImportError:  # pragma: no cover - depends on environment
+    psutil = None
+
+BROWSER_POOL_ENABLED = os.getenv("BROWSER_POOL_ENABLED", "true").lower() == "true"
+BROWSER_MAX_CONTEXTS = int(os.getenv("BROWSER_MAX_CONTEXTS", "40"))
+BROWSER_MAX_MEMORY_MB = int(os.getenv("BROWSER_MAX_MEMORY_MB", "1500"))  # 0 disables the check
+
+
+def _chromium_pids() -> Set[int]:
+    """PIDs of Chromium processes spawned (directly or not) by this process."""
+    if psutil is None:
+        return set()
+    pids: Set[int] = set()
+    try:
+        for child in psutil.Process().children(recursive=True):
+            try:
+                name = child.name().lower()
+            except psutil.Error:
+                continue
+            if "chrom" in name or "headless_shell" in name:
+                pids.add(child.pid)
+    except psutil.Error:
+        pass
+    return pids
+
+
+def _tree_rss_mb(root_pids: Set[int]) -> float:
+    """Resident memory of the given processes and all their descendants, each counted once.
+
+    ``root_pids`` holds every Chromium process present at launch, so most of them are also
+    descendants of another one (renderers under the zygote under the browser).
+    """
+    if psutil is None or not root_pids:
+        return 0.0
+    procs: Dict[int, Any] = {}
+    for pid in root_pids:
+        try:
+            root = psutil.Process(pid)
+            procs.setdefault(root.pid, root)
+            for child in root.children(recursive=True):
+                procs.setdefault(child.pid, child)
+        except psutil.Error:
+            continue
+    total = 0
+    for proc in procs.values():
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+
+@dataclass
+class _PooledBrowser:
+    browser: Browser
+    pids: Set[int] = field(default_factory=set)
+    served: int = 0  # contexts handed out over the browser's lifetime
+    active: int = 0  # contexts currently open
+    retired: bool = False
+
+
+class BrowserPool:
+    """Shares Chromium processes across sites and runs."""
+
+    def __init__(
+        self,
+        max_contexts: int = BROWSER_MAX_CONTEXTS,
+        max_memory_mb: int = BROWSER_MAX_MEMORY_MB,
+        launch_options: Optional[Dict[str, Any]] = None,
+    ):
+        self.max_contexts = max_contexts
+        self.max_memory_mb = max_memory_mb
+        self.launch_options = launch_options or {"headless": True}
+        self._playwright_cm = None
+        self._playwright = None
+        self._current: Optional[_PooledBrowser] = None
+        self._browsers: list[_PooledBrowser] = []
+        self._lock = asyncio.Lock()
+        self.launched = 0
+        self.recycled = 0
+
+    @property
+    def started(self) -> bool:
+        return self._playwright is not None
+
+    async def start(self) -> None:
+        """Start Playwright and launch the first browser."""
+        if self.started:
+            return
+        self._playwright_cm = async_playwright()
+        self._playwright = await self._playwright_cm.__aenter__()
+        async with self._lock:
+            await self._launch()
+
+    async def stop(self) -> None:
+        """Close every browser and shut Playwright down."""
+        async with self._lock:
+            for entry in list(self._browsers):
+                await self._close(entry)
+            self._current = None
+        if self._playwright_cm is not None:
+            try:
+                await self._playwright_cm.__aexit__(None, None, None)
+            finally:
+                self._playwright_cm = None
+                self._playwright = None
+
+    async def _launch(self) -> _PooledBrowser:
+        before = _chromium_pids()
+        browser = await self._playwright.chromium.launch(**self.launch_options)
+        entry = _PooledBrowser(browser=browser, pids=_chromium_pids() - before)
+        browser.on("disconnected", lambda _b: self._retire(entry))
+        self._browsers.append(entry)
+        self._current = entry
+        self.launched += 1
+        print(f"[BrowserPool] Launched browser #{self.launched} pids={sorted(entry.pids)}")
+        return entry
+
+    async def _close(self, entry: _PooledBrowser) -> None:
+        if entry in self._browsers:
+            self._browsers.remove(entry)
+        try:
+            await entry.browser.close()
+        except Exception as e:
+            print(f"[BrowserPool] Error closing browser: {e!r}")
+
+    def _retire(self, entry: _PooledBrowser) -> None:
+        """Stop handing out contexts from ``entry`` (also called when it disconnects or is closed)."""
+        if entry.retired:
+            return
+        entry.retired = True
+        if self._current is entry:
+            self._current = None
+
+    def _should_recycle(self, entry: _PooledBrowser) -> bool:
+        if not entry.browser.is_connected():
+            return True
+        if self.max_contexts and entry.served >= self.max_contexts:
+            return True
+        if self.max_memory_mb and entry.served:
+            rss = _tree_rss_mb(entry.pids)
+            if rss >= self.max_memory_mb:
+                print(f"[BrowserPool] Browser memory {rss:.0f}MB >= {self.max_memory_mb}MB; recycling")
+                return True
+        return False
+
+    async def _acquire(self) -> _PooledBrowser:
+        async with self._lock:
+            entry = self._current
+            if entry is not None and self._should_recycle(entry):
+                self._retire(entry)
+                self.recycled += 1
+                if entry.active == 0:
+                    await self._close(entry)
+                entry = None
+            if entry is None:
+                entry = await self._launch()
+            entry.served += 1
+            entry.active += 1
+            return entry
+
+    async def _release(self, entry: _PooledBrowser) -> None:
+        async with self._lock:
+            entry.active -= 1
+            if entry.retired and entry.active <= 0:
+                await self._close(entry)
+
+    @asynccontextmanager
+    async def context(self, **context_options) -> AsyncIterator[BrowserContext]:
+        """Yield a fresh BrowserContext; it is closed when the block exits."""
+        if not self.started:
+            raise RuntimeError("BrowserPool is not started")
+        entry = await self._acquire()
+        try:
+            context = await entry.browser.new_context(**context_options)
+            try:
+                yield context
+            finally:
+                try:
+                    await context.close()
+                except Exception as e:
+                    print(f"[BrowserPool] Error closing context: {e!r}")
+        finally:
+            await self._release(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "browsers": len(self._browsers),
+            "active_contexts": sum(b.active for b in self._browsers),
+            "launched": self.launched,
+            "recycled": self.recycled,
+        }
+
+
+_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> Optional[BrowserPool]:
+    """The running process-wide pool, or None when agents launch their own browser."""
+    if _pool is not None and _pool.started:
+        return _pool
+    return None
+
+
+async def start_browser_pool() -> Optional[BrowserPool]:
+    """Start the shared pool; failures are logged and agents fall back to per-site launches."""
+    global _pool
+    if not BROWSER_POOL_ENABLED:
+        print("[BrowserPool] Disabled (BROWSER_POOL_ENABLED=false)")
+        return None
+    if _pool is not None and _pool.started:
+        return _pool
+    pool = BrowserPool()
+    try:
+        await pool.start()
+    except Exception as e:
+        print(f"[BrowserPool] Could not start browser pool: {e!r}; falling back to per-site browsers")
+        try:
+            await pool.stop()
+        except Exception:
+            pass
+        return None
+    _pool = pool
+    return pool
+
+
+async def stop_browser_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.stop()
+
+
+__all__ = ["BrowserPool", "get_browser_pool", "start_browser_pool", "stop_browser_pool"]
@@ -0,0 +1,135 @@
+"""
+Local stand-in for the chat-completions endpoint, with injectable faults.
+
+Run it and point the agent at it:
+
+  python -m app.fake_llm --port 8099
+  OPENAI_ENDPOINT=http://127.0.0.1:8099/v1/chat/completions OPENAI_API_KEY=fake ...
+
+Every request answers with ``content`` after ``latency_ms``, failing with
+``error_status`` at ``error_rate``. Queued faults (``POST /_fake/faults`` or
+``FakeLLM.push``) are consumed one per request first, e.g.
+``{"status": 429, "retry_after": 1}`` or ``{"delay_ms": 5000}``. Tests mount
+``app`` through ``httpx.ASGITransport`` and need no network.
+
+Generation is simulated at ``token_ms`` per 4-character token, followed by
+``trailing`` text the model keeps writing after its answer. Requests with
+``"stream": true`` get server-sent chunks as the tokens are "generated";
+``tokens_sent`` shows how much of a stream the client actually read.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+DEFAULT_CONTENT = json.dumps({"candidates": [{"action": "SCROLL", "target": "800", "reason": "Fake planner"}]})
+
+
+class FakeLLM:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.latency_ms = int(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+        self.error_rate = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+        self.error_status = int(os.getenv("FAKE_LLM_ERROR_STATUS", "503"))
+        self.token_ms = int(os.getenv("FAKE_LLM_TOKEN_MS", "0"))
+        self.content = DEFAULT_CONTENT
+        self.trailing = ""
+        self.faults: Deque[Dict[str, Any]] = deque()
+        self.requests = 0
+        self.tokens_sent = 0
+
+    def push(self, *faults: Dict[str, Any]) -> None:
+        self.faults.extend(faults)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "queued_faults": len(self.faults), "tokens_sent": self.tokens_sent}
+
+    @staticmethod
+    def tokens(text: str) -> List[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    async def _stream(self, pieces: List[str], usage: Dict[str, int] | None):
+        for piece in pieces:
+            if self.token_ms:
+                await asyncio.sleep(self.token_ms / 1000)
+            self.tokens_sent += 1
+            chunk = {"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        if usage is not None:
+            yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def respond(self, body: Dict[str, Any]) -> Response:
+        self.requests += 1
+        fault = self.faults.popleft() if self.faults else {}
+        delay_ms = fault.get("delay_ms", self.latency_ms)
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        status = fault.get("status")
+        if status is None and self.error_rate and random.random() < self.error_rate:
+            status = self.error_status
+        if status and status >= 400:
+            headers = {"Retry-After": str(fault["retry_after"])} if "retry_after" in fault else None
+            return JSONResponse({"error": {"message": f"fake error {status}"}}, status_code=status, headers=headers)
+        content = fault.get("content", self.content)
+        pieces = self.tokens(content + fault.get("trailing", self.trailing))
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        usage = {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(pieces)}
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return StreamingResponse(self._stream(pieces, usage if include_usage else None), media_type="text/event-stream")
+        if self.token_ms:
+            await asyncio.sleep(self.token_ms * len(pieces) / 1000)
+        self.tokens_sent += len(pieces)
+        content = "".join(pieces)
+        return JSONResponse({
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+
+fake = FakeLLM()
+app = FastAPI(title="Fake chat-completions endpoint")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    return await fake.respond(await request.json())
+
+
+@app.post("/_fake/faults")
+async def push_faults(faults: List[Dict[str, Any]]):
+    fake.push(*faults)
+    return fake.stats()
+
+
+@app.get("/_fake/stats")
+async def stats():
+    return fake.stats()
+
+
+@app.post("/_fake/reset")
+async def reset():
+    fake.reset()
+    return fake.stats()
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake chat-completions endpoint")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
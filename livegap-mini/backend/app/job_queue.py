@@ -0,0 +1,339 @@
+"""
+Site-level job queue for running agents outside the API process.
+
+With EXECUTION_MODE=queue the API no longer drives browsers itself: it
+enqueues one job per (run, site) carrying the run's goal(s) and waits for the
+results, while any number of ``python -m app.worker`` processes lease jobs,
+run the agent and write the SiteResults back. A lease that is not extended
+(the worker died or hung) expires and the job is retried up to
+JOB_MAX_ATTEMPTS times. Cancelling a run cancels its unfinished jobs; a worker
+running one notices when its next lease extension is refused and stops it.
+
+Backends implement :class:`JobQueue`; the bundled SQLite backend is for API
+and worker processes on one host (WAL mode needs shared memory, so the file
+must not live on a network filesystem).
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Collection, Dict, List
+from uuid import uuid4
+
+from .models import Goal, SiteResult, VideoSettings
+from .runner import Site
+
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "inline").lower()  # inline | queue
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.db")
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))  # lease extension interval (bounds cancel latency)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+JOB_RUN_TIMEOUT_SECONDS = float(os.getenv("JOB_RUN_TIMEOUT_SECONDS", "1800"))
+
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+
+
+@dataclass
+class Job:
+    id: str
+    run_id: str
+    site_id: str
+    goals: List[Goal]
+    video: VideoSettings | None = None
+    status: str = "queued"  # queued | leased | done | failed | cancelled
+    attempts: int = 0
+    worker_id: str | None = None
+    lease_expires: float = 0.0
+    results: List[SiteResult] | None = None
+    error: str | None = None
+
+
+class JobQueue(ABC):
+    """Interface shared by queue backends. Methods are blocking; async callers use a thread."""
+
+    @abstractmethod
+    def enqueue(self, jobs: List[Job]) -> None:
+        ...
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Job | None:
+        """Claim the oldest runnable job (queued, or leased with an expired lease)."""
+
+    @abstractmethod
+    def extend(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        """Keep a lease alive; False if the job is no longer held by ``worker_id``."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, results: List[SiteResult]) -> bool:
+        ...
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        """Requeue the job if attempts remain, otherwise mark it failed."""
+
+    @abstractmethod
+    def jobs_for_run(self, run_id: str) -> List[Job]:
+        ...
+
+    @abstractmethod
+    def finished_jobs(self, run_id: str, known: Collection[str] = ()) -> List[Job]:
+        """The run's jobs in a terminal status, except those with ids in ``known`` (already seen)."""
+
+    @abstractmethod
+    def cancel_run(self, run_id: str, reason: str) -> int:
+        """Cancel the run's queued and leased jobs with ``reason``; returns how many were stopped."""
+
+    def close(self) -> None:
+        pass
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    site_id TEXT NOT NULL,
+    goals TEXT NOT NULL,
+    video TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires REAL NOT NULL DEFAULT 0,
+    results TEXT,
+    error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_run ON jobs (run_id);
+"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """Jobs table in a SQLite file (WAL, one host); leases are claimed inside an IMMEDIATE transaction."""
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _row_to_job(self, row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            run_id=row["run_id"],
+            site_id=row["site_id"],
+            goals=[Goal(g) for g in json.loads(row["goals"])],
+            video=VideoSettings.model_validate_json(row["video"]) if row["video"] else None,
+            status=row["status"],
+            attempts=row["attempts"],
+            worker_id=row["worker_id"],
+            lease_expires=row["lease_expires"],
+            results=[SiteResult.model_validate(r) for r in json.loads(row["results"])] if row["results"] else None,
+            error=row["error"],
+        )
+
+    def enqueue(self, jobs: List[Job]) -> None:
+        now = time.time()
+        rows = [
+            (
+                job.id, job.run_id, job.site_id,
+                json.dumps([g.value for g in job.goals]),
+                job.video.model_dump_json() if job.video else None,
+                "queued", now + i * 1e-6,  # keep insertion order within one batch
+            )
+            for i, job in enumerate(jobs)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO jobs (id, run_id, site_id, goals, video, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def lease(self, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Job | None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases whose attempts are used up will not be retried
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Lease expired after ' || attempts || ' attempt(s)' "
+                    "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'leased', attempts = attempts + 1, worker_id = ?, lease_expires = ? WHERE id = ?",
+                    (worker_id, now + lease_seconds, row["id"]),
+                )
+                leased = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._row_to_job(leased)
+
+    def extend(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + lease_seconds, job_id, worker_id),
+            )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, results: List[SiteResult]) -> bool:
+        payload = json.dumps([r.model_dump(mode="json") for r in results])
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'done', results = ?, error = NULL "
+                "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (payload, job_id, worker_id),
+            )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "error = ?, lease_expires = 0 WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (self.max_attempts, error, job_id, worker_id),
+            )
+
+    def jobs_for_run(self, run_id: str) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE run_id = ? ORDER BY created_at", (run_id,)
+            ).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def finished_jobs(self, run_id: str, known: Collection[str] = ()) -> List[Job]:
+        known = list(known)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE run_id = ? AND status IN ({', '.join('?' * len(TERMINAL_STATUSES))}) "
+                f"AND id NOT IN ({', '.join('?' * len(known))}) ORDER BY created_at",
+                (run_id, *TERMINAL_STATUSES, *known),
+            ).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def cancel_run(self, run_id: str, reason: str) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', error = ?, lease_expires = 0 "
+                "WHERE run_id = ? AND status IN ('queued', 'leased')",
+                (reason, run_id),
+            )
+        return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Backend name -> factory; register others (Redis, SQS, ...) here
+JOB_QUEUE_BACKENDS: Dict[str, Callable[[], JobQueue]] = {
+    "sqlite": lambda: SQLiteJobQueue(JOB_QUEUE_PATH),
+}
+
+_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide queue for the configured JOB_QUEUE_BACKEND (created on first use)."""
+    global _queue
+    if _queue is None:
+        try:
+            factory = JOB_QUEUE_BACKENDS[JOB_QUEUE_BACKEND]
+        except KeyError:
+            raise ValueError(f"Unknown JOB_QUEUE_BACKEND={JOB_QUEUE_BACKEND!r}") from None
+        _queue = factory()
+    return _queue
+
+
+def set_job_queue(queue: JobQueue | None) -> None:
+    """Replace the process-wide queue (tests, custom backends)."""
+    global _queue
+    _queue = queue
+
+
+def failed_results(site: Site, goals: List[Goal], reason: str) -> List[SiteResult]:
+    """One failed result per goal for a site that produced none (worker failure, cancellation)."""
+    return [
+        SiteResult(site_id=site.id, site_name=site.name, url=site.url, goal=g, success=False, reason=reason)
+        for g in goals
+    ]
+
+
+def _job_results(site: Site, goals: List[Goal], stored: Job | None) -> List[SiteResult]:
+    if stored is not None and stored.status == "done" and stored.results and len(stored.results) == len(goals):
+        return stored.results
+    if stored is not None and stored.status == "failed":
+        return failed_results(site, goals, f"Worker failed: {stored.error}")
+    if stored is not None and stored.status == "cancelled":
+        return failed_results(site, goals, stored.error or "Cancelled")
+    return failed_results(site, goals, "No worker reported a result in time")
+
+
+async def run_sites_via_queue(
+    run_id: str,
+    sites: List[Site],
+    goals: List[Goal],
+    video: VideoSettings | None = None,
+    queue: JobQueue | None = None,
+    on_result: Callable[[int, List[SiteResult]], None] | None = None,
+) -> List[List[SiteResult]]:
+    """Enqueue one job per site and wait for the workers; returns results per site in ``goals`` order.
+
+    ``on_result(position, results)`` is called once per site as soon as its job is seen finished.
+    Each poll reads only the jobs that finished since the last one. Jobs still unfinished at
+    JOB_RUN_TIMEOUT_SECONDS are cancelled so workers do not run them for a run that is over.
+    """
+    queue = queue or get_job_queue()
+    jobs = [Job(id=str(uuid4()), run_id=run_id, site_id=site.id, goals=list(goals), video=video) for site in sites]
+    await asyncio.to_thread(queue.enqueue, jobs)
+    print(f"[Queue] Enqueued {len(jobs)} job(s) for run_id={run_id}")
+
+    deadline = time.monotonic() + JOB_RUN_TIMEOUT_SECONDS
+    position_of = {job.id: position for position, job in enumerate(jobs)}
+    by_id: Dict[str, Job] = {}  # finished jobs seen so far
+    while True:
+        timed_out = time.monotonic() >= deadline
+        if timed_out:
+            print(f"[Queue] run_id={run_id} timed out after {JOB_RUN_TIMEOUT_SECONDS:.0f}s waiting for workers")
+            await asyncio.to_thread(queue.cancel_run, run_id, "No worker reported a result in time")
+        for stored in await asyncio.to_thread(queue.finished_jobs, run_id, list(by_id)):
+            by_id[stored.id] = stored
+            position = position_of.get(stored.id)
+            if on_result and position is not None:
+                on_result(position, _job_results(sites[position], goals, stored))
+        if timed_out or len(by_id) == len(jobs):
+            break
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+    grid: List[List[SiteResult]] = []
+    for position, (site, job) in enumerate(zip(sites, jobs)):
+        grid.append(_job_results(site, goals, by_id.get(job.id)))
+        if on_result and job.id not in by_id:
+            on_result(position, grid[-1])
+    return grid
+
+
+__all__ = [
+    "Job", "JobQueue", "SQLiteJobQueue", "JOB_QUEUE_BACKENDS", "EXECUTION_MODE",
+    "get_job_queue", "set_job_queue", "run_sites_via_queue", "failed_results",
+]
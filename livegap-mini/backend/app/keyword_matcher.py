@@ -0,0 +1,130 @@
+"""
+Single-pass goal keyword matching and link scoring for the heuristic planner.
+
+All GOAL_KEYWORDS are compiled once into one case-insensitive regex
+(longest phrase first, on word boundaries), so finding every goal cue in a
+page is one scan instead of one substring search per keyword. The heuristic
+planner uses it to rank the page's actual links and buttons from the page
+digest by keyword weight, page region and how close the href is to a
+configured success URL for the goal.
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from .models import Goal
+from .url_matcher import normalize_url
+
+# Digest line: "[role] label -> href @region" (href and region optional), see PageDigest.to_text
+_DIGEST_LINE = re.compile(r"^\[(?P<role>[^\]]+)\] (?P<label>.*?)(?: -> (?P<href>\S+))?(?: @(?P<region>nav|header|footer|aside))?$")
+
+REGION_BONUS = {"nav": 2.0, "header": 2.0, "main": 1.0, "aside": 0.5, "footer": 0.5}
+EXACT_SUCCESS_HREF_BONUS = 6.0
+SUCCESS_PATH_SEGMENT_BONUS = 3.0
+
+
+class KeywordMatcher:
+    """One compiled alternation over every goal's keywords."""
+
+    def __init__(self, keywords: Dict[Goal, List[str]]):
+        self._goals_by_keyword: Dict[str, List[Goal]] = {}
+        for goal, words in keywords.items():
+            for word in words:
+                self._goals_by_keyword.setdefault(word.lower(), []).append(goal)
+        # Longer phrases first so "contact sales" wins over "sales" at the same position
+        ordered = sorted(self._goals_by_keyword, key=len, reverse=True)
+        self._pattern = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in ordered) + r")\b", re.IGNORECASE)
+
+    @staticmethod
+    def weight(keyword: str) -> float:
+        """Multi-word phrases are more specific than single words."""
+        return 1.0 + keyword.count(" ")
+
+    def find(self, text: str, goal: Goal) -> List[str]:
+        """Distinct keywords of ``goal`` in ``text``, in order of first appearance."""
+        found: List[str] = []
+        for match in self._pattern.finditer(text):
+            kw = match.group(0).lower()
+            if goal in self._goals_by_keyword.get(kw, ()) and kw not in found:
+                found.append(kw)
+        return found
+
+    def score(self, text: str, goal: Goal) -> float:
+        return sum(self.weight(kw) for kw in self.find(text, goal))
+
+
+@dataclass
+class ScoredElement:
+    label: str
+    role: str
+    href: str | None
+    region: str
+    score: float
+    keywords: List[str]
+
+
+def _resolve_href(href: str | None, page_url: str) -> str | None:
+    """Digest hrefs are paths for same-host links and ``host/path`` otherwise."""
+    if not href:
+        return None
+    if href.startswith("/"):
+        return urljoin(page_url, href)
+    if "://" not in href:
+        return f"https://{href}"
+    return href
+
+
+def _host_path(url: str) -> Tuple[str, List[str]]:
+    parts = urlsplit(normalize_url(url))
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    return host, [seg for seg in parts.path.split("/") if seg]
+
+
+def _href_bonus(href: str | None, success_urls: Iterable[str]) -> float:
+    if not href:
+        return 0.0
+    if normalize_url(href) in success_urls:
+        return EXACT_SUCCESS_HREF_BONUS
+    host, segments = _host_path(href)
+    best = 0.0
+    for url in success_urls:
+        s_host, s_segments = _host_path(url)
+        if s_host != host or not segments or not s_segments:
+            continue
+        if segments[0] == s_segments[0]:
+            best = max(best, SUCCESS_PATH_SEGMENT_BONUS)
+    return best
+
+
+def score_digest_elements(
+    matcher: KeywordMatcher,
+    page_text: str,
+    page_url: str,
+    goal: Goal,
+    success_urls: Iterable[str] = (),
+) -> List[ScoredElement]:
+    """Rank the clickable elements listed in a page digest for ``goal``; best first, zero scores dropped."""
+    success_urls = frozenset(success_urls)
+    scored: List[ScoredElement] = []
+    for order, line in enumerate(page_text.splitlines()):
+        m = _DIGEST_LINE.match(line.strip())
+        if not m or m.group("role") not in ("link", "button", "tab", "menuitem"):
+            continue
+        label = m.group("label").strip()
+        href = _resolve_href(m.group("href"), page_url)
+        keywords = matcher.find(label, goal)
+        href_path = urlsplit(href).path.replace("-", " ").replace("/", " ") if href else ""
+        href_keywords = [kw for kw in matcher.find(href_path, goal) if kw not in keywords]
+        score = sum(matcher.weight(kw) for kw in keywords) * 2 + 0.5 * len(href_keywords) + _href_bonus(href, success_urls)
+        if score <= 0 or not label:
+            continue
+        region = m.group("region") or "main"
+        score += REGION_BONUS.get(region, 0.0) - order * 0.001  # digest order (prominence) breaks ties
+        scored.append(ScoredElement(label=label, role=m.group("role"), href=href, region=region,
+                                    score=score, keywords=keywords + href_keywords))
+    scored.sort(key=lambda e: e.score, reverse=True)
+    return scored
+
+
+__all__ = ["KeywordMatcher", "ScoredElement", "score_digest_elements"]
@@ -1,11 +1,55 @@
 from typing import Tuple, Dict, Any, List
-from .models import Goal
-from .success_config import get_success_urls
+from .models import Goal, LLMCall
+from .success_config import get_success_url_set, get_goal_success_url_set
+from .keyword_matcher import KeywordMatcher, score_digest_elements
 from .url_matcher import normalize_url
-import os, json, re
+from .plan_cache import get_plan_cache, plan_cache_key, recent_signature
+from .planner_transport import post_with_resilience
+import os, json, time, asyncio, importlib.util
 import httpx
 
 
+# Shared planner HTTP client: one long-lived connection pool (keep-alive, HTTP/2 when h2 is installed).
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "20"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"
+# Stream completions and stop reading as soon as the JSON answer is complete
+OPENAI_STREAM = os.getenv("OPENAI_STREAM", "true").lower() == "true"
+
+_http_client: httpx.AsyncClient | None = None
+_http_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide AsyncClient, creating it for the running event loop if needed."""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        http2 = OPENAI_HTTP2 and importlib.util.find_spec("h2") is not None
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(OPENAI_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _http_client_loop = loop
+        print(f"[LLM] Created shared AsyncClient http2={http2} max_connections={OPENAI_MAX_CONNECTIONS}")
+    return _http_client
+
+
+async def aclose_http_client() -> None:
+    """Close the shared client (called on API shutdown)."""
+    global _http_client, _http_client_loop
+    client, _http_client, _http_client_loop = _http_client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
 # Keyword sets per new natural-language goal (used for heuristic success + planning hints).
 GOAL_KEYWORDS: Dict[Goal, List[str]] = {
     Goal.TALK_TO_SALES: [
@@ -26,22 +70,25 @@ GOAL_KEYWORDS: Dict[Goal, List[str]] = {
 }
 
 
+# Built once: every goal keyword in one compiled pattern
+KEYWORD_MATCHER = KeywordMatcher(GOAL_KEYWORDS)
+
+
 def judge_success_from_html(goal: Goal, html: str, url: str) -> Tuple[bool, str]:
-    lower_html = html.lower()
-    hits = [k for k in GOAL_KEYWORDS.get(goal, []) if k in lower_html]
+    hits = KEYWORD_MATCHER.find(html, goal)
     if hits:
         return True, f"Found related cues: {', '.join(hits[:4])}"
     return False, "No obvious related cues detected"
 
 
 async def classify_success(page, goal: Goal, site_id: str) -> bool:
-    """Success if normalized current URL appears in normalized configured success URLs."""
-    current = normalize_url(page.url)
-    allowed = [normalize_url(u) for u in get_success_urls(site_id, goal)]
-    return current in allowed
+    """Success if normalized current URL appears in the precompiled success URL set."""
+    return normalize_url(page.url) in get_success_url_set(site_id, goal)
 
 
 ACTION_SET = ["CLICK", "SCROLL", "TYPE", "DONE"]
+# Ranked candidate actions requested per planner call; the agent tries the rest locally when the first fails
+PLANNER_TOP_K = max(1, int(os.getenv("PLANNER_TOP_K", "3")))
 
 
 def summarize_text(raw: str, max_chars: int = 800) -> str:
@@ -57,53 +104,204 @@ def heuristic_plan(
     step_index: int,
     max_steps: int,
 ) -> Dict[str, Any]:
-    lower = page_text.lower()
+    # Links/buttons from the page digest, ranked in one pass; skip targets already tried
+    tried = {str(ra.get("target")) for ra in recent_actions if ra.get("action") == "CLICK"}
+    scored = [
+        e for e in score_digest_elements(KEYWORD_MATCHER, page_text, page_url, goal, get_goal_success_url_set(goal))
+        if e.label not in tried
+    ][:PLANNER_TOP_K]
+    if scored:
+        plans = [
+            {
+                "action": "CLICK",
+                "target": e.label,
+                "reason": f"Best-scoring {e.role} '{e.label}' ({', '.join(e.keywords) or 'success path'}) @{e.region}",
+            }
+            for e in scored
+        ]
+        return {**plans[0], "alternatives": plans[1:]}
     if step_index == 0:
         return {"action": "SCROLL", "target": "800", "reason": "Initial scan — scroll"}
     if step_index == 1:
         return {"action": "SCROLL", "target": "1600", "reason": "Broaden view"}
-    for kw in GOAL_KEYWORDS.get(goal, []):
-        if kw in lower:
-            return {"action": "CLICK", "target": kw, "reason": f"Found keyword '{kw}'"}
+    found = [kw for kw in KEYWORD_MATCHER.find(page_text, goal) if kw not in tried]
+    if found:
+        alternatives = [
+            {"action": "CLICK", "target": kw, "reason": f"Found keyword '{kw}'"} for kw in found[1:PLANNER_TOP_K]
+        ]
+        return {"action": "CLICK", "target": found[0], "reason": f"Found keyword '{found[0]}'", "alternatives": alternatives}
     if step_index < max_steps - 1:
         return {"action": "SCROLL", "target": "1000", "reason": "Explore further"}
     return {"action": "DONE", "target": "fail", "reason": "No cues after multiple steps"}
 
 
 def _extract_json_object(text: str) -> Dict[str, Any] | None:
-    match = re.search(r"\{.*?\}", text, re.DOTALL)
-    if not match:
+    """First JSON object in ``text`` (objects may nest, e.g. a candidates list)."""
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _ = json.JSONDecoder().raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        return obj if isinstance(obj, dict) else None
+    return None
+
+
+class JSONObjectScanner:
+    """Incremental counterpart of ``_extract_json_object`` for streamed text.
+
+    ``feed`` chunks as they arrive; it returns the first top-level JSON object the moment its
+    closing brace is seen (braces inside strings are ignored), so the rest of the stream can be dropped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> Dict[str, Any] | None:
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            self._pos += 1
+            if self._start == -1:
+                if ch == "{":
+                    self._start, self._depth = self._pos - 1, 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        obj = json.loads(text[self._start:self._pos])
+                    except ValueError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        return obj
+                    # Not JSON after all: look for the next object after this opening brace
+                    self._pos, self._start, self._in_string, self._escaped = self._start + 1, -1, False, False
         return None
+
+
+async def _read_streamed_answer(resp: httpx.Response, call: LLMCall) -> Tuple[Dict[str, Any] | None, str]:
+    """Read server-sent completion chunks until the answer's JSON object closes, then drop the stream.
+
+    Returns the parsed object (None if the stream ended without one) and the content read so far.
+    Usage arrives only in the final chunk, so an early stop counts one completion token per content chunk,
+    leaves ``prompt_tokens`` for the caller to estimate and marks the call's counts as estimated.
+    """
+    scanner = JSONObjectScanner()
+    chunks = 0
+    parsed = None
     try:
-        return json.loads(match.group(0))
-    except Exception:
-        return None
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            usage = event.get("usage")
+            if usage:
+                call.prompt_tokens = usage.get("prompt_tokens")
+                call.completion_tokens = usage.get("completion_tokens")
+            for choice in event.get("choices") or []:
+                piece = (choice.get("delta") or {}).get("content")
+                if piece:
+                    chunks += 1
+                    parsed = scanner.feed(piece)
+            if parsed is not None:
+                break
+    finally:
+        await resp.aclose()
+    if call.completion_tokens is None:
+        call.completion_tokens = chunks
+        call.tokens_estimated = True
+    return parsed, scanner.text
+
+
+def _candidates_from(parsed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Valid actions from a ``{"candidates": [...]}`` answer, or from a single action object."""
+    raw = parsed.get("candidates")
+    items = raw if isinstance(raw, list) else [parsed]
+    candidates = []
+    for item in items:
+        if not isinstance(item, dict) or item.get("action") not in ACTION_SET:
+            print(f"[LLM] Skipping invalid candidate {str(item)[:80]}")
+            continue
+        candidates.append({
+            "action": item["action"],
+            "target": item.get("target"),
+            "reason": item.get("reason") or "LLM decision",
+        })
+    return candidates[:PLANNER_TOP_K]
 
 
-def openai_plan(
+async def openai_plan(
     goal: Goal,
     page_url: str,
     page_text: str,
     recent_actions: List[Dict[str, Any]],
     step_index: int,
     max_steps: int,
+    deadline: float | None = None,
 ) -> Dict[str, Any]:
+    """LLM plan for the next step; the returned dict carries an ``llm`` LLMCall with timing and tokens.
+
+    ``deadline`` (``time.monotonic()``) bounds the request time, see app.planner_transport.
+    """
     api_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_KEY")
     model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     if not api_key:
         print("[LLM] No OPENAI_API_KEY present; falling back to heuristic planner.")
         return heuristic_plan(goal, page_url, page_text, recent_actions, step_index, max_steps)
+    call = LLMCall()
+    started = time.monotonic()
+
+    def finish(plan: Dict[str, Any], fallback: bool = False) -> Dict[str, Any]:
+        call.fallback = fallback
+        call.wall_ms = int((time.monotonic() - started) * 1000)
+        return {**plan, "llm": call}
+
     summary = summarize_text(page_text, max_chars=1200)
-    recent_str = "; ".join(
-        f"{ra.get('action')}({(ra.get('target') or '')[:40]})" for ra in recent_actions[-4:]
-    ) or "(none)"
+    recent_str = recent_signature(recent_actions)
+    cache = get_plan_cache()
+    cache_key = plan_cache_key(model, goal, page_url, summary, recent_actions) if cache else None
+    if cache:
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            print(f"[LLM] Plan cache hit action={cached.get('action')} target={str(cached.get('target'))[:60]}")
+            return finish({**cached, "cached": True})
     prompt = (
         "You are controlling a browser to help a user. Choose the next action.\n"
         f"User goal (literal, do not alter): {goal.value}\nURL: {page_url}\nRecent: {recent_str}\n"
-        f"Page excerpt: {summary}\n"
+        f"Page excerpt (headings and '[role] text -> href @region' elements, most prominent first): {summary}\n"
         "Allowed actions: CLICK(text), SCROLL(px), TYPE(text), DONE(reason).\n"
-        "Respond ONLY with a single JSON object: {\"action\":\"CLICK\",\"target\":\"Book a demo\",\"reason\":\"Found CTA\"}"
     )
+    if PLANNER_TOP_K > 1:
+        prompt += (
+            f"Give up to {PLANNER_TOP_K} alternative next actions, best first; the next one is tried if a CLICK "
+            "target is missing or does nothing.\n"
+            "Respond ONLY with a single JSON object: {\"candidates\":[{\"action\":\"CLICK\",\"target\":\"Book a demo\","
+            "\"reason\":\"Found CTA\"},{\"action\":\"CLICK\",\"target\":\"Contact sales\",\"reason\":\"Backup CTA\"}]}"
+        )
+    else:
+        prompt += "Respond ONLY with a single JSON object: {\"action\":\"CLICK\",\"target\":\"Book a demo\",\"reason\":\"Found CTA\"}"
     print(f"[LLM] Calling OpenAI model={model} goal={goal.value} step={step_index}")
     try:
         headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
@@ -114,35 +312,64 @@ def openai_plan(
                 {"role": "user", "content": prompt},
             ],
             "temperature": 0.2,
-            "max_tokens": 120,
+            "max_tokens": 60 + 60 * PLANNER_TOP_K,
         }
-        resp = httpx.post(
+        if OPENAI_STREAM:
+            body["stream"] = True
+            body["stream_options"] = {"include_usage": True}
+        resp = await post_with_resilience(
+            get_http_client(),
             os.getenv("OPENAI_ENDPOINT", "https://api.openai.com/v1/chat/completions"),
+            deadline=deadline,
+            default_timeout=OPENAI_TIMEOUT,
+            call=call,
+            stream=OPENAI_STREAM,
             headers=headers,
             json=body,
-            timeout=20.0,
         )
-        print(f"[LLM] OpenAI response status={resp.status_code}")
-        resp.raise_for_status()
-        data = resp.json()
-        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        parsed = _extract_json_object(content)
+        print(f"[LLM] OpenAI response status={resp.status_code} ttfb_ms={call.ttfb_ms} requests={call.requests}")
+        if OPENAI_STREAM:
+            # Bounded as a whole: the per-request timeout only limits the wait between chunks
+            remaining = OPENAI_TIMEOUT if deadline is None else max(1.0, deadline - time.monotonic())
+            parsed, content = await asyncio.wait_for(_read_streamed_answer(resp, call), timeout=min(OPENAI_TIMEOUT, remaining))
+            if call.prompt_tokens is None:
+                # Stopped before the usage chunk: estimate at ~4 characters per token
+                call.prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+                call.tokens_estimated = True
+            print(f"[LLM] Streamed answer complete after {int((time.monotonic() - started) * 1000)}ms chars={len(content)}")
+        else:
+            data = resp.json()
+            usage = data.get("usage") or {}
+            call.prompt_tokens = usage.get("prompt_tokens")
+            call.completion_tokens = usage.get("completion_tokens")
+            content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+            parsed = _extract_json_object(content)
         if not parsed:
             print("[LLM] Parse failure -> heuristic fallback")
-            return heuristic_plan(goal, page_url, page_text, recent_actions, step_index, max_steps)
-        action = parsed.get("action")
-        target = parsed.get("target")
-        reason = parsed.get("reason", "")
-        if action not in ACTION_SET:
-            print(f"[LLM] Invalid action '{action}' -> heuristic fallback")
-            return heuristic_plan(goal, page_url, page_text, recent_actions, step_index, max_steps)
-        print(f"[LLM] Plan action={action} target={str(target)[:60]}")
-        return {"action": action, "target": target, "reason": reason or "LLM decision"}
+            return finish(heuristic_plan(goal, page_url, page_text, recent_actions, step_index, max_steps), fallback=True)
+        candidates = _candidates_from(parsed)
+        if not candidates:
+            print(f"[LLM] Invalid action '{parsed.get('action')}' -> heuristic fallback")
+            return finish(heuristic_plan(goal, page_url, page_text, recent_actions, step_index, max_steps), fallback=True)
+        best = candidates[0]
+        print(f"[LLM] Plan action={best['action']} target={str(best['target'])[:60]} candidates={len(candidates)}")
+        plan = {**best, "alternatives": candidates[1:]}
+        if cache:
+            await cache.put(cache_key, plan)
+        return finish({**plan, "cached": False})
     except Exception as e:
         print(f"[LLM] Exception during OpenAI call: {e.__class__.__name__}: {e} -> heuristic fallback")
-        return heuristic_plan(goal, page_url, page_text, recent_actions, step_index, max_steps)
+        return finish(heuristic_plan(goal, page_url, page_text, recent_actions, step_index, max_steps), fallback=True)
 
 
-def plan_next_action(goal: Goal, page_url: str, page_text: str, recent_actions: List[Dict[str, Any]], step_index: int, max_steps: int) -> Dict[str, Any]:
-    """Single planner selecting OpenAI if key present else heuristic."""
-    return openai_plan(goal, page_url, page_text, recent_actions, step_index, max_steps)
+async def plan_next_action(
+    goal: Goal,
+    page_url: str,
+    page_text: str,
+    recent_actions: List[Dict[str, Any]],
+    step_index: int,
+    max_steps: int,
+    deadline: float | None = None,
+) -> Dict[str, Any]:
+    """Single planner selecting OpenAI if key present else heuristic. Never blocks the event loop."""
+    return await openai_plan(goal, page_url, page_text, recent_actions, step_index, max_steps, deadline=deadline)
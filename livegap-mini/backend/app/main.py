@@ -1,19 +1,37 @@
-from fastapi import FastAPI, APIRouter, BackgroundTasks, HTTPException
+from fastapi import FastAPI, APIRouter, BackgroundTasks, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
 import asyncio
 import sys
 import os
+from contextlib import asynccontextmanager
 from uuid import uuid4
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-from .models import RunRequest, RunResponse
-from .agent import run_llm_agent_on_site
+from .models import (
+    Goal, RunRequest, RunResponse, SiteResult, VideoSettings,
+    MatrixRunRequest, MatrixRunResponse, MatrixRow, GoalSummary, PlanCacheStats, LLMUsage,
+)
+from .agent import run_llm_agent_on_site, run_llm_agent_matrix_on_site
 from .runner import Site, load_sites  # dataclass + loader
-from .runs_store import create_run, get_run, update_run_status, to_dict, get_all_runs
+from .runs_store import (
+    create_run, get_run, get_run_store, update_run_status, to_dict, list_runs_page,
+    InvalidCursor, RUN_DETAILS, RUN_STATUSES, RUNS_PAGE_SIZE, RUNS_PAGE_MAX, TERMINAL_STATUSES,
+)
+from .run_responses import encode_run, etag_for, etag_matches, get_run_response_cache
+from .reports import REPORT_FORMATS, get_report_cache, render_site_report, site_results
+from .browser_pool import start_browser_pool, stop_browser_pool
+from .llm import aclose_http_client
+from . import job_queue, planner_transport
+from .plan_cache import get_plan_cache
+from .rate_limiter import get_rate_limiter
+from .job_queue import failed_results, get_job_queue, run_sites_via_queue
+from .run_control import CANCELLED_REASON, RunControl, end_control, get_control, start_control
+from .run_events import RUN_EVENTS_STEPS, flush as flush_events, publish, stream as stream_run_events
 
 # Windows asyncio subprocess fix for Playwright (requires selector loop for subprocesses).
 if sys.platform == "win32":
@@ -29,7 +47,21 @@ try:
 except Exception as _e:
     print(f"[another.ai] Could not introspect event loop: {_e!r}")
 
-app = FastAPI(title="another.ai Mini API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start process-wide resources (shared Chromium pool, LLM client) and release them on shutdown."""
+    if job_queue.EXECUTION_MODE != "queue":
+        # In queue mode browsers live in the worker processes (python -m app.worker)
+        await start_browser_pool()
+    try:
+        yield
+    finally:
+        await flush_events()
+        await stop_browser_pool()
+        await aclose_http_client()
+
+
+app = FastAPI(title="another.ai Mini API", lifespan=lifespan)
 
 # API router with /api prefix to align with CloudFront path routing
 api_router = APIRouter(prefix="/api")
@@ -53,33 +85,132 @@ async def api_health():
     return {"status": "ok"}
 
 
+def _selected_sites() -> list[Site]:
+    sites = load_sites()
+    # Limit sites for testing if env var is set
+    max_sites = int(os.getenv("MAX_SITES", "0"))
+    if max_sites > 0:
+        sites = sites[:max_sites]
+        print(f"[API] Limited to first {max_sites} sites for testing")
+    return sites
+
+
+async def _run_sites(sites: list[Site], run_site, on_result=None, control: RunControl | None = None, stopped=None):
+    """Run ``run_site(site)`` for every site in parallel with the MAX_CONCURRENT_SITES limit.
+
+    ``on_result(position, result)`` is called for each site as soon as it finishes. Site tasks
+    are cancelled when ``control`` stops the run; those sites get ``stopped(site, reason)``.
+    """
+    max_concurrent = int(os.getenv("MAX_CONCURRENT_SITES", "3"))
+    semaphore = asyncio.Semaphore(max_concurrent)
+    print(f"[API] Running up to {max_concurrent} sites concurrently")
+
+    async def run_for_site(idx: int, site: Site):
+        async with semaphore:
+            print(f"[API] Processing site {idx}/{len(sites)}: {site.id}")
+            result = await run_site(site)
+        if on_result:
+            on_result(idx - 1, result)
+        return result
+
+    # Run all sites concurrently (limited by semaphore)
+    tasks = [asyncio.create_task(run_for_site(idx, site)) for idx, site in enumerate(sites, 1)]
+    if control is not None:
+        for task in tasks:
+            control.track(task)
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    results = []
+    for position, (site, outcome) in enumerate(zip(sites, outcomes)):
+        if isinstance(outcome, asyncio.CancelledError) and control is not None and control.cancelled:
+            outcome = stopped(site, control.reason)
+            if on_result:
+                on_result(position, outcome)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        results.append(outcome)
+    return results
+
+
+async def _set_status(run_id: str, status: str, **kwargs) -> bool:
+    """Move the run to ``status`` and tell event stream subscribers."""
+    if not await asyncio.to_thread(update_run_status, run_id, status, **kwargs):
+        return False
+    data = {"status": status}
+    if kwargs.get("error"):
+        data["error"] = kwargs["error"]
+    publish(run_id, "status", data)
+    return True
+
+
+async def _start_run(run_id: str, deadline_seconds: float | None) -> RunControl | None:
+    """Register the run as executing here and mark it running; None if it was cancelled before it started."""
+    if not await _set_status(run_id, "running"):
+        if await asyncio.to_thread(get_run_store().status, run_id) == "cancelling":
+            await _set_status(run_id, "cancelled", error=CANCELLED_REASON)
+        return None
+    control = start_control(run_id, deadline_seconds)
+    if job_queue.EXECUTION_MODE == "queue":
+        control.on_cancel(lambda reason: get_job_queue().cancel_run(run_id, reason))
+    return control
+
+
+async def _finish_run(run_id: str, response) -> None:
+    """Record the result: "cancelled" with the partial results if a cancel was requested, else "done"."""
+    if (
+        await asyncio.to_thread(get_run_store().status, run_id) == "cancelling"
+        or not await _set_status(run_id, "done", result=response)
+    ):
+        await _set_status(run_id, "cancelled", result=response)
+
+
+def _publish_site_results(run_id: str, position: int, results: list[SiteResult]) -> None:
+    for r in results:
+        publish(run_id, "site_result", {
+            "index": position,
+            "site_id": r.site_id,
+            "goal": r.goal.value if r.goal else None,
+            "result": r.model_dump(mode="json"),
+        })
+
+
+def _step_publisher(run_id: str, site: Site):
+    """``on_step`` callback for the agent that publishes each step, or None when RUN_EVENTS_STEPS is off."""
+    if not RUN_EVENTS_STEPS:
+        return None
+    return lambda goal, step: publish(run_id, "step", {
+        "site_id": site.id,
+        "goal": goal.value,
+        "step": step.model_dump(mode="json"),
+    })
+
+
 # Background task function to process the reality check
-async def process_reality_check(run_id: str, goal):
+async def process_reality_check(
+    run_id: str, goal, video: VideoSettings | None = None, deadline_seconds: float | None = None,
+):
     """Run the reality check in the background"""
     try:
         print(f"[API] Starting reality check for run_id={run_id} goal={goal}")
-        update_run_status(run_id, "running")
+        control = await _start_run(run_id, deadline_seconds)
+        if control is None:
+            print(f"[API] run_id={run_id} was cancelled before it started")
+            return
         
-        sites = load_sites()
-        # Limit sites for testing if env var is set
-        max_sites = int(os.getenv("MAX_SITES", "0"))
-        if max_sites > 0:
-            sites = sites[:max_sites]
-            print(f"[API] Limited to first {max_sites} sites for testing")
-        
-        # Run sites in parallel with concurrency limit
-        max_concurrent = int(os.getenv("MAX_CONCURRENT_SITES", "3"))
-        semaphore = asyncio.Semaphore(max_concurrent)
-        print(f"[API] Running up to {max_concurrent} sites concurrently")
-
-        async def run_for_site(idx: int, site: Site):
-            async with semaphore:
-                print(f"[API] Processing site {idx}/{len(sites)}: {site.id}")
-                return await run_llm_agent_on_site(site, goal)
-
-        # Run all sites concurrently (limited by semaphore)
-        tasks = [run_for_site(idx, site) for idx, site in enumerate(sites, 1)]
-        results = await asyncio.gather(*tasks)
+        sites = _selected_sites()
+        if job_queue.EXECUTION_MODE == "queue":
+            grid = await run_sites_via_queue(
+                run_id, sites, [goal], video=video,
+                on_result=lambda position, cells: _publish_site_results(run_id, position, cells),
+            )
+            results = [cells[0] for cells in grid]
+        else:
+            results = await _run_sites(
+                sites,
+                lambda site: run_llm_agent_on_site(site, goal, video=video, on_step=_step_publisher(run_id, site)),
+                on_result=lambda position, result: _publish_site_results(run_id, position, [result]),
+                control=control,
+                stopped=lambda site, reason: failed_results(site, [goal], reason)[0],
+            )
 
         total = len(results)
         successes = sum(1 for r in results if r.success)
@@ -93,17 +224,90 @@ async def process_reality_check(run_id: str, goal):
             successful_sites=successes,
             failed_sites=failed,
             results=list(results),
+            plan_cache=PlanCacheStats.total([r.plan_cache for r in results]),
+            llm_usage=LLMUsage.total([r.llm_usage for r in results]),
         )
         print(f"[API] Completed reality check run_id={run_id}. Success rate: {success_rate:.1f}% ({successes}/{total})")
         
         # Update run with result
-        update_run_status(run_id, "done", result=response)
+        await _finish_run(run_id, response)
         
     except Exception as e:
         print(f"[API] ERROR in process_reality_check run_id={run_id}: {e!r}")
         import traceback
         traceback.print_exc()
-        update_run_status(run_id, "error", error=str(e))
+        await _set_status(run_id, "error", error=str(e))
+    finally:
+        end_control(run_id)
+        await flush_events()
+
+
+def build_matrix_response(goals: list[Goal], sites: list[Site], grid: list[list[SiteResult]]) -> MatrixRunResponse:
+    """Assemble the site×goal grid and per-goal success rates."""
+    rows = [
+        MatrixRow(site_id=site.id, site_name=site.name, url=site.url, results=list(cells))
+        for site, cells in zip(sites, grid)
+    ]
+    summaries = []
+    for col, goal in enumerate(goals):
+        successes = sum(1 for cells in grid if cells[col].success)
+        total = len(grid)
+        summaries.append(GoalSummary(
+            goal=goal,
+            success_rate=(successes / total * 100.0) if total > 0 else 0.0,
+            successful_sites=successes,
+            failed_sites=total - successes,
+        ))
+    cells = len(grid) * len(goals)
+    cell_successes = sum(1 for row in grid for r in row if r.success)
+    return MatrixRunResponse(
+        goals=goals,
+        overall_success_rate=(cell_successes / cells * 100.0) if cells > 0 else 0.0,
+        total_sites=len(grid),
+        goal_summaries=summaries,
+        rows=rows,
+        plan_cache=PlanCacheStats.total([r.plan_cache for row in grid for r in row]),
+        llm_usage=LLMUsage.total([r.llm_usage for row in grid for r in row]),
+    )
+
+
+async def process_matrix_run(
+    run_id: str, goals: list[Goal], video: VideoSettings | None = None, deadline_seconds: float | None = None,
+):
+    """Run every goal against every site, one browser context per site"""
+    try:
+        print(f"[API] Starting matrix run run_id={run_id} goals={[g.name for g in goals]}")
+        control = await _start_run(run_id, deadline_seconds)
+        if control is None:
+            print(f"[API] run_id={run_id} was cancelled before it started")
+            return
+
+        sites = _selected_sites()
+        publish_cells = lambda position, cells: _publish_site_results(run_id, position, cells)
+        if job_queue.EXECUTION_MODE == "queue":
+            # One job per site so a worker checks all goals in one browser context
+            grid = await run_sites_via_queue(run_id, sites, goals, video=video, on_result=publish_cells)
+        else:
+            grid = await _run_sites(
+                sites,
+                lambda site: run_llm_agent_matrix_on_site(site, goals, video=video, on_step=_step_publisher(run_id, site)),
+                on_result=publish_cells,
+                control=control,
+                stopped=lambda site, reason: failed_results(site, goals, reason),
+            )
+        response = build_matrix_response(goals, sites, grid)
+        print(f"[API] Completed matrix run run_id={run_id}. Success rate: {response.overall_success_rate:.1f}%")
+
+        await _finish_run(run_id, response)
+
+    except Exception as e:
+        print(f"[API] ERROR in process_matrix_run run_id={run_id}: {e!r}")
+        import traceback
+        traceback.print_exc()
+        await _set_status(run_id, "error", error=str(e))
+    finally:
+        end_control(run_id)
+        await flush_events()
 
 
 @app.post("/run-reality-check")
@@ -113,11 +317,11 @@ async def run_reality_check_endpoint(req: RunRequest, background_tasks: Backgrou
     run_id = str(uuid4())
     
     # Create run record
-    run = create_run(run_id)
+    run = await asyncio.to_thread(create_run, run_id, [req.goal])
     print(f"[API] Created run_id={run_id} for goal={req.goal}")
     
     # Add background task
-    background_tasks.add_task(process_reality_check, run_id, req.goal)
+    background_tasks.add_task(process_reality_check, run_id, req.goal, req.video, req.deadline_seconds)
     
     # Return immediately
     return {
@@ -127,22 +331,197 @@ async def run_reality_check_endpoint(req: RunRequest, background_tasks: Backgrou
     }
 
 
+@app.post("/run-matrix")
+@api_router.post("/run-matrix")
+async def run_matrix_endpoint(req: MatrixRunRequest, background_tasks: BackgroundTasks):
+    """Start a multi-goal run (site×goal grid) in the background and return immediately"""
+    run_id = str(uuid4())
+    run = await asyncio.to_thread(create_run, run_id, req.goals)
+    print(f"[API] Created matrix run_id={run_id} for goals={[g.name for g in req.goals]}")
+
+    background_tasks.add_task(process_matrix_run, run_id, req.goals, req.video, req.deadline_seconds)
+
+    return {
+        "run_id": run_id,
+        "status": "pending",
+        "created_at": run.created_at.isoformat(),
+    }
+
+
 @app.get("/run/{run_id}")
 @api_router.get("/run/{run_id}")
-async def get_run_status(run_id: str):
-    """Get the status of a reality check run"""
-    run = get_run(run_id)
-    if not run:
+async def get_run_status(run_id: str, if_none_match: str | None = Header(default=None)):
+    """Get the status of a reality check run
+
+    Finished runs are encoded once and served from cache; every response carries an ETag
+    and a matching ``If-None-Match`` gets a 304.
+    """
+    cache = get_run_response_cache()
+    cached = cache.get(run_id)
+    if cached is None:
+        run = await asyncio.to_thread(get_run, run_id)
+        if not run:
+            raise HTTPException(status_code=404, detail="Run not found")
+        body = encode_run(run)
+        etag = etag_for(body)
+        if run.status in TERMINAL_STATUSES:
+            cache.put(run_id, etag, body)
+    else:
+        etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.post("/run/{run_id}/cancel", status_code=202)
+@api_router.post("/run/{run_id}/cancel", status_code=202)
+async def cancel_run(run_id: str):
+    """Stop a pending or running run; sites that already finished keep their results
+
+    The run moves to "cancelling" at once and to "cancelled" (with the partial results) as soon
+    as its site tasks have stopped and released their browsers.
+    """
+    store = get_run_store()
+    if await asyncio.to_thread(store.status, run_id) is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if not await _set_status(run_id, "cancelling"):
+        raise HTTPException(status_code=409, detail=f"Run is already {await asyncio.to_thread(store.status, run_id)}")
+    control = get_control(run_id)
+    if control is not None:
+        control.cancel(CANCELLED_REASON)
+    elif job_queue.EXECUTION_MODE == "queue":
+        # Stop the workers even if the API worker waiting for them is another process
+        await asyncio.to_thread(get_job_queue().cancel_run, run_id, CANCELLED_REASON)
+    print(f"[API] Cancel requested for run_id={run_id}")
+    return {"run_id": run_id, "status": "cancelling"}
+
+
+@app.get("/run/{run_id}/report/{site_id}")
+@api_router.get("/run/{run_id}/report/{site_id}")
+async def run_report(
+    run_id: str,
+    site_id: str,
+    goal: str | None = None,
+    format: str = "markdown",
+    if_none_match: str | None = Header(default=None),
+):
+    """Markdown (or ``format=html``) report for one site of a finished run, rendered on first request
+
+    Matrix runs have one report per goal, so they need ``goal`` (name or full text).
+    """
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(REPORT_FORMATS)}")
+    wanted = _parse_goal(goal) if goal else None
+    key = f"{run_id}/{site_id}/{wanted.name if wanted else ''}/{format}"
+    cache = get_report_cache()
+    cached = cache.get(key)
+    if cached is None:
+        run = await asyncio.to_thread(get_run, run_id)
+        if not run:
+            raise HTTPException(status_code=404, detail="Run not found")
+        if run.result is None:
+            raise HTTPException(status_code=409, detail="Run has no results yet")
+        found = site_results(run.result, site_id, wanted)
+        if not found:
+            raise HTTPException(status_code=404, detail="No result for this site")
+        if len(found) > 1:
+            raise HTTPException(status_code=400, detail="goal is required for matrix runs")
+        body = render_site_report(*found[0], format=format).encode()
+        etag = etag_for(body)
+        cache.put(key, etag, body)
+    else:
+        etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    media_type = "text/html; charset=utf-8" if format == "html" else "text/markdown; charset=utf-8"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@app.get("/run/{run_id}/events")
+@api_router.get("/run/{run_id}/events")
+async def run_events(run_id: str, after: int = 0, last_event_id: str | None = Header(default=None)):
+    """Server-Sent Events stream of the run's status changes, per-site results and agent steps.
+
+    Replays the run's events so far, then follows it until it finishes. A reconnecting
+    EventSource resumes after its ``Last-Event-ID``.
+    """
+    if await asyncio.to_thread(get_run_store().status, run_id) is None:
         raise HTTPException(status_code=404, detail="Run not found")
-    return to_dict(run)
+    if last_event_id and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+    return StreamingResponse(
+        stream_run_events(run_id, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/runs")
 @api_router.get("/runs")
-async def list_runs():
-    """List all runs (for debugging/history)"""
-    runs = get_all_runs()
-    return {"runs": [to_dict(r) for r in runs]}
+async def list_runs(
+    limit: int = Query(default=RUNS_PAGE_SIZE, ge=1, le=RUNS_PAGE_MAX),
+    cursor: str | None = None,
+    status: str | None = None,
+    goal: str | None = None,
+    include: str = "",
+):
+    """List runs newest first, one page at a time (for history)
+
+    Runs are summaries (status, goals, success totals) unless ``include`` asks for more:
+    ``results`` adds per-site results, ``steps`` and ``reports`` add those to each result.
+    Pass ``next_cursor`` back as ``cursor`` for the next page.
+    """
+    details = {part.strip() for part in include.split(",") if part.strip()}
+    if details - set(RUN_DETAILS):
+        raise HTTPException(status_code=400, detail=f"include must be a comma-separated subset of {', '.join(RUN_DETAILS)}")
+    if details & {"steps", "reports"}:
+        details.add("results")
+    if status is not None and status not in RUN_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(RUN_STATUSES)}")
+    try:
+        runs, next_cursor = await asyncio.to_thread(
+            list_runs_page, limit, cursor=cursor, status=status,
+            goal=_parse_goal(goal) if goal else None, with_results="results" in details,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"runs": [to_dict(r, include=details) for r in runs], "next_cursor": next_cursor}
+
+
+def _parse_goal(value: str) -> Goal:
+    """A goal by enum name (``PRICING``) or by its full text."""
+    if value.upper() in Goal.__members__:
+        return Goal[value.upper()]
+    try:
+        return Goal(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown goal {value!r}") from None
+
+
+@app.get("/runs/stats")
+@api_router.get("/runs/stats")
+async def runs_stats():
+    """Run history memory use, archive and response cache counters"""
+    return {
+        **await asyncio.to_thread(get_run_store().stats),
+        "response_cache": get_run_response_cache().stats(),
+        "report_cache": get_report_cache().stats(),
+    }
+
+
+@app.get("/planner/stats")
+@api_router.get("/planner/stats")
+async def planner_stats():
+    """Shared planner state: rate limiter queue and wait times, circuit breaker, plan cache"""
+    limiter = get_rate_limiter()
+    cache = get_plan_cache()
+    return {
+        "rate_limiter": limiter.stats() if limiter else None,
+        "circuit": planner_transport.breaker.state,
+        "plan_cache": cache.stats() if cache else None,
+    }
 
 
 # For AWS Lambda
@@ -1,6 +1,6 @@
 from enum import Enum
-from typing import List
-from pydantic import BaseModel
+from typing import Dict, List
+from pydantic import BaseModel, Field, field_validator
 
 
 class Goal(str, Enum):
@@ -11,8 +11,82 @@ class Goal(str, Enum):
     CUSTOMERS = "Can you show me what customers say about this product?"
 
 
+class VideoPolicy(str, Enum):
+    OFF = "off"  # never record
+    ON_FAILURE = "on_failure"  # record, but discard the video when the site succeeds
+    ALWAYS = "always"
+
+
+class VideoSettings(BaseModel):
+    """Per-run recording override; unset fields fall back to the deployment defaults."""
+    policy: VideoPolicy | None = None
+    width: int | None = Field(default=None, ge=160, le=1920)
+    height: int | None = Field(default=None, ge=120, le=1080)
+
+
 class RunRequest(BaseModel):
     goal: Goal
+    video: VideoSettings | None = None
+    deadline_seconds: float | None = Field(default=None, gt=0)  # whole-run limit; unfinished sites are stopped
+
+
+class MatrixRunRequest(BaseModel):
+    goals: List[Goal] = Field(default_factory=lambda: list(Goal), min_length=1)
+    video: VideoSettings | None = None
+    deadline_seconds: float | None = Field(default=None, gt=0)
+
+    @field_validator("goals")
+    @classmethod
+    def _dedupe_goals(cls, goals: List[Goal]) -> List[Goal]:
+        return list(dict.fromkeys(goals))
+
+
+class LLMCall(BaseModel):
+    """Timing and token usage of one planner invocation."""
+    wall_ms: int = 0  # whole planner call, including cache lookup and parsing
+    ttfb_ms: int | None = None  # until response headers of the last HTTP request
+    queue_ms: int = 0  # waiting for the planner rate limiter
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    requests: int = 0  # HTTP requests sent (0 on a plan cache hit)
+    fallback: bool = False  # heuristic plan used because the LLM call failed
+    tokens_estimated: bool = False  # stream stopped before the provider's usage chunk; counts are estimates
+
+
+class LLMUsage(BaseModel):
+    """Planner calls rolled up over a site or a run."""
+    planner_calls: int = 0
+    requests: int = 0
+    fallbacks: int = 0
+    wall_ms: int = 0
+    ttfb_ms: int = 0
+    queue_ms: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    estimated_calls: int = 0  # calls whose token counts are estimates rather than provider-reported
+    step_ms: int = 0  # total step time; step_ms - wall_ms is roughly the browser's share
+    overlap_ms: int = 0  # planner time hidden behind settling by pipelined planning
+
+    @classmethod
+    def from_calls(cls, calls: "List[LLMCall]", step_ms: int = 0, overlap_ms: int = 0) -> "LLMUsage":
+        return cls(
+            planner_calls=len(calls),
+            requests=sum(c.requests for c in calls),
+            fallbacks=sum(1 for c in calls if c.fallback),
+            wall_ms=sum(c.wall_ms for c in calls),
+            ttfb_ms=sum(c.ttfb_ms or 0 for c in calls),
+            queue_ms=sum(c.queue_ms for c in calls),
+            prompt_tokens=sum(c.prompt_tokens or 0 for c in calls),
+            completion_tokens=sum(c.completion_tokens or 0 for c in calls),
+            estimated_calls=sum(1 for c in calls if c.tokens_estimated),
+            step_ms=step_ms,
+            overlap_ms=overlap_ms,
+        )
+
+    @classmethod
+    def total(cls, usages: "List[LLMUsage | None]") -> "LLMUsage":
+        present = [u for u in usages if u is not None]
+        return cls(**{name: sum(getattr(u, name) for u in present) for name in cls.model_fields})
 
 
 class Step(BaseModel):
@@ -27,17 +101,47 @@ class Step(BaseModel):
     url_after: str | None = None
     duration_ms: int | None = None
     error_type: str | None = None
+    settle_ms: int | None = None  # time spent waiting for the page to settle after the action
+    plan_cached: bool | None = None  # True/False for LLM plans (cache hit/miss); None for heuristic plans
+    candidate_rank: int | None = None  # 0 = planner's first choice; n = n-th fallback candidate tried without replanning
+    llm: LLMCall | None = None  # planner call that produced this step (None for local candidates)
+    replayed: bool | None = None  # True when taken from the recorded playbook instead of the planner
+    overlap_ms: int | None = None  # planning that ran while the previous step settled
+    speculation: str | None = None  # "used" or "discarded": fate of the plan requested during the previous step
+
+
+class ResourceStats(BaseModel):
+    """Requests let through vs aborted by the resource policy (see app.resource_policy)."""
+    allowed_requests: int = 0
+    blocked_requests: int = 0
+    blocked_by_type: Dict[str, int] = Field(default_factory=dict)
+    blocked_by_domain: Dict[str, int] = Field(default_factory=dict)  # top blocked hosts
+
+
+class PlanCacheStats(BaseModel):
+    """LLM plan cache usage; misses are planner calls that went to the model."""
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def total(cls, stats: "List[PlanCacheStats | None]") -> "PlanCacheStats":
+        present = [s for s in stats if s is not None]
+        return cls(hits=sum(s.hits for s in present), misses=sum(s.misses for s in present))
 
 
 class SiteResult(BaseModel):
     site_id: str
     site_name: str
     url: str
+    goal: Goal | None = None
     success: bool
     reason: str
     video_url: str | None = None
     steps: List[Step] | None = None  # populated in LLM mode
     report: str | None = None  # human-readable markdown report
+    resources: ResourceStats | None = None  # request interception counters
+    plan_cache: PlanCacheStats | None = None
+    llm_usage: LLMUsage | None = None
 
 
 class RunResponse(BaseModel):
@@ -47,3 +151,29 @@ class RunResponse(BaseModel):
     successful_sites: int
     failed_sites: int
     results: List[SiteResult]
+    plan_cache: PlanCacheStats | None = None
+    llm_usage: LLMUsage | None = None
+
+
+class GoalSummary(BaseModel):
+    goal: Goal
+    success_rate: float  # 0–100
+    successful_sites: int
+    failed_sites: int
+
+
+class MatrixRow(BaseModel):
+    site_id: str
+    site_name: str
+    url: str
+    results: List[SiteResult]  # one per goal, in MatrixRunResponse.goals order
+
+
+class MatrixRunResponse(BaseModel):
+    goals: List[Goal]
+    overall_success_rate: float  # 0–100 over every site×goal cell
+    total_sites: int
+    goal_summaries: List[GoalSummary]
+    rows: List[MatrixRow]
+    plan_cache: PlanCacheStats | None = None
+    llm_usage: LLMUsage | None = None
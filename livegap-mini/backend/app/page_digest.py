@@ -0,0 +1,145 @@
+"""
+Compact, structured digest of a page built in a single in-page pass.
+
+Instead of shipping the whole ``body.innerText`` over CDP and truncating it,
+one ``page.evaluate`` collects the visible headings and interactive elements
+(links, buttons, inputs) with their text, href, role and page region, ranks
+them by prominence and returns a bounded result.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+
+DIGEST_MAX_ELEMENTS = int(os.getenv("DIGEST_MAX_ELEMENTS", "60"))
+DIGEST_MAX_HEADINGS = int(os.getenv("DIGEST_MAX_HEADINGS", "12"))
+DIGEST_MAX_TEXT = 80  # characters kept per heading/element
+
+_DIGEST_JS = """
+(limits) => {
+  const vh = window.innerHeight || 900;
+  const clean = (s) => (s || "").replace(/\\s+/g, " ").trim().slice(0, limits.maxText);
+  const box = (el) => {
+    const r = el.getBoundingClientRect();
+    if (r.width < 2 || r.height < 2) return null;
+    const st = getComputedStyle(el);
+    if (st.visibility === "hidden" || st.display === "none" || parseFloat(st.opacity) === 0) return null;
+    return r;
+  };
+  const regionOf = (el) => {
+    const c = el.closest("nav,header,footer,aside,[role=navigation],[role=banner],[role=contentinfo]");
+    if (!c) return "main";
+    const t = c.tagName.toLowerCase(), role = c.getAttribute("role");
+    if (t === "nav" || role === "navigation") return "nav";
+    if (t === "header" || role === "banner") return "header";
+    if (t === "footer" || role === "contentinfo") return "footer";
+    return "aside";
+  };
+  const implicitRole = (el, tag) => {
+    if (tag === "a") return "link";
+    if (tag === "button") return "button";
+    if (tag === "select") return "combobox";
+    if (tag === "textarea") return "textbox";
+    if (tag === "input") return ["button", "submit"].includes(el.type) ? "button" : "textbox";
+    return tag;
+  };
+
+  const headings = [];
+  for (const h of document.querySelectorAll("h1,h2,h3")) {
+    if (headings.length >= limits.maxHeadings) break;
+    if (!box(h)) continue;
+    const text = clean(h.innerText);
+    if (text) headings.push({ level: Number(h.tagName[1]), text });
+  }
+
+  const seen = new Set();
+  const elements = [];
+  const selector = "a[href],button,[role=button],[role=link],[role=tab],[role=menuitem],input:not([type=hidden]),select,textarea";
+  for (const el of document.querySelectorAll(selector)) {
+    if (elements.length >= limits.scanLimit) break;
+    const r = box(el);
+    if (!r) continue;
+    const tag = el.tagName.toLowerCase();
+    const placeholder = el.getAttribute("placeholder");
+    const text = clean(el.innerText || el.getAttribute("aria-label") || el.getAttribute("title") || placeholder ||
+                       (tag === "input" && ["button", "submit"].includes(el.type) ? el.value : ""));
+    const formField = tag === "input" || tag === "textarea" || tag === "select";
+    if (!text && !formField) continue;
+    const href = tag === "a" ? el.href : null;
+    const key = tag + "|" + text + "|" + (href || "");
+    if (seen.has(key)) continue;
+    seen.add(key);
+    const region = regionOf(el);
+    const role = el.getAttribute("role") || implicitRole(el, tag);
+    const inView = r.top < vh && r.bottom > 0;
+    const fontSize = parseFloat(getComputedStyle(el).fontSize) || 14;
+    let score = (inView ? 100 : 0) + Math.min(fontSize, 32) + Math.min((r.width * r.height) / 1000, 40)
+              - Math.min((r.top + window.scrollY) / 100, 80);
+    if (region === "nav" || region === "header") score += 40;
+    if (role === "button") score += 10;
+    elements.push({ tag, role, text, href, region, placeholder, score: Math.round(score) });
+  }
+  elements.sort((a, b) => b.score - a.score);
+  return { url: location.href, title: clean(document.title), headings, elements: elements.slice(0, limits.maxElements) };
+}
+"""
+
+
+@dataclass
+class PageDigest:
+    url: str
+    title: str = ""
+    headings: List[Dict[str, Any]] = field(default_factory=list)
+    elements: List[Dict[str, Any]] = field(default_factory=list)  # ordered by prominence
+
+    @classmethod
+    def from_raw(cls, raw: Any) -> "PageDigest | None":
+        if not isinstance(raw, dict) or not isinstance(raw.get("elements"), list):
+            return None
+        return cls(
+            url=str(raw.get("url") or ""),
+            title=str(raw.get("title") or ""),
+            headings=[h for h in raw.get("headings") or [] if isinstance(h, dict)],
+            elements=[e for e in raw["elements"] if isinstance(e, dict)],
+        )
+
+    def to_text(self, limit: int = 1400) -> str:
+        """Bounded planner-facing rendering, most prominent content first."""
+        host = urlsplit(self.url).netloc
+        lines: List[str] = []
+        if self.title:
+            lines.append(f"Title: {self.title}")
+        for h in self.headings:
+            lines.append(f"H{h.get('level', 2)}: {h.get('text', '')}")
+        for e in self.elements:
+            label = e.get("text") or e.get("placeholder") or ""
+            line = f"[{e.get('role') or e.get('tag')}] {label}"
+            href = e.get("href")
+            if href:
+                parts = urlsplit(href)
+                short = (parts.path or "/") if parts.netloc == host else f"{parts.netloc}{parts.path}"
+                line += f" -> {short}"
+            region = e.get("region")
+            if region and region != "main":
+                line += f" @{region}"
+            lines.append(line)
+        text = "\n".join(lines)
+        return text[:limit]
+
+
+async def extract_page_digest(page) -> PageDigest | None:
+    """Run the single in-page extraction pass; None if the page could not be evaluated."""
+    try:
+        raw = await page.evaluate(_DIGEST_JS, {
+            "maxElements": DIGEST_MAX_ELEMENTS,
+            "maxHeadings": DIGEST_MAX_HEADINGS,
+            "maxText": DIGEST_MAX_TEXT,
+            "scanLimit": DIGEST_MAX_ELEMENTS * 8,
+        })
+    except Exception as e:
+        print(f"[Digest] Extraction failed: {e.__class__.__name__}: {e}")
+        return None
+    return PageDigest.from_raw(raw)
+
+
+__all__ = ["PageDigest", "extract_page_digest"]
@@ -0,0 +1,131 @@
+"""
+Cache of LLM planner decisions keyed by page state.
+
+Landing pages and the first few steps of each site look the same run after
+run, so the planner keeps answering the same question. A decision is keyed by
+model, goal, normalized URL, a hash of the page excerpt sent to the model and
+the recent-actions signature. Entries live in an in-memory LRU and, when
+PLAN_CACHE_PATH is set, in a SQLite file shared across restarts and worker
+processes; both tiers expire entries after PLAN_CACHE_TTL_SECONDS.
+
+Only valid LLM answers are cached, never heuristic fallbacks.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from .models import Goal
+from .url_matcher import normalize_url
+
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "true").lower() == "true"
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "512"))
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", "86400"))
+PLAN_CACHE_PATH = os.getenv("PLAN_CACHE_PATH", "")  # empty keeps the cache in memory only
+
+
+def recent_signature(recent_actions: List[Dict[str, Any]]) -> str:
+    """Same compact rendering of the last actions that the planner prompt uses."""
+    return "; ".join(
+        f"{ra.get('action')}({str(ra.get('target') or '')[:40]}){' failed' if ra.get('failed') else ''}"
+        for ra in recent_actions[-4:]
+    ) or "(none)"
+
+
+def plan_cache_key(model: str, goal: Goal, page_url: str, page_excerpt: str, recent_actions: List[Dict[str, Any]]) -> str:
+    page_hash = hashlib.sha1(page_excerpt.encode("utf-8")).hexdigest()
+    raw = "\x1f".join([model, goal.value, normalize_url(page_url), page_hash, recent_signature(recent_actions)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    def __init__(self, max_entries: int = PLAN_CACHE_SIZE, ttl_seconds: float = PLAN_CACHE_TTL_SECONDS, path: str = ""):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS plan_cache (key TEXT PRIMARY KEY, plan TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _remember(self, key: str, created_at: float, plan: Dict[str, Any]) -> None:
+        self._memory[key] = (created_at, plan)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Tuple[float, Dict[str, Any]] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT plan, created_at FROM plan_cache WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+        return (row[1], json.loads(row[0])) if row else None
+
+    def _disk_put(self, key: str, created_at: float, plan: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plan_cache (key, plan, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(plan), created_at),
+            )
+            self._conn.execute("DELETE FROM plan_cache WHERE created_at < ?", (created_at - self.ttl_seconds,))
+
+    async def get(self, key: str) -> Dict[str, Any] | None:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and now - entry[0] > self.ttl_seconds:
+            del self._memory[key]
+            entry = None
+        if entry is None and self._conn is not None:
+            try:
+                entry = await asyncio.to_thread(self._disk_get, key, now)
+            except sqlite3.Error as e:
+                print(f"[PlanCache] Disk lookup failed: {e!r}")
+            if entry is not None:
+                self._remember(key, *entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._memory.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    async def put(self, key: str, plan: Dict[str, Any]) -> None:
+        now = time.time()
+        self._remember(key, now, dict(plan))
+        if self._conn is not None:
+            try:
+                await asyncio.to_thread(self._disk_put, key, now, dict(plan))
+            except sqlite3.Error as e:
+                print(f"[PlanCache] Disk write failed: {e!r}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._memory)}
+
+
+_plan_cache: PlanCache | None = None
+
+
+def get_plan_cache() -> PlanCache | None:
+    """Process-wide cache, or None when PLAN_CACHE_ENABLED is false."""
+    global _plan_cache
+    if not PLAN_CACHE_ENABLED:
+        return None
+    if _plan_cache is None:
+        _plan_cache = PlanCache(path=PLAN_CACHE_PATH)
+    return _plan_cache
+
+
+__all__ = ["PlanCache", "plan_cache_key", "recent_signature", "get_plan_cache"]
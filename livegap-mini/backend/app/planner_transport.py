@@ -0,0 +1,298 @@
+"""
+Resilient HTTP transport for planner requests.
+
+Every request is bounded by the time left in the site's budget (minus a
+reserve for acting on the plan), so one slow upstream answer cannot consume
+the whole AGENT_MAX_SECONDS. 429/5xx responses and transport errors are
+retried with jittered exponential backoff, honouring ``Retry-After``, as
+long as the deadline allows. With PLANNER_HEDGE_PERCENTILE set, a second
+identical request is started when the first is slower than that percentile
+of recent latencies, and whichever answers first wins.
+
+A process-wide circuit breaker opens after PLANNER_BREAKER_THRESHOLD
+consecutive failed calls; while it is open every site plans heuristically
+without touching the endpoint, and after PLANNER_BREAKER_RESET_SECONDS a
+single probe decides whether to close it again.
+
+Every request, including retries and hedges, first queues at the shared
+rate limiter (app.rate_limiter) when PLANNER_RPM or PLANNER_TPM is set.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict
+
+import httpx
+
+from .models import LLMCall
+from .rate_limiter import RateLimitTimeout, estimate_tokens, get_rate_limiter
+
+PLANNER_RETRIES = int(os.getenv("PLANNER_RETRIES", "2"))
+PLANNER_BACKOFF_BASE_MS = int(os.getenv("PLANNER_BACKOFF_BASE_MS", "250"))
+PLANNER_BACKOFF_MAX_MS = int(os.getenv("PLANNER_BACKOFF_MAX_MS", "4000"))
+PLANNER_DEADLINE_RESERVE_SECONDS = float(os.getenv("PLANNER_DEADLINE_RESERVE_SECONDS", "3"))
+PLANNER_MIN_TIMEOUT_SECONDS = float(os.getenv("PLANNER_MIN_TIMEOUT_SECONDS", "1"))
+PLANNER_HEDGE_PERCENTILE = float(os.getenv("PLANNER_HEDGE_PERCENTILE", "0"))  # e.g. 95; 0 disables hedging
+PLANNER_HEDGE_MIN_SAMPLES = int(os.getenv("PLANNER_HEDGE_MIN_SAMPLES", "20"))
+PLANNER_BREAKER_THRESHOLD = int(os.getenv("PLANNER_BREAKER_THRESHOLD", "5"))
+PLANNER_BREAKER_RESET_SECONDS = float(os.getenv("PLANNER_BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class PlannerUnavailable(Exception):
+    """The planner endpoint must not be called now (breaker open or no time left)."""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = PLANNER_BREAKER_THRESHOLD, reset_seconds: float = PLANNER_BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out; in half-open state only one probe at a time."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            print("[Planner] Endpoint healthy again; circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release(self) -> None:
+        """Give up a half-open probe slot without a verdict (the call was cancelled)."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.threshold > 0 and self.failures >= self.threshold):
+            print(f"[Planner] Circuit open after {self.failures} failure(s); planning heuristically for {self.reset_seconds:.0f}s")
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class LatencyTracker:
+    """Recent successful request latencies, for the hedging threshold."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        if len(self._samples) < max(1, PLANNER_HEDGE_MIN_SAMPLES):
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+breaker = CircuitBreaker()
+latencies = LatencyTracker()
+
+
+def _retry_after_seconds(resp: httpx.Response) -> float | None:
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_seconds(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    cap = min(PLANNER_BACKOFF_MAX_MS, PLANNER_BACKOFF_BASE_MS * (2 ** attempt)) / 1000.0
+    return random.uniform(0, cap)
+
+
+async def _admit(kwargs: Dict[str, Any], start_by: float | None, call: LLMCall | None) -> float:
+    """Queue at the shared rate limiter; returns the seconds waited."""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return 0.0
+    try:
+        waited = await limiter.acquire(estimate_tokens(kwargs.get("json")), start_by)
+    except RateLimitTimeout as e:
+        raise PlannerUnavailable(str(e)) from e
+    if call is not None:
+        call.queue_ms += int(waited * 1000)
+    return waited
+
+
+async def _send(client: httpx.AsyncClient, url: str, kwargs: Dict[str, Any], timeout: float, call: LLMCall | None, stream: bool = False, start_by: float | None = None) -> httpx.Response:
+    timeout = max(PLANNER_MIN_TIMEOUT_SECONDS, timeout - await _admit(kwargs, start_by, call))
+    sent = time.monotonic()
+
+    async def trace(event_name: str, info: Dict[str, Any]) -> None:
+        # httpx connection trace: response headers received = time to first byte
+        if event_name.endswith("receive_response_headers.complete") and call is not None:
+            call.ttfb_ms = int((time.monotonic() - sent) * 1000)
+
+    if call is not None:
+        call.requests += 1
+    if stream:
+        # Headers only; the caller reads (and closes) the body as it arrives
+        request = client.build_request("POST", url, timeout=timeout, extensions={"trace": trace}, **kwargs)
+        resp = await client.send(request, stream=True)
+    else:
+        resp = await client.post(url, timeout=timeout, extensions={"trace": trace}, **kwargs)
+    if resp.status_code < 400:
+        latencies.add(time.monotonic() - sent)
+    return resp
+
+
+async def _discard(resp: httpx.Response) -> None:
+    """Release the connection of a response whose body will not be read."""
+    if not resp.is_closed:
+        await resp.aclose()
+
+
+async def _send_hedged(client: httpx.AsyncClient, url: str, kwargs: Dict[str, Any], timeout: float, call: LLMCall | None, stream: bool = False, start_by: float | None = None) -> httpx.Response:
+    """Send once; if slower than the hedge percentile, race a duplicate request."""
+    hedge_after = latencies.percentile(PLANNER_HEDGE_PERCENTILE) if PLANNER_HEDGE_PERCENTILE > 0 else None
+    primary = asyncio.ensure_future(_send(client, url, kwargs, timeout, call, stream, start_by))
+    if hedge_after is None or hedge_after >= timeout:
+        return await primary
+    pending = {primary}
+    last = None
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return primary.result()
+        print(f"[Planner] No answer after p{PLANNER_HEDGE_PERCENTILE:.0f}={hedge_after * 1000:.0f}ms; sending hedge request")
+        hedge = asyncio.ensure_future(_send(client, url, kwargs, max(PLANNER_MIN_TIMEOUT_SECONDS, timeout - hedge_after), call, stream, start_by))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS:
+                    for other in done - {task}:
+                        if other.exception() is None:
+                            await _discard(other.result())
+                    return task.result()
+                if last is not None and last.exception() is None:
+                    await _discard(last.result())
+                last = task
+        return last.result()  # both failed: surface the later outcome (raises if it was an exception)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def post_with_resilience(
+    client: httpx.AsyncClient,
+    url: str,
+    *,
+    deadline: float | None = None,
+    default_timeout: float = 20.0,
+    call: LLMCall | None = None,
+    stream: bool = False,
+    **kwargs: Any,
+) -> httpx.Response:
+    """POST with deadline-bounded timeouts, retries, optional hedging and the shared circuit breaker.
+
+    ``deadline`` is a ``time.monotonic()`` value; raises PlannerUnavailable when the breaker is open
+    or too little time is left, otherwise returns a successful response or raises the last error.
+    With ``stream`` the response is returned once its headers arrive and the caller must close it.
+    """
+    def time_left() -> float:
+        if deadline is None:
+            return default_timeout
+        return min(default_timeout, deadline - time.monotonic() - PLANNER_DEADLINE_RESERVE_SECONDS)
+
+    if time_left() < PLANNER_MIN_TIMEOUT_SECONDS:
+        raise PlannerUnavailable(f"only {max(0.0, time_left()):.1f}s left for planning")
+    if not breaker.allow():
+        raise PlannerUnavailable("circuit open")
+    try:
+        return await _post_with_retries(client, url, time_left, deadline, call, kwargs, stream)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+
+
+async def _post_with_retries(
+    client: httpx.AsyncClient,
+    url: str,
+    time_left: Callable[[], float],
+    deadline: float | None,
+    call: LLMCall | None,
+    kwargs: Dict[str, Any],
+    stream: bool = False,
+) -> httpx.Response:
+    last_error: BaseException | None = None
+    # Latest moment a request may still go out with a useful timeout
+    start_by = deadline - PLANNER_DEADLINE_RESERVE_SECONDS - PLANNER_MIN_TIMEOUT_SECONDS if deadline is not None else None
+    for attempt in range(PLANNER_RETRIES + 1):
+        timeout = time_left()
+        if timeout < PLANNER_MIN_TIMEOUT_SECONDS:
+            break
+        retry_after = None
+        try:
+            resp = await _send_hedged(client, url, kwargs, timeout, call, stream, start_by)
+            if resp.status_code not in RETRYABLE_STATUS:
+                if stream and resp.status_code >= 400:
+                    await _discard(resp)
+                resp.raise_for_status()
+                breaker.record_success()
+                return resp
+            if stream:
+                await _discard(resp)
+            retry_after = _retry_after_seconds(resp)
+            if resp.status_code == 429 and get_rate_limiter() is not None:
+                # Hold back every site, not just this one, until the provider's window reopens
+                get_rate_limiter().pause(retry_after if retry_after is not None else _backoff_seconds(attempt))
+            last_error = httpx.HTTPStatusError(f"HTTP {resp.status_code}", request=resp.request, response=resp)
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            last_error = e
+        except PlannerUnavailable:
+            breaker.release()
+            raise
+        except httpx.HTTPStatusError:
+            # 4xx other than 429 will not get better by retrying; not an outage either
+            breaker.record_success()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        if attempt == PLANNER_RETRIES:
+            break
+        wait = max(retry_after or 0.0, _backoff_seconds(attempt))
+        if deadline is not None and time.monotonic() + wait + PLANNER_MIN_TIMEOUT_SECONDS + PLANNER_DEADLINE_RESERVE_SECONDS > deadline:
+            print(f"[Planner] Not retrying: waiting {wait:.1f}s would exceed the site deadline")
+            break
+        print(f"[Planner] Attempt {attempt + 1} failed ({last_error.__class__.__name__}: {last_error}); retrying in {wait:.2f}s")
+        await asyncio.sleep(wait)
+    breaker.record_failure()
+    raise last_error or PlannerUnavailable("no time left for planning")
+
+
+__all__ = ["post_with_resilience", "PlannerUnavailable", "CircuitBreaker", "breaker", "latencies"]
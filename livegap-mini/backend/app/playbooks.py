@@ -0,0 +1,165 @@
+"""
+Recorded navigation paths ("playbooks") per (site, goal).
+
+When a goal succeeds, the CLICK/TYPE steps that led there are stored with the
+URL each one started from. The next run replays them without calling the
+planner for as long as the page is on the URL the recorded step expects; at
+the first divergence (different URL, or the replayed action fails) the agent
+falls back to planning from that point. Every success overwrites the
+playbook with the path actually taken, and a playbook that fails
+PLAYBOOK_MAX_FAILURES runs in a row is dropped.
+
+Playbooks are kept in memory or, when PLAYBOOK_PATH is set, in a SQLite
+file so they survive restarts and are shared by worker processes. With the
+file, every lookup reads it (a playbook rewritten or dropped by another
+process is never replayed from a stale copy) and failures are counted with
+an atomic UPDATE so concurrent processes do not overwrite each other's counts.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Tuple
+
+from .models import Goal, Step
+from .url_matcher import normalize_url
+
+PLAYBOOKS_ENABLED = os.getenv("PLAYBOOKS_ENABLED", "true").lower() == "true"
+PLAYBOOK_PATH = os.getenv("PLAYBOOK_PATH", "")  # empty keeps playbooks in memory only
+PLAYBOOK_MAX_FAILURES = int(os.getenv("PLAYBOOK_MAX_FAILURES", "2"))
+
+REPLAYABLE_ACTIONS = ("CLICK", "TYPE")
+
+
+@dataclass
+class PlaybookStep:
+    action: str
+    target: str
+    url_before: str  # normalized URL the step must start from
+
+    def matches(self, url: str) -> bool:
+        return normalize_url(url) == self.url_before
+
+
+@dataclass
+class Playbook:
+    site_id: str
+    goal: Goal
+    steps: List[PlaybookStep] = field(default_factory=list)
+    failures: int = 0
+    updated_at: float = 0.0
+
+    @classmethod
+    def from_steps(cls, site_id: str, goal: Goal, steps: List[Step]) -> "Playbook":
+        """Keep the actions that did something: successful CLICK/TYPE steps, in order."""
+        kept = [
+            PlaybookStep(action=s.action, target=str(s.target), url_before=normalize_url(s.url_before or ""))
+            for s in steps
+            if s.action in REPLAYABLE_ACTIONS and s.target and not s.error_type
+        ]
+        return cls(site_id=site_id, goal=goal, steps=kept, updated_at=time.time())
+
+
+class PlaybookStore:
+    def __init__(self, path: str = "", max_failures: int = PLAYBOOK_MAX_FAILURES):
+        self.max_failures = max_failures
+        self._memory: Dict[Tuple[str, Goal], Playbook] = {}  # only used without a SQLite file
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS playbooks ("
+                "site_id TEXT NOT NULL, goal TEXT NOT NULL, steps TEXT NOT NULL, "
+                "failures INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL, PRIMARY KEY (site_id, goal))"
+            )
+
+    def get(self, site_id: str, goal: Goal) -> Playbook | None:
+        if self._conn is None:
+            return self._memory.get((site_id, goal))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT steps, failures, updated_at FROM playbooks WHERE site_id = ? AND goal = ?",
+                (site_id, goal.value),
+            ).fetchone()
+        if row is None:
+            return None
+        return Playbook(
+            site_id=site_id,
+            goal=goal,
+            steps=[PlaybookStep(**s) for s in json.loads(row[0])],
+            failures=row[1],
+            updated_at=row[2],
+        )
+
+    def save(self, playbook: Playbook) -> None:
+        if self._conn is None:
+            self._memory[(playbook.site_id, playbook.goal)] = playbook
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO playbooks (site_id, goal, steps, failures, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    playbook.site_id, playbook.goal.value,
+                    json.dumps([asdict(s) for s in playbook.steps]),
+                    playbook.failures, playbook.updated_at,
+                ),
+            )
+
+    def delete(self, site_id: str, goal: Goal) -> None:
+        if self._conn is None:
+            self._memory.pop((site_id, goal), None)
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM playbooks WHERE site_id = ? AND goal = ?", (site_id, goal.value))
+
+    def _count_failure(self, site_id: str, goal: Goal) -> int | None:
+        """Add a failed run to the playbook; its failure count, or None if there is no playbook."""
+        if self._conn is None:
+            playbook = self._memory.get((site_id, goal))
+            if playbook is None:
+                return None
+            playbook.failures += 1
+            return playbook.failures
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE playbooks SET failures = failures + 1 WHERE site_id = ? AND goal = ? RETURNING failures",
+                (site_id, goal.value),
+            ).fetchone()
+        return row[0] if row else None
+
+    def record(self, site_id: str, goal: Goal, success: bool, steps: List[Step]) -> None:
+        """Store the path of a success; count a failure against an existing playbook."""
+        try:
+            if success:
+                playbook = Playbook.from_steps(site_id, goal, steps)
+                if playbook.steps:
+                    self.save(playbook)
+                    print(f"[Playbook] Recorded {len(playbook.steps)} step(s) for site={site_id} goal={goal.name}")
+                return
+            failures = self._count_failure(site_id, goal)
+            if failures is not None and failures >= self.max_failures:
+                print(f"[Playbook] Dropping playbook for site={site_id} goal={goal.name} after {failures} failed run(s)")
+                self.delete(site_id, goal)
+        except sqlite3.Error as e:
+            print(f"[Playbook] Could not update playbook for site={site_id}: {e!r}")
+
+
+_store: PlaybookStore | None = None
+
+
+def get_playbook_store() -> PlaybookStore | None:
+    """Process-wide store, or None when PLAYBOOKS_ENABLED is false."""
+    global _store
+    if not PLAYBOOKS_ENABLED:
+        return None
+    if _store is None:
+        _store = PlaybookStore(PLAYBOOK_PATH)
+    return _store
+
+
+__all__ = ["Playbook", "PlaybookStep", "PlaybookStore", "get_playbook_store"]
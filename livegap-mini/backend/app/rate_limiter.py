@@ -0,0 +1,240 @@
+"""
+Token-bucket limiter in front of every planner request.
+
+All sites and runs in a process share one limiter, so concurrent agent loops
+queue for the provider's requests/min (PLANNER_RPM) and tokens/min
+(PLANNER_TPM) instead of all getting 429s at once and falling back to the
+heuristic planner together. Tokens are counted the way providers count them
+at admission: prompt characters / 4 plus ``max_tokens``.
+
+Waiters are served earliest deadline first, so a step about to run out of
+site budget goes ahead of one that has time to spare; a waiter that cannot be
+admitted before its deadline gives up with RateLimitTimeout. A 429 from the
+provider pauses the buckets for its Retry-After.
+
+With PLANNER_RATE_LIMIT_PATH set the bucket levels live in a SQLite file, so
+every worker process on the node draws from the same budget (deadline
+ordering is per process).
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Tuple
+
+PLANNER_RPM = float(os.getenv("PLANNER_RPM", "0"))  # 0 = no request limit
+PLANNER_TPM = float(os.getenv("PLANNER_TPM", "0"))  # 0 = no token limit
+PLANNER_RATE_BURST_SECONDS = float(os.getenv("PLANNER_RATE_BURST_SECONDS", "10"))  # bucket size, in seconds of quota
+PLANNER_RATE_LIMIT_PATH = os.getenv("PLANNER_RATE_LIMIT_PATH", "")  # empty keeps the buckets in this process
+
+# name -> (amount to take, refill per second, capacity)
+Costs = Dict[str, Tuple[float, float, float]]
+# name -> (level, updated_at); updated_at in the future means paused until then
+Levels = Dict[str, Tuple[float, float]]
+
+
+class RateLimitTimeout(Exception):
+    """The request could not be admitted before its deadline."""
+
+
+def estimate_tokens(body: Dict[str, Any] | None) -> int:
+    if not body:
+        return 0
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+    return prompt_chars // 4 + int(body.get("max_tokens") or 0)
+
+
+def take(levels: Levels, costs: Costs, now: float) -> Tuple[float, Levels]:
+    """Take ``costs`` from every bucket or none; returns (seconds to wait, new levels)."""
+    refilled: Levels = {}
+    wait = 0.0
+    for name, (amount, rate, capacity) in costs.items():
+        level, updated = levels.get(name, (capacity, now))
+        level = min(capacity, level + rate * max(0.0, now - updated))
+        amount = min(amount, capacity)  # an oversized request waits for a full bucket
+        if level < amount:
+            wait = max(wait, max(0.0, updated - now) + (amount - level) / rate)
+        refilled[name] = (level - amount, max(updated, now))
+    if wait > 0:
+        return wait, levels
+    return 0.0, refilled
+
+
+class MemoryBuckets:
+    def __init__(self):
+        self._levels: Levels = {}
+
+    def take(self, costs: Costs, now: float) -> float:
+        wait, self._levels = take(self._levels, costs, now)
+        return wait
+
+    def pause(self, names, until: float) -> None:
+        for name in names:
+            self._levels[name] = (0.0, until)
+
+
+class SQLiteBuckets:
+    """Bucket levels in a SQLite file shared by the worker processes of a node."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _update(self, change) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT name, level, updated_at FROM rate_buckets").fetchall()
+                result, levels = change({name: (level, updated) for name, level, updated in rows})
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rate_buckets (name, level, updated_at) VALUES (?, ?, ?)",
+                    [(name, level, updated) for name, (level, updated) in levels.items()],
+                )
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def take(self, costs: Costs, now: float) -> float:
+        # Wall clock, not monotonic: the timestamps are compared across processes
+        return self._update(lambda levels: take(levels, costs, now))
+
+    def pause(self, names, until: float) -> None:
+        self._update(lambda levels: (None, {**levels, **{name: (0.0, until) for name in names}}))
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rpm: float = PLANNER_RPM,
+        tpm: float = PLANNER_TPM,
+        burst_seconds: float = PLANNER_RATE_BURST_SECONDS,
+        path: str = "",
+    ):
+        self.limits: Dict[str, float] = {name: per_min for name, per_min in (("requests", rpm), ("tokens", tpm)) if per_min > 0}
+        self.burst_seconds = burst_seconds
+        self._buckets = SQLiteBuckets(path) if path else MemoryBuckets()
+        self._shared = bool(path)
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._cond: asyncio.Condition | None = None
+        self._cond_loop: asyncio.AbstractEventLoop | None = None
+        self._waits: deque = deque(maxlen=500)
+        self.admitted = 0
+        self.timeouts = 0
+        self.pauses = 0
+        self.wait_seconds = 0.0
+
+    def _costs(self, tokens: int) -> Costs:
+        amounts = {"requests": 1.0, "tokens": float(tokens)}
+        return {
+            name: (amounts[name], per_min / 60.0, max(amounts["requests"], per_min / 60.0 * self.burst_seconds))
+            for name, per_min in self.limits.items()
+        }
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._cond_loop is not loop:
+            self._cond, self._cond_loop, self._waiters = asyncio.Condition(), loop, []
+        return self._cond
+
+    async def _take(self, costs: Costs) -> float:
+        if self._shared:
+            return await asyncio.to_thread(self._buckets.take, costs, time.time())
+        return self._buckets.take(costs, time.time())
+
+    async def acquire(self, tokens: int = 0, start_by: float | None = None) -> float:
+        """Wait for one request of ``tokens`` tokens; returns the seconds spent queued.
+
+        ``start_by`` is a ``time.monotonic()`` value: the request is worthless if it cannot start by then,
+        so RateLimitTimeout is raised instead. Earlier ``start_by`` is admitted first.
+        """
+        if not self.limits:
+            return 0.0
+        costs = self._costs(tokens)
+        cond = self._condition()
+        entry = (start_by if start_by is not None else math.inf, next(self._seq))
+        started = time.monotonic()
+        async with cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = await self._take(costs)
+                        if wait == 0:
+                            break
+                    if start_by is not None:
+                        left = start_by - time.monotonic()
+                        if left <= 0 or (wait is not None and wait > left):
+                            self.timeouts += 1
+                            raise RateLimitTimeout(f"rate limit wait {wait or 0:.1f}s exceeds the {max(0.0, left):.1f}s left")
+                        wait = left if wait is None else wait
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                cond.notify_all()
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.wait_seconds += waited
+        self._waits.append(waited)
+        if waited >= 1:
+            print(f"[RateLimit] Planner request queued {waited:.1f}s ({len(self._waiters)} still waiting)")
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """Stop admitting requests for ``seconds`` (the provider answered 429)."""
+        if not self.limits or seconds <= 0:
+            return
+        self.pauses += 1
+        print(f"[RateLimit] Provider rate limit hit; pausing planner requests for {seconds:.1f}s")
+        try:
+            self._buckets.pause(self.limits, time.time() + seconds)
+        except sqlite3.Error as e:
+            print(f"[RateLimit] Could not record pause: {e!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._waits)
+        p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] if ordered else 0.0
+        return {
+            "rpm": self.limits.get("requests", 0),
+            "tpm": self.limits.get("tokens", 0),
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "timeouts": self.timeouts,
+            "pauses": self.pauses,
+            "wait_ms_total": int(self.wait_seconds * 1000),
+            "wait_ms_p95": int(p95 * 1000),
+            "wait_ms_max": int(max(ordered, default=0.0) * 1000),
+        }
+
+
+_rate_limiter: RateLimiter | None = None
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    """Process-wide limiter, or None when neither PLANNER_RPM nor PLANNER_TPM is set."""
+    global _rate_limiter
+    if PLANNER_RPM <= 0 and PLANNER_TPM <= 0:
+        return None
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(path=PLANNER_RATE_LIMIT_PATH)
+    return _rate_limiter
+
+
+__all__ = ["RateLimiter", "RateLimitTimeout", "estimate_tokens", "get_rate_limiter"]
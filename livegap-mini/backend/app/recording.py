@@ -0,0 +1,67 @@
+"""
+Video recording policy for agent runs.
+
+Deployment defaults come from the environment (VIDEO_POLICY, VIDEO_WIDTH,
+VIDEO_HEIGHT); a run may override any of them through its request. Without
+a size, Playwright scales recordings down to fit 800x800 (800x562 for the
+1280x900 viewport); a size with one side set keeps the viewport's aspect.
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+from .models import VideoPolicy, VideoSettings
+
+VIDEO_POLICY = os.getenv("VIDEO_POLICY", VideoPolicy.ALWAYS.value)
+VIDEO_WIDTH = int(os.getenv("VIDEO_WIDTH") or 0) or None  # unset = Playwright's default size
+VIDEO_HEIGHT = int(os.getenv("VIDEO_HEIGHT") or 0) or None
+
+VIEWPORT = {"width": 1280, "height": 900}
+
+
+def resolve_video_settings(override: VideoSettings | None = None) -> VideoSettings:
+    """Merge a per-run override onto the deployment defaults."""
+    try:
+        policy = VideoPolicy(VIDEO_POLICY.lower())
+    except ValueError:
+        print(f"[Video] Unknown VIDEO_POLICY={VIDEO_POLICY!r}; recording always")
+        policy = VideoPolicy.ALWAYS
+    settings = VideoSettings(policy=policy, width=VIDEO_WIDTH, height=VIDEO_HEIGHT)
+    if override is not None:
+        settings = settings.model_copy(update=override.model_dump(exclude_none=True))
+    return settings
+
+
+def context_options(settings: VideoSettings, videos_dir: Path) -> Dict[str, Any]:
+    """BrowserContext options for the policy; no recording at all when it is OFF."""
+    options: Dict[str, Any] = {"viewport": dict(VIEWPORT)}
+    if settings.policy != VideoPolicy.OFF:
+        videos_dir.mkdir(exist_ok=True)
+        options["record_video_dir"] = str(videos_dir)
+        size = _video_size(settings)
+        if size is not None:
+            options["record_video_size"] = size
+    return options
+
+
+def _video_size(settings: VideoSettings) -> Dict[str, int] | None:
+    width, height = settings.width, settings.height
+    if width is None and height is None:
+        return None
+    if width is None:
+        width = round(height * VIEWPORT["width"] / VIEWPORT["height"])
+    elif height is None:
+        height = round(width * VIEWPORT["height"] / VIEWPORT["width"])
+    return {"width": width, "height": height}
+
+
+def should_keep(settings: VideoSettings, success: bool) -> bool:
+    """Whether a finished recording is worth uploading."""
+    if settings.policy == VideoPolicy.ALWAYS:
+        return True
+    if settings.policy == VideoPolicy.ON_FAILURE:
+        return not success
+    return False
+
+
+__all__ = ["resolve_video_settings", "context_options", "should_keep"]
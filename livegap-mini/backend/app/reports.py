@@ -0,0 +1,190 @@
+"""
+Per-site reports, rendered when someone asks for them.
+
+Runs store only structured results (steps, usage, outcome); the markdown
+narrative is rendered by ``GET /run/{id}/report/{site_id}`` on first request,
+as markdown or as a small HTML page, and the rendered bytes are kept in a
+size-bounded cache (REPORT_CACHE_MB) keyed by run, site, goal and format.
+Results stored before reports became lazy still carry their ``report`` and
+it is served as is.
+"""
+import html
+import os
+import re
+from typing import List, Tuple
+
+from .models import Goal, MatrixRunResponse, SiteResult
+from .run_responses import RunResponseCache
+from .runner import Site
+from .runs_store import RunResult
+
+REPORT_CACHE_MB = float(os.getenv("REPORT_CACHE_MB", "16"))  # 0 disables the cache
+REPORT_FORMATS = ("markdown", "html")
+
+
+def render_report(site: Site, goal: Goal, result: SiteResult) -> str:
+    """Produce a human-readable markdown narrative of the agent's attempt."""
+    lines: list[str] = []
+    lines.append(f"# {site.name} — Goal: {goal.value}")
+    lines.append(f"**Final Result:** {'✅ SUCCESS' if result.success else '❌ FAILURE'}")
+    lines.append("")
+    
+    # Performance summary
+    total_steps = len(result.steps or [])
+    total_time = sum(s.duration_ms or 0 for s in (result.steps or [])) / 1000.0
+    lines.append("## Summary")
+    lines.append(f"- **Steps taken:** {total_steps}")
+    if total_time > 0:
+        lines.append(f"- **Total time:** {total_time:.1f}s")
+    if result.llm_usage and result.llm_usage.requests:
+        usage = result.llm_usage
+        lines.append(
+            f"- **LLM time:** {usage.wall_ms / 1000:.1f}s over {usage.requests} request(s), "
+            f"{usage.prompt_tokens + usage.completion_tokens} tokens"
+            + (f" ({usage.estimated_calls} call(s) estimated)" if usage.estimated_calls else "")
+            + (f", {usage.queue_ms / 1000:.1f}s queued for rate limit" if usage.queue_ms else "")
+            + (f", {usage.overlap_ms / 1000:.1f}s overlapped with settling" if usage.overlap_ms else "")
+        )
+    lines.append(f"- **Starting URL:** {site.url}")
+    lines.append("")
+    
+    # Step details
+    lines.append("## Step-by-Step Execution")
+    for step in (result.steps or []):
+        lines.append(f"### Step {step.index + 1}: {step.action}")
+        
+        # AI Reasoning
+        if step.reasoning:
+            lines.append(f"**🤖 AI Reasoning:** {step.reasoning}")
+        
+        # Target
+        if step.target:
+            lines.append(f"**Target:** `{step.target}`")
+        
+        # URL tracking
+        if step.url_before:
+            lines.append(f"**Page URL:** `{step.url_before}`")
+        if step.url_after and step.url_after != step.url_before:
+            lines.append(f"**→ Navigated to:** `{step.url_after}`")
+        
+        # Observation
+        lines.append(f"**Observation:** {step.observation or 'No observation recorded'}")
+        
+        # Timing
+        if step.duration_ms:
+            settle_note = f" (settle {step.settle_ms / 1000:.2f}s)" if step.settle_ms else ""
+            lines.append(f"**Duration:** {step.duration_ms / 1000:.2f}s{settle_note}")
+        if step.llm and step.llm.requests:
+            tokens = (step.llm.prompt_tokens or 0) + (step.llm.completion_tokens or 0)
+            fallback_note = " — fell back to heuristic" if step.llm.fallback else ""
+            estimate_note = " (estimated)" if step.llm.tokens_estimated else ""
+            lines.append(f"**LLM:** {step.llm.wall_ms / 1000:.2f}s, {tokens} tokens{estimate_note}{fallback_note}")
+        if step.overlap_ms:
+            lines.append(f"**Pipelined:** planned during the previous step's settle, {step.overlap_ms / 1000:.2f}s saved")
+        
+        # Success check
+        if step.succeeded is True:
+            lines.append("**✅ Success check:** Goal achieved at this step")
+        elif step.succeeded is False:
+            lines.append("**❌ Success check:** Not at goal URL yet")
+        else:
+            lines.append("**⏳ Success check:** In progress")
+        
+        # Error details
+        if step.error_type:
+            lines.append(f"**⚠️ Error Type:** {step.error_type}")
+        
+        lines.append("")
+    
+    # Final outcome
+    lines.append("## Final Outcome")
+    if result.success:
+        lines.append("### 🎉 Success!")
+        lines.append(f"Successfully reached goal URL: `{result.reason}`")
+    else:
+        lines.append("### ⚠️ Failed to Complete Goal")
+        lines.append(f"**Reason:** {result.reason}")
+        
+        # Add suggestions for common failures
+        if "Time limit" in result.reason:
+            lines.append("")
+            lines.append("**Suggestion:** The agent ran out of time. The page may load slowly or require more steps.")
+        elif "Navigation" in result.reason:
+            lines.append("")
+            lines.append("**Suggestion:** Could not load the initial page. Check if the URL is accessible.")
+    
+    return "\n".join(lines)
+
+
+_INLINE_CODE = re.compile(r"`([^`]*)`")
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_HEADING = re.compile(r"^(#{1,3}) (.*)$")
+
+
+def _inline(text: str) -> str:
+    parts = _INLINE_CODE.split(text)
+    return "".join(
+        f"<code>{html.escape(part)}</code>" if i % 2 else _BOLD.sub(r"<strong>\1</strong>", html.escape(part))
+        for i, part in enumerate(parts)
+    )
+
+
+def markdown_to_html(markdown: str, title: str = "Report") -> str:
+    """HTML page for the markdown subset render_report writes: headings, ``-`` lists, bold and code."""
+    body: List[str] = []
+    in_list = False
+    for line in markdown.splitlines():
+        if line.startswith("- "):
+            if not in_list:
+                body.append("<ul>")
+                in_list = True
+            body.append(f"<li>{_inline(line[2:])}</li>")
+            continue
+        if in_list:
+            body.append("</ul>")
+            in_list = False
+        heading = _HEADING.match(line)
+        if heading:
+            level = len(heading.group(1))
+            body.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif line.strip():
+            body.append(f"<p>{_inline(line)}</p>")
+    if in_list:
+        body.append("</ul>")
+    return (
+        f'<!doctype html>\n<html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head>\n'
+        f"<body>\n" + "\n".join(body) + "\n</body></html>\n"
+    )
+
+
+def site_results(result: RunResult, site_id: str, goal: Goal | None = None) -> List[Tuple[SiteResult, Goal]]:
+    """The run's results for ``site_id`` (one per goal in matrix runs), optionally just ``goal``."""
+    if isinstance(result, MatrixRunResponse):
+        cells = [cell for row in result.rows if row.site_id == site_id for cell in row.results]
+        found = [(cell, cell.goal) for cell in cells if cell.goal is not None]
+    else:
+        found = [(cell, cell.goal or result.goal) for cell in result.results if cell.site_id == site_id]
+    return [(cell, g) for cell, g in found if goal is None or g == goal]
+
+
+def render_site_report(cell: SiteResult, goal: Goal, format: str = "markdown") -> str:
+    site = Site(id=cell.site_id, name=cell.site_name, url=cell.url)
+    markdown = cell.report or render_report(site, goal, cell)
+    if format == "html":
+        return markdown_to_html(markdown, title=f"{cell.site_name} — {goal.name}")
+    return markdown
+
+
+_cache: RunResponseCache | None = None
+
+
+def get_report_cache() -> RunResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = RunResponseCache(int(REPORT_CACHE_MB * 1024 * 1024))
+    return _cache
+
+
+__all__ = [
+    "REPORT_FORMATS", "render_report", "markdown_to_html", "site_results", "render_site_report", "get_report_cache",
+]
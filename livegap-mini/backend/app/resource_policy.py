@@ -0,0 +1,157 @@
+"""
+Request interception for agent runs.
+
+The agent only reads text and clicks elements, so images, media, fonts and
+third-party trackers/chat widgets are aborted at the context level. Sites that
+break without some of them opt back in through a ``resources`` block in
+config/sites.yaml:
+
+    resources:
+      enabled: true              # false disables interception for the site
+      allow_types: ["font"]      # resource types this site needs
+      allow_domains: ["hsforms.net"]
+      block_domains: ["cdn.example-widget.com"]
+
+Aborted requests never transfer a byte, so results report request counts per
+resource type and host. Note that Playwright disables the HTTP cache for
+routed contexts.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Tuple
+from urllib.parse import urlsplit
+
+from .models import ResourceStats
+from .runner import resource_overrides_for
+
+BLOCK_RESOURCES = os.getenv("BLOCK_RESOURCES", "true").lower() == "true"
+BLOCKED_RESOURCE_TYPES = frozenset(
+    t.strip() for t in os.getenv("BLOCKED_RESOURCE_TYPES", "image,media,font").split(",") if t.strip()
+)
+
+# Analytics, tag managers, session recorders and chat/marketing widgets.
+TRACKER_DOMAINS: Tuple[str, ...] = (
+    "google-analytics.com", "analytics.google.com", "googletagmanager.com", "googleadservices.com",
+    "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "facebook.com/tr",
+    "hotjar.com", "hotjar.io", "fullstory.com", "mouseflow.com", "clarity.ms", "logrocket.io",
+    "segment.com", "segment.io", "mixpanel.com", "amplitude.com", "heap.io", "heapanalytics.com",
+    "intercom.io", "intercomcdn.com",
+    "hs-scripts.com", "hs-analytics.net", "hs-banner.com", "hscollectedforms.net", "usemessages.com",
+    "drift.com", "driftt.com", "zdassets.com", "zopim.com", "crisp.chat", "tawk.to",
+    "optimizely.com", "vwo.com", "abtasty.com",
+    "ads.linkedin.com", "snap.licdn.com", "linkedin.com/px", "bat.bing.com", "ads-twitter.com",
+    "analytics.tiktok.com", "redditstatic.com/ads",
+    "cookielaw.org", "onetrust.com", "cookiebot.com", "trustarc.com",
+    "6sc.co", "bizible.com", "marketo.net", "clearbit.com", "demandbase.com",
+    "qualified.com", "chilipiper.com", "sentry.io", "nr-data.net",
+)
+
+
+def _domain_matches(host: str, path: str, pattern: str) -> bool:
+    """Match ``example.com`` against the host and its subdomains; ``example.com/px`` also checks the first path segment."""
+    domain, _, prefix = pattern.partition("/")
+    if host != domain and not host.endswith("." + domain):
+        return False
+    if not prefix:
+        return True
+    return path == "/" + prefix or path.startswith("/" + prefix + "/")
+
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    enabled: bool = True
+    blocked_types: FrozenSet[str] = BLOCKED_RESOURCE_TYPES
+    blocked_domains: Tuple[str, ...] = TRACKER_DOMAINS
+    allowed_domains: Tuple[str, ...] = ()
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if not self.enabled:
+            return False
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+        host = (parts.hostname or "").lower()
+        if any(_domain_matches(host, parts.path, d) for d in self.allowed_domains):
+            return False
+        if resource_type in self.blocked_types:
+            return True
+        return any(_domain_matches(host, parts.path, d) for d in self.blocked_domains)
+
+
+def policy_for_site(site_id: str) -> ResourcePolicy:
+    """Default policy with the site's config/sites.yaml overrides applied."""
+    overrides: Dict[str, Any] = resource_overrides_for(site_id)
+    enabled = BLOCK_RESOURCES and bool(overrides.get("enabled", True))
+    allow_types = set(overrides.get("allow_types") or [])
+    return ResourcePolicy(
+        enabled=enabled,
+        blocked_types=frozenset(BLOCKED_RESOURCE_TYPES - allow_types),
+        blocked_domains=TRACKER_DOMAINS + tuple(d.lower() for d in overrides.get("block_domains") or []),
+        allowed_domains=tuple(d.lower() for d in overrides.get("allow_domains") or []),
+    )
+
+
+@dataclass
+class ResourceBlocker:
+    """Route handler for one BrowserContext; counts what it lets through and what it aborts."""
+    policy: ResourcePolicy
+    allowed: int = 0
+    blocked: int = 0
+    by_type: Dict[str, int] = field(default_factory=dict)
+    by_domain: Dict[str, int] = field(default_factory=dict)
+
+    async def handle(self, route) -> None:
+        request = route.request
+        if self.policy.should_block(request.resource_type, request.url):
+            self.blocked += 1
+            self.by_type[request.resource_type] = self.by_type.get(request.resource_type, 0) + 1
+            host = (urlsplit(request.url).hostname or "").lower()
+            self.by_domain[host] = self.by_domain.get(host, 0) + 1
+            try:
+                await route.abort("blockedbyclient")
+            except Exception:
+                pass
+            return
+        self.allowed += 1
+        try:
+            await route.continue_()
+        except Exception:
+            pass
+
+    def snapshot(self) -> ResourceStats:
+        return ResourceStats(
+            allowed_requests=self.allowed,
+            blocked_requests=self.blocked,
+            blocked_by_type=dict(self.by_type),
+            blocked_by_domain=dict(self.by_domain),
+        )
+
+    def stats_since(self, start: ResourceStats) -> ResourceStats:
+        """Counters accumulated since ``start`` (splits one context's traffic across goals)."""
+        now = self.snapshot()
+
+        def diff(a: Dict[str, int], b: Dict[str, int]) -> Dict[str, int]:
+            return {k: v - b.get(k, 0) for k, v in a.items() if v - b.get(k, 0) > 0}
+
+        domains = diff(now.blocked_by_domain, start.blocked_by_domain)
+        top_domains = dict(sorted(domains.items(), key=lambda kv: -kv[1])[:10])
+        return ResourceStats(
+            allowed_requests=now.allowed_requests - start.allowed_requests,
+            blocked_requests=now.blocked_requests - start.blocked_requests,
+            blocked_by_type=diff(now.blocked_by_type, start.blocked_by_type),
+            blocked_by_domain=top_domains,
+        )
+
+
+async def install_resource_blocker(context, site_id: str) -> ResourceBlocker | None:
+    """Route every request of ``context`` through the site's policy; None when interception is off."""
+    policy = policy_for_site(site_id)
+    if not policy.enabled:
+        return None
+    blocker = ResourceBlocker(policy)
+    await context.route("**/*", blocker.handle)
+    return blocker
+
+
+__all__ = ["ResourcePolicy", "ResourceBlocker", "policy_for_site", "install_resource_blocker"]
@@ -0,0 +1,114 @@
+"""
+Cancellation and whole-run deadlines for the runs this process executes.
+
+``POST /run/{id}/cancel`` moves a run to "cancelling" in the runs store. The
+process executing the run holds a RunControl for it and stops the work it is
+tracking: inline site tasks are cancelled (their browser contexts close, their
+planner requests are abandoned and their video uploads skipped) and, in queue
+mode, the run's jobs are withdrawn from the workers. Sites that already
+finished keep their results. A cancel sent to another API worker reaches the
+executing one through the store within RUN_CANCEL_POLL_SECONDS.
+
+``deadline_seconds`` on a run request stops the run the same way once it has
+run that long; the run then finishes as "done" with the unfinished sites
+failed.
+"""
+import asyncio
+import os
+from typing import Callable, Dict, List, Set
+
+from .runs_store import get_run_store
+
+RUN_CANCEL_POLL_SECONDS = float(os.getenv("RUN_CANCEL_POLL_SECONDS", "2"))
+CANCELLED_REASON = "Run cancelled"
+
+
+class RunControl:
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.reason: str | None = None  # why the run was stopped; None while it runs
+        self._tasks: Set[asyncio.Task] = set()
+        self._cancellers: List[Callable[[str], None]] = []
+        self._background: List[asyncio.Handle | asyncio.Task] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def track(self, task: asyncio.Task) -> None:
+        """Cancel ``task`` when the run is stopped."""
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if self.cancelled:
+            task.cancel()
+
+    def on_cancel(self, canceller: Callable[[str], None]) -> None:
+        """Call ``canceller(reason)`` when the run is stopped (work that is not a local task).
+
+        Cancellers may block (e.g. a job queue write), so they run in a worker thread.
+        """
+        self._cancellers.append(canceller)
+        if self.cancelled:
+            self._call(canceller)
+
+    def _call(self, canceller: Callable[[str], None]) -> None:
+        future = asyncio.get_running_loop().run_in_executor(None, canceller, self.reason)
+        future.add_done_callback(self._report)
+
+    def _report(self, future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            print(f"[Runs] Could not stop work of run_id={self.run_id}: {future.exception()!r}")
+
+    def cancel(self, reason: str = CANCELLED_REASON) -> None:
+        if self.cancelled:
+            return
+        self.reason = reason
+        print(f"[Runs] Stopping run_id={self.run_id}: {reason} ({len(self._tasks)} site task(s) running)")
+        for task in list(self._tasks):
+            task.cancel()
+        for canceller in self._cancellers:
+            self._call(canceller)
+
+    async def _watch_store(self) -> None:
+        """Pick up cancel requests that reached another API worker."""
+        store = get_run_store()
+        while not self.cancelled:
+            await asyncio.sleep(RUN_CANCEL_POLL_SECONDS)
+            if await asyncio.to_thread(store.status, self.run_id) == "cancelling":
+                self.cancel()
+
+    def _start(self, deadline_seconds: float | None) -> None:
+        loop = asyncio.get_running_loop()
+        if deadline_seconds:
+            self._background.append(
+                loop.call_later(deadline_seconds, self.cancel, f"Run deadline of {deadline_seconds:g}s reached")
+            )
+        self._background.append(loop.create_task(self._watch_store()))
+
+    def _stop(self) -> None:
+        for handle in self._background:
+            handle.cancel()
+
+
+_controls: Dict[str, RunControl] = {}
+
+
+def start_control(run_id: str, deadline_seconds: float | None = None) -> RunControl:
+    """Register the run as executing here; must be called from the event loop running it."""
+    control = RunControl(run_id)
+    control._start(deadline_seconds)
+    _controls[run_id] = control
+    return control
+
+
+def get_control(run_id: str) -> RunControl | None:
+    return _controls.get(run_id)
+
+
+def end_control(run_id: str) -> None:
+    control = _controls.pop(run_id, None)
+    if control is not None:
+        control._stop()
+
+
+__all__ = ["RunControl", "CANCELLED_REASON", "start_control", "get_control", "end_control"]
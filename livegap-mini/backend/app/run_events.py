@@ -0,0 +1,141 @@
+"""
+Live run progress as Server-Sent Events.
+
+Runs publish events as things happen: ``status`` changes, one ``site_result``
+per finished site (per site×goal cell in matrix runs) and, with
+RUN_EVENTS_STEPS, one ``step`` per agent step. Events go to the run's event
+log in the runs store, so ``GET /run/{id}/events`` can replay them and
+resume after the ``Last-Event-ID`` a reconnecting client sends.
+
+Publishing never blocks the event loop: events are queued and one writer
+task per loop stores them, in order, from a worker thread (a SQLite write
+per agent step would otherwise stall every run and stream in the process
+whenever API workers contend for the file). Subscribers in the publishing
+process are woken as soon as an event is stored; with a shared SQLite runs
+store, subscribers on other API workers poll the log every
+RUN_EVENTS_POLL_SECONDS.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+
+from .runs_store import RunEvent, TERMINAL_STATUSES, get_run_store
+
+RUN_EVENTS_STEPS = os.getenv("RUN_EVENTS_STEPS", "true").lower() == "true"
+RUN_EVENTS_POLL_SECONDS = float(os.getenv("RUN_EVENTS_POLL_SECONDS", "1.0"))
+RUN_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("RUN_EVENTS_HEARTBEAT_SECONDS", "15"))
+RUN_EVENTS_RETRY_MS = 2000  # reconnect delay suggested to EventSource clients
+RUN_EVENTS_WRITE_BATCH = 100  # events stored per trip to the worker thread
+
+_subscribers: Dict[str, Set[asyncio.Event]] = {}
+# Pending events and the task storing them, for the loop they were published on
+_pending: "asyncio.Queue[Tuple[str, str, Dict[str, Any]]] | None" = None
+_writer: asyncio.Task | None = None
+
+
+def _store_events(batch: List[Tuple[str, str, Dict[str, Any]]]) -> List[str]:
+    """Append the events to their runs' logs (blocking); returns the ids of the runs that got one."""
+    store = get_run_store()
+    stored = []
+    for run_id, type, data in batch:
+        try:
+            if store.append_event(run_id, type, data) is not None:
+                stored.append(run_id)
+        except sqlite3.Error as e:
+            print(f"[Events] Could not record {type} event for run_id={run_id}: {e!r}")
+    return stored
+
+
+def _wake(run_id: str) -> None:
+    for wake in _subscribers.get(run_id, ()):
+        wake.set()
+
+
+async def _write_events(pending: asyncio.Queue) -> None:
+    while True:
+        batch = [await pending.get()]
+        while len(batch) < RUN_EVENTS_WRITE_BATCH and not pending.empty():
+            batch.append(pending.get_nowait())
+        try:
+            for run_id in await asyncio.to_thread(_store_events, batch):
+                _wake(run_id)
+        except Exception as e:
+            print(f"[Events] Could not record {len(batch)} event(s): {e!r}")
+        finally:
+            for _ in batch:
+                pending.task_done()
+
+
+def publish(run_id: str, type: str, data: Dict[str, Any]) -> None:
+    """Queue an event for the run's log; it is stored off the event loop, in order. Never blocks or raises.
+
+    Outside an event loop the event is stored right away.
+    """
+    global _pending, _writer
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        for stored in _store_events([(run_id, type, data)]):
+            _wake(stored)
+        return
+    if _writer is None or _writer.done() or _writer.get_loop() is not loop:
+        _pending = asyncio.Queue()
+        _writer = loop.create_task(_write_events(_pending))
+    _pending.put_nowait((run_id, type, data))
+
+
+async def flush() -> None:
+    """Wait until the events published so far on this loop are stored."""
+    if _pending is not None and _writer is not None and not _writer.done() \
+            and _writer.get_loop() is asyncio.get_running_loop():
+        await _pending.join()
+
+
+def format_sse(event: RunEvent) -> str:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+
+async def stream(run_id: str, after_id: int = 0) -> AsyncIterator[str]:
+    """SSE text for every event after ``after_id``, following the run until it finishes."""
+    store = get_run_store()
+    wake = asyncio.Event()
+    _subscribers.setdefault(run_id, set()).add(wake)
+    try:
+        yield f"retry: {RUN_EVENTS_RETRY_MS}\n\n"
+        last_sent = time.monotonic()
+        finished_polls = 0
+        while True:
+            wake.clear()
+            events = await asyncio.to_thread(store.events_after, run_id, after_id)
+            for event in events:
+                yield format_sse(event)
+                after_id = event.id
+            if events:
+                last_sent = time.monotonic()
+                if events[-1].type == "status" and events[-1].data.get("status") in TERMINAL_STATUSES:
+                    return
+            elif await asyncio.to_thread(store.status, run_id) in (None, *TERMINAL_STATUSES):
+                # Finished without a closing event we can see (e.g. it predates the log); one last look
+                finished_polls += 1
+                if finished_polls > 1:
+                    return
+            timeout = min(RUN_EVENTS_POLL_SECONDS, max(0.0, last_sent + RUN_EVENTS_HEARTBEAT_SECONDS - time.monotonic()))
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            if time.monotonic() - last_sent >= RUN_EVENTS_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        waiting = _subscribers.get(run_id)
+        if waiting is not None:
+            waiting.discard(wake)
+            if not waiting:
+                _subscribers.pop(run_id, None)
+
+
+__all__ = ["publish", "flush", "stream", "format_sse", "RUN_EVENTS_STEPS"]
@@ -0,0 +1,91 @@
+"""
+Encoded ``GET /run/{id}`` responses, cached once a run is finished.
+
+A done or errored run can no longer change, so its JSON is encoded once and
+the bytes are kept in a size-bounded LRU (RUN_RESPONSE_CACHE_MB) with a
+strong ETag; polls that send the ETag back in ``If-None-Match`` get a 304
+with no body. The result is encoded by pydantic's Rust serializer
+(``model_dump_json``) rather than ``model_dump`` followed by ``json.dumps``.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Dict, Tuple
+
+from .runs_store import RunRecord, to_dict
+
+RUN_RESPONSE_CACHE_MB = float(os.getenv("RUN_RESPONSE_CACHE_MB", "64"))  # 0 disables the cache
+
+
+def encode_run(run: RunRecord) -> bytes:
+    """JSON bytes of ``to_dict(run)``."""
+    head = json.dumps(to_dict(replace(run, result=None)), separators=(",", ":"))
+    if run.result is None:
+        return head.encode()
+    return f'{head[:-1]},"result":{run.result.model_dump_json()}}}'.encode()
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """``If-None-Match`` check (weak comparison, as RFC 9110 requires for it)."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class RunResponseCache:
+    """LRU of (etag, body) per key (a finished run's id here), bounded by total body size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, run_id: str) -> Tuple[str, bytes] | None:
+        with self._lock:
+            entry = self._entries.get(run_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(run_id)
+            self.hits += 1
+            return entry
+
+    def put(self, run_id: str, etag: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(run_id, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[run_id] = (etag, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+_cache: RunResponseCache | None = None
+
+
+def get_run_response_cache() -> RunResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = RunResponseCache(int(RUN_RESPONSE_CACHE_MB * 1024 * 1024))
+    return _cache
+
+
+__all__ = ["RunResponseCache", "encode_run", "etag_for", "etag_matches", "get_run_response_cache"]
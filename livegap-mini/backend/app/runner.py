@@ -1,8 +1,9 @@
 import os
 import yaml
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import Any, List, Dict, FrozenSet, Tuple
 from .models import Goal
+from .url_matcher import normalize_url
 
 @dataclass
 class Site:
@@ -12,6 +13,11 @@ class Site:
 
 _sites_cache: List[Site] | None = None
 _success_cache: Dict[str, Dict[Goal, List[str]]] | None = None
+_resources_cache: Dict[str, Dict[str, Any]] | None = None
+# Normalized success URLs per (site, goal), built once at load so per-step checks are a set lookup
+_success_index: Dict[Tuple[str, Goal], FrozenSet[str]] | None = None
+# Union of every site's success URLs per goal (link scoring for the heuristic planner)
+_goal_success_index: Dict[Goal, FrozenSet[str]] | None = None
 
 def _config_path() -> str:
     return os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "sites.yaml")
@@ -22,18 +28,20 @@ def _load_yaml() -> Dict:
         return yaml.safe_load(f) or {}
 
 def load_sites() -> List[Site]:
-    global _sites_cache, _success_cache
+    global _sites_cache, _success_cache, _resources_cache, _success_index, _goal_success_index
     if _sites_cache is not None:
         return _sites_cache
     raw = _load_yaml()
     sites: List[Site] = []
     success_map: Dict[str, Dict[Goal, List[str]]] = {}
+    resources_map: Dict[str, Dict[str, Any]] = {}
     for entry in raw.get("sites", []):
         sid = entry.get("id")
         if not sid:
             continue
         site = Site(id=sid, name=entry.get("name", sid), url=entry.get("start_url", ""))
         sites.append(site)
+        resources_map[sid] = entry.get("resources") or {}
         success_map[sid] = {}
         success_cfg = entry.get("success", {})
         for key, urls in success_cfg.items():
@@ -44,6 +52,16 @@ def load_sites() -> List[Site]:
                     success_map[sid][g] = urls or []
     _sites_cache = sites
     _success_cache = success_map
+    _resources_cache = resources_map
+    _success_index = {
+        (sid, g): frozenset(normalize_url(u) for u in urls if u)
+        for sid, goals in success_map.items()
+        for g, urls in goals.items()
+    }
+    _goal_success_index = {
+        g: frozenset().union(*(urls for (_, goal), urls in _success_index.items() if goal == g))
+        for g in Goal
+    }
     return sites
 
 def success_urls_for(site_id: str, goal: Goal) -> List[str]:
@@ -51,4 +69,22 @@ def success_urls_for(site_id: str, goal: Goal) -> List[str]:
         load_sites()
     return (_success_cache.get(site_id, {}) or {}).get(goal, [])
 
-__all__ = ["Site", "load_sites", "success_urls_for"]
+def success_url_set(site_id: str, goal: Goal) -> FrozenSet[str]:
+    """Precompiled, normalized success URLs for a (site, goal) pair."""
+    if _success_index is None:
+        load_sites()
+    return _success_index.get((site_id, goal), frozenset())
+
+def goal_success_url_set(goal: Goal) -> FrozenSet[str]:
+    """Normalized success URLs of every site for ``goal``."""
+    if _goal_success_index is None:
+        load_sites()
+    return _goal_success_index.get(goal, frozenset())
+
+def resource_overrides_for(site_id: str) -> Dict[str, Any]:
+    """Per-site request interception overrides (the ``resources`` block in sites.yaml)."""
+    if _resources_cache is None:
+        load_sites()
+    return _resources_cache.get(site_id, {}) or {}
+
+__all__ = ["Site", "load_sites", "success_urls_for", "success_url_set", "goal_success_url_set", "resource_overrides_for"]
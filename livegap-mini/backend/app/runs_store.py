@@ -1,59 +1,849 @@
 """
-In-memory store for tracking background reality check runs.
-For production, consider using a database (PostgreSQL, Redis, etc.)
+Store for tracking background reality check runs.
+
+The default "memory" backend keeps runs in the process (lost on restart,
+one API worker only). It holds at most RUNS_MEMORY_MAX_RUNS runs /
+RUNS_MEMORY_MAX_MB of results and event logs: beyond that, and after
+RUNS_MEMORY_TTL_SECONDS, the oldest finished runs leave memory and are
+written to a gzip JSON file per run under RUNS_ARCHIVE_DIR, from the
+calling thread and outside the store lock. ``get`` and listings fall back
+to the archive, whose index keeps only each run's totals. The archive is
+bounded too: beyond RUNS_ARCHIVE_MAX_RUNS runs, or RUNS_ARCHIVE_TTL_SECONDS
+after a run was created, it is forgotten and its file deleted.
+RUNS_STORE_BACKEND=sqlite keeps runs in a WAL-mode
+SQLite file (RUNS_DB_PATH) that several API workers can share and that
+survives deploys: one row per run, indexed by status and created_at, and
+one row per site result.
+
+Status changes go through :meth:`RunStore.transition`, which only moves a
+run along ALLOWED_TRANSITIONS and does so atomically, so two workers cannot
+both finish (or both start) the same run. A cancel request moves a run to
+"cancelling"; whichever process executes it stops its sites and records
+"cancelled" with the partial results.
+
+Listing is paginated newest first with an opaque cursor. Both backends
+keep that order as an index maintained on insert (an append-only list in
+memory, the created_at index in SQLite) instead of sorting on every
+request, and can skip loading per-site results for summary listings.
+
+Each run also has an append-only event log (status changes, site results,
+steps) with per-run increasing ids, which app.run_events streams to clients.
 """
-from dataclasses import dataclass, asdict
-from datetime import datetime
-from typing import Optional, Dict
-from .models import RunResponse
+import base64
+import binascii
+import bisect
+import glob
+import gzip
+import heapq
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Dict, Iterable, List, Tuple, Union
+from .models import Goal, RunResponse, MatrixRunResponse, MatrixRow, SiteResult
+
+RUNS_STORE_BACKEND = os.getenv("RUNS_STORE_BACKEND", "memory")
+RUNS_DB_PATH = os.getenv("RUNS_DB_PATH", "runs.db")
+RUNS_PAGE_SIZE = int(os.getenv("RUNS_PAGE_SIZE", "50"))  # default page size for GET /runs
+RUNS_PAGE_MAX = 500
+RUNS_MEMORY_MAX_RUNS = int(os.getenv("RUNS_MEMORY_MAX_RUNS", "200"))  # runs kept whole in memory (memory backend)
+RUNS_MEMORY_MAX_MB = float(os.getenv("RUNS_MEMORY_MAX_MB", "256"))  # serialized size of their results and event logs
+RUNS_MEMORY_TTL_SECONDS = float(os.getenv("RUNS_MEMORY_TTL_SECONDS", "3600"))  # archive finished runs after this; 0 = never
+RUNS_ARCHIVE_DIR = os.getenv("RUNS_ARCHIVE_DIR", "runs_archive")  # empty = evicted runs keep only their totals
+RUNS_ARCHIVE_MAX_RUNS = int(os.getenv("RUNS_ARCHIVE_MAX_RUNS", "10000"))  # archived runs kept (index and files)
+RUNS_ARCHIVE_TTL_SECONDS = float(os.getenv("RUNS_ARCHIVE_TTL_SECONDS", str(7 * 24 * 3600)))  # since creation; 0 = never
+
+# Terminal statuses have no outgoing transitions
+ALLOWED_TRANSITIONS: Dict[str, tuple] = {
+    "pending": ("running", "done", "error", "cancelling", "cancelled"),
+    "running": ("done", "error", "cancelling"),
+    "cancelling": ("cancelled", "error"),
+}
+TERMINAL_STATUSES = ("done", "error", "cancelled")
+RUN_STATUSES = ("pending", "running", "cancelling", *TERMINAL_STATUSES)
+# Optional parts of a run in listings: per-site results, and the steps / markdown reports inside them
+RUN_DETAILS = ("results", "steps", "reports")
+
+RunResult = Union[RunResponse, MatrixRunResponse]
+
 
 @dataclass
 class RunRecord:
     id: str
     created_at: datetime
-    status: str  # "pending" | "running" | "done" | "error"
-    result: Optional[RunResponse] = None
+    status: str  # "pending" | "running" | "cancelling" | "done" | "error" | "cancelled"
+    result: Optional[RunResult] = None
     error: Optional[str] = None
+    goals: List[Goal] = field(default_factory=list)
+
+
+@dataclass
+class RunEvent:
+    id: int  # 1, 2, ... per run; clients resume after the last id they saw
+    type: str  # "status" | "site_result" | "step"
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+class InvalidCursor(ValueError):
+    """The listing cursor was not issued by this store."""
+
+
+def _encode_cursor(*key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(f"Invalid cursor {cursor!r}") from None
+    if not isinstance(key, list):
+        raise InvalidCursor(f"Invalid cursor {cursor!r}")
+    return key
+
+
+class RunStore(ABC):
+    """Interface shared by run store backends."""
+
+    @abstractmethod
+    def create(self, run_id: str, goals: Iterable[Goal] = ()) -> RunRecord:
+        ...
+
+    @abstractmethod
+    def get(self, run_id: str) -> Optional[RunRecord]:
+        ...
+
+    @abstractmethod
+    def transition(
+        self,
+        run_id: str,
+        status: str,
+        result: Optional[RunResult] = None,
+        error: Optional[str] = None,
+        from_statuses: Iterable[str] | None = None,
+    ) -> bool:
+        """Move the run to ``status`` if it is currently in ``from_statuses`` (default: any status
+        allowed to reach ``status``). All-or-nothing; False if the run is missing or in another status."""
+
+    @abstractmethod
+    def list_runs(self) -> List[RunRecord]:
+        """All runs, newest first."""
 
-# Global in-memory storage (not suitable for multi-worker deployments)
+    @abstractmethod
+    def list_page(
+        self,
+        limit: int,
+        cursor: str | None = None,
+        status: str | None = None,
+        goal: Goal | None = None,
+        with_results: bool = True,
+    ) -> Tuple[List[RunRecord], Optional[str]]:
+        """Up to ``limit`` runs newest first, after ``cursor``; returns (runs, cursor for the next page or None).
+
+        Without ``with_results`` the run results carry only their totals (no per-site results).
+        Raises InvalidCursor for a cursor this store did not issue.
+        """
+
+    def status(self, run_id: str) -> Optional[str]:
+        """Just the status, without loading results."""
+        run = self.get(run_id)
+        return run.status if run else None
+
+    @abstractmethod
+    def append_event(self, run_id: str, type: str, data: Dict[str, Any]) -> Optional[RunEvent]:
+        """Add an event to the run's log; None if the store dropped it (unknown or archived run)."""
+
+    @abstractmethod
+    def events_after(self, run_id: str, after_id: int = 0) -> List[RunEvent]:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring."""
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+def _sources(status: str, from_statuses: Iterable[str] | None) -> tuple:
+    if from_statuses is not None:
+        return tuple(from_statuses)
+    return tuple(src for src, targets in ALLOWED_TRANSITIONS.items() if status in targets)
+
+
+def _summary_only(result: RunResult) -> RunResult:
+    """The result's totals without the per-site results (and their steps and reports)."""
+    if isinstance(result, MatrixRunResponse):
+        return result.model_copy(update={"rows": []})
+    return result.model_copy(update={"results": []})
+
+
+class RunArchive:
+    """Finished runs as one gzip JSON file each."""
+
+    _SAFE_ID = re.compile(r"[A-Za-z0-9_.-]+")
+    _SUFFIX = ".json.gz"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, run_id: str) -> Optional[str]:
+        if not self._SAFE_ID.fullmatch(run_id) or run_id.startswith("."):
+            return None
+        return os.path.join(self.directory, f"{run_id}{self._SUFFIX}")
+
+    def write(self, run: RunRecord) -> bool:
+        path = self._path(run.id)
+        if path is None:
+            return False
+        data = {
+            "id": run.id,
+            "created_at": run.created_at.isoformat(),
+            "status": run.status,
+            "error": run.error,
+            "goals": [g.value for g in run.goals],
+            "kind": "matrix" if isinstance(run.result, MatrixRunResponse) else "reality",
+            "result": run.result.model_dump(mode="json") if run.result else None,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)  # readers never see a half-written file
+        return True
+
+    def read(self, run_id: str) -> Optional[RunRecord]:
+        path = self._path(run_id)
+        if path is None or not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        result = None
+        if data["result"] is not None:
+            model = MatrixRunResponse if data["kind"] == "matrix" else RunResponse
+            result = model.model_validate(data["result"])
+        return RunRecord(
+            id=data["id"], created_at=datetime.fromisoformat(data["created_at"]), status=data["status"],
+            result=result, error=data["error"], goals=[Goal(g) for g in data["goals"]],
+        )
+
+    def delete(self, run_id: str) -> None:
+        path = self._path(run_id)
+        if path is not None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def sweep(self, max_runs: int, ttl_seconds: float) -> int:
+        """Delete files beyond the newest ``max_runs`` or older than ``ttl_seconds`` (e.g. left by an
+        earlier process, whose index is gone); returns how many were deleted."""
+        files = []
+        for path in glob.glob(os.path.join(glob.escape(self.directory), f"*{self._SUFFIX}")):
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        files.sort(reverse=True)
+        cutoff = time.time() - ttl_seconds if ttl_seconds > 0 else None
+        removed = 0
+        for position, (mtime, path) in enumerate(files):
+            if position >= max_runs or (cutoff is not None and mtime < cutoff):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+# Global in-memory storage for the memory backend (not suitable for multi-worker deployments)
 RUNS: Dict[str, RunRecord] = {}
 
-def to_dict(run: RunRecord) -> dict:
-    """Convert RunRecord to JSON-serializable dict"""
+
+class MemoryRunStore(RunStore):
+    def __init__(
+        self,
+        runs: Dict[str, RunRecord] = RUNS,
+        max_runs: int = RUNS_MEMORY_MAX_RUNS,
+        max_bytes: int = int(RUNS_MEMORY_MAX_MB * 1024 * 1024),
+        ttl_seconds: float = RUNS_MEMORY_TTL_SECONDS,
+        archive_dir: str = RUNS_ARCHIVE_DIR,
+        archive_max_runs: int = RUNS_ARCHIVE_MAX_RUNS,
+        archive_ttl_seconds: float = RUNS_ARCHIVE_TTL_SECONDS,
+    ):
+        self.runs = runs  # runs held whole in memory
+        self.events: Dict[str, List[RunEvent]] = {}
+        self._lock = threading.Lock()
+        # Creation-order index of self.runs: _seqs ascending, _index[i] created as _seqs[i]; read backwards for newest first
+        self._counter = itertools.count(1)
+        self._seqs: List[int] = []
+        self._index: List[RunRecord] = []
+        self._seq_of: Dict[str, int] = {}
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.archive = RunArchive(archive_dir) if archive_dir else None
+        self.archive_max_runs = archive_max_runs
+        self.archive_ttl_seconds = archive_ttl_seconds
+        # Finished runs still held whole, oldest first: run_id -> (finished at, serialized result size)
+        self._finished: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._event_bytes: Dict[str, int] = {}  # serialized size of each held run's event log
+        self._bytes = 0  # results of finished runs plus every held run's event log
+        # Archived runs in creation order like _seqs/_index, as summaries (totals only)
+        self._archived_seqs: List[int] = []
+        self._archived_index: List[RunRecord] = []
+        self._archived: Dict[str, RunRecord] = {}
+        # Evicted runs whose archive file is still being written; get() serves them from here meanwhile
+        self._spilling: Dict[str, RunRecord] = {}
+        self._swept = False
+        self.evictions = 0
+        self.archive_loads = 0
+        self.archive_errors = 0
+        self.archive_removals = 0
+
+    @staticmethod
+    def _remove_sorted(seqs: List[int], index: List[RunRecord], seq: int) -> None:
+        i = bisect.bisect_left(seqs, seq)
+        if i < len(seqs) and seqs[i] == seq:
+            del seqs[i]
+            del index[i]
+
+    def _evict(self) -> List[RunRecord]:
+        """Move the oldest finished runs to the archive index while over the run/byte limits or past the TTL,
+        and forget archived runs over the archive limits. Caller holds the lock and then calls
+        :meth:`_spill` with the result, without the lock."""
+        now = time.monotonic()
+        evicted: List[RunRecord] = []
+        while self._finished:
+            run_id, (finished_at, size) = next(iter(self._finished.items()))
+            expired = self.ttl_seconds > 0 and now - finished_at >= self.ttl_seconds
+            if not expired and len(self.runs) <= self.max_runs and self._bytes <= self.max_bytes:
+                break
+            self._finished.popitem(last=False)
+            self._bytes -= size + self._event_bytes.pop(run_id, 0)
+            self.events.pop(run_id, None)
+            run = self.runs.pop(run_id, None)
+            seq = self._seq_of.pop(run_id, None)
+            if run is None or seq is None:
+                continue
+            self._remove_sorted(self._seqs, self._index, seq)
+            summary = RunRecord(
+                id=run.id, created_at=run.created_at, status=run.status,
+                result=_summary_only(run.result) if run.result else None, error=run.error, goals=run.goals,
+            )
+            i = bisect.bisect_left(self._archived_seqs, seq)
+            self._archived_seqs.insert(i, seq)
+            self._archived_index.insert(i, summary)
+            self._archived[run_id] = summary
+            if self.archive is not None:
+                self._spilling[run_id] = run
+            evicted.append(run)
+            self.evictions += 1
+        return evicted
+
+    def _expire_archive(self) -> List[str]:
+        """Forget archived runs beyond the archive limits, oldest first. Caller holds the lock."""
+        cutoff = (
+            datetime.utcnow() - timedelta(seconds=self.archive_ttl_seconds) if self.archive_ttl_seconds > 0 else None
+        )
+        removed = []
+        while self._archived_index and (
+            len(self._archived_index) > self.archive_max_runs
+            or (cutoff is not None and self._archived_index[0].created_at < cutoff)
+        ):
+            del self._archived_seqs[0]
+            run = self._archived_index.pop(0)
+            self._archived.pop(run.id, None)
+            removed.append(run.id)
+            self.archive_removals += 1
+        return removed
+
+    def _spill(self, evicted: List[RunRecord]) -> None:
+        """Write evicted runs to the archive and delete expired archive files. Blocking file I/O, so it
+        runs without the lock in the calling thread (async callers use asyncio.to_thread)."""
+        if self.archive is None:
+            with self._lock:
+                self._expire_archive()
+            return
+        for run in evicted:
+            try:
+                if not self.archive.write(run):
+                    print(f"[Runs] run_id={run.id!r} cannot be archived; keeping only its totals")
+            except OSError as e:
+                self.archive_errors += 1
+                print(f"[Runs] Could not archive run_id={run.id}: {e!r}; keeping only its totals")
+            with self._lock:
+                self._spilling.pop(run.id, None)
+        with self._lock:
+            removed = self._expire_archive()
+            removed += [run.id for run in evicted if run.id not in self._archived]  # expired while being written
+            sweep = not self._swept and bool(evicted)
+            self._swept = self._swept or sweep
+        for run_id in removed:
+            try:
+                self.archive.delete(run_id)
+            except OSError as e:
+                print(f"[Runs] Could not delete archived run_id={run_id}: {e!r}")
+        if sweep:
+            leftovers = self.archive.sweep(self.archive_max_runs, self.archive_ttl_seconds)
+            if leftovers:
+                print(f"[Runs] Deleted {leftovers} archived run(s) over the archive limits")
+
+    def _load(self, run: RunRecord) -> RunRecord:
+        """The whole run for an archived summary (the summary itself if the archive has no copy)."""
+        with self._lock:
+            spilling = self._spilling.get(run.id)
+        if spilling is not None:
+            return spilling
+        if self.archive is None:
+            return run
+        try:
+            full = self.archive.read(run.id)
+        except (OSError, ValueError) as e:
+            self.archive_errors += 1
+            print(f"[Runs] Could not load archived run_id={run.id}: {e!r}")
+            return run
+        if full is None:
+            return run
+        self.archive_loads += 1
+        return full
+
+    def create(self, run_id: str, goals: Iterable[Goal] = ()) -> RunRecord:
+        run = RunRecord(id=run_id, created_at=datetime.utcnow(), status="pending", goals=list(goals))
+        with self._lock:
+            replaced = self._archived.pop(run_id, None)
+            if replaced is not None:
+                i = next(i for i, archived in enumerate(self._archived_index) if archived is replaced)
+                del self._archived_seqs[i]
+                del self._archived_index[i]
+            seq = next(self._counter)
+            self.runs[run_id] = run
+            self._seq_of[run_id] = seq
+            self._seqs.append(seq)
+            self._index.append(run)
+            evicted = self._evict()
+        self._spill(evicted)
+        return run
+
+    def get(self, run_id: str) -> Optional[RunRecord]:
+        run = self.runs.get(run_id)
+        if run is not None:
+            return run
+        summary = self._archived.get(run_id)
+        return self._load(summary) if summary is not None else None
+
+    def status(self, run_id: str) -> Optional[str]:
+        run = self.runs.get(run_id) or self._archived.get(run_id)
+        return run.status if run else None
+
+    def transition(self, run_id, status, result=None, error=None, from_statuses=None) -> bool:
+        with self._lock:
+            run = self.runs.get(run_id)
+            if run is None or run.status not in _sources(status, from_statuses):
+                return False
+            run.status = status
+            if result:
+                run.result = result
+            if error:
+                run.error = error
+            if status in TERMINAL_STATUSES:
+                size = len(run.result.model_dump_json()) if run.result else 0
+                self._finished[run_id] = (time.monotonic(), size)
+                self._bytes += size
+            evicted = self._evict()
+        self._spill(evicted)
+        return True
+
+    def _newest_first(self, before: int | None):
+        """(seq, run) for held and archived runs created before ``before``, newest first. Caller holds the lock."""
+        held_end = bisect.bisect_left(self._seqs, before) if before is not None else len(self._seqs)
+        archived_end = (
+            bisect.bisect_left(self._archived_seqs, before) if before is not None else len(self._archived_seqs)
+        )
+        held = ((self._seqs[i], self._index[i]) for i in range(held_end - 1, -1, -1))
+        archived = ((self._archived_seqs[i], self._archived_index[i]) for i in range(archived_end - 1, -1, -1))
+        return heapq.merge(held, archived, key=lambda entry: entry[0], reverse=True)
+
+    def list_runs(self) -> List[RunRecord]:
+        with self._lock:
+            runs = [
+                run for _, run in self._newest_first(None)
+                if self.runs.get(run.id) is run or self._archived.get(run.id) is run
+            ]
+        return [self._load(run) if run.id in self._archived else run for run in runs]
+
+    def list_page(self, limit, cursor=None, status=None, goal=None, with_results=True):
+        before = _decode_cursor(cursor)[0] if cursor else None
+        if before is not None and not isinstance(before, int):
+            raise InvalidCursor(f"Invalid cursor {cursor!r}")
+        with self._lock:
+            evicted = self._evict()  # TTL expiry also happens on reads
+            page: List[RunRecord] = []
+            last_seq = None
+            for seq, run in self._newest_first(before):
+                if self.runs.get(run.id) is not run and self._archived.get(run.id) is not run:
+                    continue  # removed or replaced since
+                if (status and run.status != status) or (goal and goal not in run.goals):
+                    continue
+                if len(page) == limit:
+                    break
+                page.append(run)
+                last_seq = seq
+            else:
+                last_seq = None
+            archived = {run.id for run in page if self._archived.get(run.id) is run}
+        self._spill(evicted)
+        if with_results:
+            page = [self._load(run) if run.id in archived else run for run in page]
+        return page, _encode_cursor(last_seq) if last_seq is not None else None
+
+    def append_event(self, run_id: str, type: str, data: Dict[str, Any]) -> Optional[RunEvent]:
+        size = len(json.dumps(data))
+        with self._lock:
+            if run_id not in self.runs:
+                return None  # unknown, or archived (its log went with it): a late event would leak
+            log = self.events.setdefault(run_id, [])
+            event = RunEvent(id=len(log) + 1, type=type, data=data)
+            log.append(event)
+            self._event_bytes[run_id] = self._event_bytes.get(run_id, 0) + size
+            self._bytes += size
+            return event
+
+    def events_after(self, run_id: str, after_id: int = 0) -> List[RunEvent]:
+        return self.events.get(run_id, [])[max(0, after_id):]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            evicted = self._evict()
+        self._spill(evicted)
+        with self._lock:
+            return {
+                "backend": "memory",
+                "runs": len(self.runs) + len(self._archived),
+                "runs_in_memory": len(self.runs),
+                "result_bytes_in_memory": self._bytes - sum(self._event_bytes.values()),
+                "event_bytes_in_memory": sum(self._event_bytes.values()),
+                "archived": len(self._archived),
+                "evictions": self.evictions,
+                "archive_loads": self.archive_loads,
+                "archive_errors": self.archive_errors,
+                "archive_removals": self.archive_removals,
+                "max_runs": self.max_runs,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "archive_max_runs": self.archive_max_runs,
+                "archive_ttl_seconds": self.archive_ttl_seconds,
+            }
+
+
+class SQLiteRunStore(RunStore):
+    """Runs in a SQLite file; safe to share between API worker processes."""
+
+    def __init__(self, path: str = RUNS_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                status TEXT NOT NULL,
+                kind TEXT,
+                summary TEXT,
+                error TEXT,
+                goals TEXT
+            );
+            CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at);
+            CREATE INDEX IF NOT EXISTS runs_status_created_at ON runs (status, created_at);
+            CREATE TABLE IF NOT EXISTS run_goals (
+                run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+                goal TEXT NOT NULL,
+                PRIMARY KEY (goal, run_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS run_site_results (
+                run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                site_id TEXT NOT NULL,
+                goal TEXT,
+                success INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (run_id, position)
+            );
+            CREATE TABLE IF NOT EXISTS run_events (
+                run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+                seq INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (run_id, seq)
+            );
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(runs)")}
+        if "goals" not in columns:  # files created before runs recorded their goals
+            self._conn.execute("ALTER TABLE runs ADD COLUMN goals TEXT")
+
+    _COLUMNS = "id, created_at, status, kind, summary, error, goals"
+
+    @staticmethod
+    def _to_record(row, site_rows: List[SiteResult]) -> RunRecord:
+        run_id, created_at, status, kind, summary, error, goals = row
+        result: Optional[RunResult] = None
+        if summary:
+            data = json.loads(summary)
+            if kind == "matrix":
+                width = max(1, len(data["goals"]))
+                rows = [
+                    MatrixRow(site_id=cells[0].site_id, site_name=cells[0].site_name, url=cells[0].url, results=cells)
+                    for cells in (site_rows[i:i + width] for i in range(0, len(site_rows), width))
+                ]
+                result = MatrixRunResponse(**data, rows=rows)
+            else:
+                result = RunResponse(**data, results=site_rows)
+        return RunRecord(
+            id=run_id, created_at=datetime.fromisoformat(created_at), status=status, result=result, error=error,
+            goals=[Goal(g) for g in json.loads(goals)] if goals else [],
+        )
+
+    def _site_results(self, run_ids: List[str]) -> Dict[str, List[SiteResult]]:
+        by_run: Dict[str, List[SiteResult]] = {run_id: [] for run_id in run_ids}
+        if not run_ids:
+            return by_run
+        marks = ",".join("?" * len(run_ids))
+        rows = self._conn.execute(
+            f"SELECT run_id, result FROM run_site_results WHERE run_id IN ({marks}) ORDER BY run_id, position",
+            run_ids,
+        ).fetchall()
+        for run_id, result in rows:
+            by_run[run_id].append(SiteResult.model_validate_json(result))
+        return by_run
+
+    def create(self, run_id: str, goals: Iterable[Goal] = ()) -> RunRecord:
+        run = RunRecord(id=run_id, created_at=datetime.utcnow(), status="pending", goals=list(goals))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO runs (id, created_at, status, goals) VALUES (?, ?, ?, ?)",
+                    (run.id, run.created_at.isoformat(timespec="microseconds"), run.status,
+                     json.dumps([g.value for g in run.goals]) if run.goals else None),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO run_goals (run_id, goal) VALUES (?, ?)", [(run.id, g.value) for g in run.goals]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return run
+
+    def get(self, run_id: str) -> Optional[RunRecord]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            return self._to_record(row, self._site_results([run_id])[run_id])
+
+    def transition(self, run_id, status, result=None, error=None, from_statuses=None) -> bool:
+        sources = _sources(status, from_statuses)
+        if not sources:
+            return False
+        marks = ",".join("?" * len(sources))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                changed = self._conn.execute(
+                    f"UPDATE runs SET status = ?, error = COALESCE(?, error) WHERE id = ? AND status IN ({marks})",
+                    (status, error, run_id, *sources),
+                ).rowcount
+                if changed and result:
+                    self._write_result(run_id, result)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(changed)
+
+    def _write_result(self, run_id: str, result: RunResult) -> None:
+        if isinstance(result, MatrixRunResponse):
+            kind = "matrix"
+            summary = result.model_dump_json(exclude={"rows"})
+            cells = [cell for row in result.rows for cell in row.results]
+        else:
+            kind = "reality"
+            summary = result.model_dump_json(exclude={"results"})
+            cells = list(result.results)
+        self._conn.execute("UPDATE runs SET kind = ?, summary = ? WHERE id = ?", (kind, summary, run_id))
+        self._conn.execute("DELETE FROM run_site_results WHERE run_id = ?", (run_id,))
+        self._conn.executemany(
+            "INSERT INTO run_site_results (run_id, position, site_id, goal, success, result) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (run_id, pos, cell.site_id, cell.goal.value if cell.goal else None, int(cell.success), cell.model_dump_json())
+                for pos, cell in enumerate(cells)
+            ],
+        )
+
+    def list_runs(self) -> List[RunRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM runs ORDER BY created_at DESC, rowid DESC"
+            ).fetchall()
+            site_rows = self._site_results([row[0] for row in rows])
+        return [self._to_record(row, site_rows[row[0]]) for row in rows]
+
+    def list_page(self, limit, cursor=None, status=None, goal=None, with_results=True):
+        where, params = [], []
+        if cursor:
+            key = _decode_cursor(cursor)
+            if len(key) != 2 or not isinstance(key[0], str) or not isinstance(key[1], int):
+                raise InvalidCursor(f"Invalid cursor {cursor!r}")
+            where.append("(created_at, rowid) < (?, ?)")  # row value keeps the index order, unlike an OR
+            params += key
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if goal:
+            where.append("id IN (SELECT run_id FROM run_goals WHERE goal = ?)")
+            params.append(goal.value)
+        sql = f"SELECT {self._COLUMNS}, rowid FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit + 1)).fetchall()
+            page = rows[:limit]
+            site_rows = self._site_results([row[0] for row in page]) if with_results else {}
+        runs = [self._to_record(row[:-1], site_rows.get(row[0], [])) for row in page]
+        next_cursor = _encode_cursor(page[-1][1], page[-1][-1]) if len(rows) > limit else None
+        return runs, next_cursor
+
+    def status(self, run_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def append_event(self, run_id: str, type: str, data: Dict[str, Any]) -> RunEvent:
+        payload = json.dumps(data)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) + 1 FROM run_events WHERE run_id = ?", (run_id,)
+                ).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO run_events (run_id, seq, type, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (run_id, seq, type, payload, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return RunEvent(id=seq, type=type, data=data)
+
+    def events_after(self, run_id: str, after_id: int = 0) -> List[RunEvent]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, type, data FROM run_events WHERE run_id = ? AND seq > ? ORDER BY seq",
+                (run_id, after_id),
+            ).fetchall()
+        return [RunEvent(id=seq, type=type, data=json.loads(data)) for seq, type, data in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (runs,) = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()
+        return {"backend": "sqlite", "runs": runs}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+RUN_STORE_BACKENDS: Dict[str, Callable[[], RunStore]] = {
+    "memory": MemoryRunStore,
+    "sqlite": lambda: SQLiteRunStore(RUNS_DB_PATH),
+}
+
+_store: RunStore | None = None
+
+
+def get_run_store() -> RunStore:
+    """Process-wide store for the configured RUNS_STORE_BACKEND (created on first use)."""
+    global _store
+    if _store is None:
+        try:
+            factory = RUN_STORE_BACKENDS[RUNS_STORE_BACKEND]
+        except KeyError:
+            raise ValueError(f"Unknown RUNS_STORE_BACKEND={RUNS_STORE_BACKEND!r}") from None
+        _store = factory()
+    return _store
+
+
+def set_run_store(store: RunStore | None) -> None:
+    """Replace the process-wide store (tests, custom backends)."""
+    global _store
+    _store = store
+
+
+def _result_exclude(result: RunResult, include: Iterable[str]):
+    """pydantic ``exclude`` for the parts of a run result not in ``include`` (see RUN_DETAILS)."""
+    matrix = isinstance(result, MatrixRunResponse)
+    if "results" not in include:
+        return {"rows"} if matrix else {"results"}
+    cell = {name for name, detail in (("steps", "steps"), ("report", "reports")) if detail not in include}
+    if not cell:
+        return None
+    return {"rows": {"__all__": {"results": {"__all__": cell}}}} if matrix else {"results": {"__all__": cell}}
+
+
+def to_dict(run: RunRecord, include: Iterable[str] = RUN_DETAILS) -> dict:
+    """Convert RunRecord to JSON-serializable dict; ``include`` picks the optional parts of the result"""
     d = {
         "id": run.id,
         "created_at": run.created_at.isoformat(),
         "status": run.status,
     }
+    if run.goals:
+        d["goals"] = [g.value for g in run.goals]
     if run.result:
-        d["result"] = run.result.model_dump()
+        d["result"] = run.result.model_dump(exclude=_result_exclude(run.result, set(include)))
     if run.error:
         d["error"] = run.error
     return d
 
-def create_run(run_id: str) -> RunRecord:
+def create_run(run_id: str, goals: Iterable[Goal] = ()) -> RunRecord:
     """Create a new run record in pending state"""
-    run = RunRecord(
-        id=run_id,
-        created_at=datetime.utcnow(),
-        status="pending",
-    )
-    RUNS[run_id] = run
-    return run
+    return get_run_store().create(run_id, goals)
 
 def get_run(run_id: str) -> Optional[RunRecord]:
     """Retrieve a run record by ID"""
-    return RUNS.get(run_id)
+    return get_run_store().get(run_id)
 
-def update_run_status(run_id: str, status: str, result: Optional[RunResponse] = None, error: Optional[str] = None):
-    """Update run status and result/error"""
-    if run_id in RUNS:
-        RUNS[run_id].status = status
-        if result:
-            RUNS[run_id].result = result
-        if error:
-            RUNS[run_id].error = error
+def update_run_status(run_id: str, status: str, result: Optional[RunResult] = None, error: Optional[str] = None) -> bool:
+    """Move a run to ``status`` with its result/error; False if that transition is not allowed"""
+    changed = get_run_store().transition(run_id, status, result=result, error=error)
+    if not changed:
+        print(f"[Runs] Ignored status change of run_id={run_id} to {status!r}")
+    return changed
 
 def get_all_runs() -> list[RunRecord]:
     """Get all runs, sorted by creation time (newest first)"""
-    return sorted(RUNS.values(), key=lambda r: r.created_at, reverse=True)
+    return get_run_store().list_runs()
+
+def list_runs_page(
+    limit: int = RUNS_PAGE_SIZE,
+    cursor: str | None = None,
+    status: str | None = None,
+    goal: Goal | None = None,
+    with_results: bool = True,
+) -> Tuple[List[RunRecord], Optional[str]]:
+    """One page of runs newest first and the cursor for the next page (None on the last page)"""
+    return get_run_store().list_page(limit, cursor=cursor, status=status, goal=goal, with_results=with_results)
@@ -0,0 +1,117 @@
+"""
+Post-action settle strategies for the agent loop.
+
+``adaptive`` (default) waits for the load state when the action changed the
+URL and otherwise for DOM-mutation quiescence, so fast pages move on at once
+and slow SPAs are given time to render before the next snapshot. ``fixed``
+keeps the historical sleeps; ``none`` does not wait at all. Every wait is
+capped by AGENT_SETTLE_TIMEOUT_MS (by default the action's historical sleep,
+so adaptive is never slower than ``fixed``) and ends early when ``interrupt``
+is set (e.g. a success URL was reached).
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable
+
+SETTLE_STRATEGY = os.getenv("AGENT_SETTLE_STRATEGY", "adaptive").lower()  # adaptive | fixed | none
+SETTLE_TIMEOUT_MS = int(os.getenv("AGENT_SETTLE_TIMEOUT_MS", "0"))  # 0 = the action's fixed wait
+SETTLE_QUIET_MS = int(os.getenv("AGENT_SETTLE_QUIET_MS", "250"))
+
+# Resolves once no nodes have been added or removed for quietMs (or timeoutMs elapsed).
+# Attribute and text changes are ignored: carousels, clocks and CSS-class animations
+# mutate those continuously and would hold every wait to the cap.
+_QUIESCENCE_JS = """
+({ quietMs, timeoutMs }) => new Promise((resolve) => {
+  const start = performance.now();
+  let last = start;
+  const observer = new MutationObserver(() => { last = performance.now(); });
+  observer.observe(document, { subtree: true, childList: true });
+  const step = Math.max(16, Math.min(50, quietMs / 2));
+  const tick = () => {
+    const now = performance.now();
+    if (now - last >= quietMs || now - start >= timeoutMs) {
+      observer.disconnect();
+      resolve(Math.round(now - start));
+    } else {
+      setTimeout(tick, step);
+    }
+  };
+  setTimeout(tick, step);
+})
+"""
+
+
+async def _race(awaitable: Awaitable, interrupt: asyncio.Event | None, timeout_s: float) -> None:
+    """Await ``awaitable`` for at most ``timeout_s``, stopping early if ``interrupt`` is set."""
+    if timeout_s <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        return
+    task = asyncio.ensure_future(awaitable)
+    waiters = {task}
+    stop = asyncio.ensure_future(interrupt.wait()) if interrupt is not None else None
+    if stop is not None:
+        waiters.add(stop)
+    try:
+        await asyncio.wait(waiters, timeout=timeout_s, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in waiters:
+            if not t.done():
+                t.cancel()
+    if task.done() and not task.cancelled() and task.exception() is not None:
+        raise task.exception()
+
+
+async def pause(ms: int, interrupt: asyncio.Event | None = None, strategy: str | None = None) -> None:
+    """Cosmetic pre-action pause (cursor hover in recordings); only kept for the ``fixed`` strategy."""
+    if (strategy or SETTLE_STRATEGY) != "fixed" or (interrupt is not None and interrupt.is_set()):
+        return
+    await _race(asyncio.sleep(ms / 1000), interrupt, ms / 1000)
+
+
+async def settle(
+    page,
+    url_before: str,
+    fixed_ms: int,
+    interrupt: asyncio.Event | None = None,
+    strategy: str | None = None,
+) -> int:
+    """Wait for the page to settle after an action; returns the milliseconds spent waiting."""
+    strategy = strategy or SETTLE_STRATEGY
+    started = time.monotonic()
+    if strategy == "none" or (interrupt is not None and interrupt.is_set()):
+        return 0
+    if strategy == "fixed":
+        await _race(asyncio.sleep(fixed_ms / 1000), interrupt, fixed_ms / 1000)
+        return int((time.monotonic() - started) * 1000)
+
+    deadline = started + (SETTLE_TIMEOUT_MS or fixed_ms) / 1000
+
+    def remaining() -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    async def wait_for_load() -> None:
+        try:
+            await _race(page.wait_for_load_state("domcontentloaded", timeout=max(1, int(remaining() * 1000))), interrupt, remaining())
+        except Exception:
+            pass
+
+    if page.url != url_before:
+        await wait_for_load()
+    else:
+        try:
+            await _race(
+                page.evaluate(_QUIESCENCE_JS, {"quietMs": SETTLE_QUIET_MS, "timeoutMs": int(remaining() * 1000)}),
+                interrupt,
+                remaining(),
+            )
+        except Exception:
+            # Typically "execution context was destroyed": the action started a navigation
+            pass
+        if page.url != url_before:
+            await wait_for_load()
+    return int((time.monotonic() - started) * 1000)
+
+
+__all__ = ["settle", "pause", "SETTLE_STRATEGY"]
@@ -1,7 +1,15 @@
 from .models import Goal
-from .runner import success_urls_for
+from .runner import success_urls_for, success_url_set, goal_success_url_set
 
 def get_success_urls(site_id: str, goal: Goal) -> list[str]:
     return success_urls_for(site_id, goal)
 
-__all__ = ["get_success_urls"]
\ No newline at end of file
+def get_success_url_set(site_id: str, goal: Goal) -> frozenset[str]:
+    """Normalized success URLs, precompiled when sites are loaded."""
+    return success_url_set(site_id, goal)
+
+def get_goal_success_url_set(goal: Goal) -> frozenset[str]:
+    """Normalized success URLs for ``goal`` across all configured sites."""
+    return goal_success_url_set(goal)
+
+__all__ = ["get_success_urls", "get_success_url_set", "get_goal_success_url_set"]
\ No newline at end of file
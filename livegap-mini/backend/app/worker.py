@@ -0,0 +1,164 @@
+"""
+Standalone agent worker consuming the site-level job queue.
+
+Usage:
+  python -m app.worker                       # one process, MAX_CONCURRENT_SITES jobs at a time
+  python -m app.worker --processes 4         # four worker processes on this node
+  python -m app.worker --exit-when-idle      # drain the queue and exit (batch nodes)
+
+Each process owns its own browser pool and LLM client. Run the command on as
+many nodes as needed; they only share the queue (see app.job_queue).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from typing import List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from .agent import run_llm_agent_on_site, run_llm_agent_matrix_on_site
+from .browser_pool import start_browser_pool, stop_browser_pool
+from .job_queue import JOB_HEARTBEAT_SECONDS, JOB_LEASE_SECONDS, JOB_POLL_SECONDS, Job, JobQueue, get_job_queue
+from .llm import aclose_http_client
+from .models import SiteResult
+from .runner import load_sites
+
+
+async def process_job(job: Job) -> List[SiteResult]:
+    """Run the agent for one leased job."""
+    site = next((s for s in load_sites() if s.id == job.site_id), None)
+    if site is None:
+        raise ValueError(f"Unknown site_id={job.site_id!r} in this worker's config")
+    if len(job.goals) == 1:
+        return [await run_llm_agent_on_site(site, job.goals[0], video=job.video)]
+    return await run_llm_agent_matrix_on_site(site, job.goals, video=job.video)
+
+
+async def _keep_leased(queue: JobQueue, job: Job, worker_id: str, running: asyncio.Task) -> None:
+    """Extend the lease periodically while the job runs; stop the job once the lease is refused."""
+    while True:
+        await asyncio.sleep(min(JOB_HEARTBEAT_SECONDS, JOB_LEASE_SECONDS / 3))
+        if not await asyncio.to_thread(queue.extend, job.id, worker_id, JOB_LEASE_SECONDS):
+            # The run was cancelled, or the lease expired and another worker took the job over
+            print(f"[Worker] Lost lease on job {job.id}; stopping it")
+            running.cancel()
+            return
+
+
+async def _handle_job(queue: JobQueue, job: Job, worker_id: str) -> None:
+    print(f"[Worker] {worker_id} running job {job.id} run_id={job.run_id} site={job.site_id} attempt={job.attempts}")
+    running = asyncio.create_task(process_job(job))
+    heartbeat = asyncio.create_task(_keep_leased(queue, job, worker_id, running))
+    try:
+        results = await running
+    except asyncio.CancelledError:
+        if not heartbeat.done():
+            running.cancel()
+            raise  # the worker itself is shutting down
+        return
+    except Exception as e:
+        print(f"[Worker] Job {job.id} failed: {e!r}")
+        await asyncio.to_thread(queue.fail, job.id, worker_id, f"{e.__class__.__name__}: {e}")
+        return
+    finally:
+        heartbeat.cancel()
+    if not await asyncio.to_thread(queue.complete, job.id, worker_id, results):
+        print(f"[Worker] Job {job.id} finished after its lease moved to another worker; result dropped")
+
+
+async def run_worker(
+    queue: JobQueue | None = None,
+    worker_id: str | None = None,
+    concurrency: int | None = None,
+    stop: asyncio.Event | None = None,
+    exit_when_idle: bool = False,
+) -> None:
+    """Lease and run jobs until ``stop`` is set (or the queue is empty with ``exit_when_idle``)."""
+    queue = queue or get_job_queue()
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    concurrency = concurrency or int(os.getenv("MAX_CONCURRENT_SITES", "3"))
+    stop = stop or asyncio.Event()
+    active: set[asyncio.Task] = set()
+    print(f"[Worker] {worker_id} started (concurrency={concurrency})")
+
+    await start_browser_pool()
+    try:
+        while not stop.is_set():
+            job = None
+            if len(active) < concurrency:
+                job = await asyncio.to_thread(queue.lease, worker_id, JOB_LEASE_SECONDS)
+            if job is not None:
+                task = asyncio.create_task(_handle_job(queue, job, worker_id))
+                active.add(task)
+                task.add_done_callback(active.discard)
+                continue
+            if exit_when_idle and not active:
+                break
+            # Wake on a free slot, a stop request, or the next poll tick
+            waiters = set(active) | {asyncio.ensure_future(stop.wait())}
+            done, pending = await asyncio.wait(waiters, timeout=JOB_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            for w in pending - active:
+                w.cancel()
+        if active:
+            print(f"[Worker] {worker_id} finishing {len(active)} running job(s)")
+            await asyncio.gather(*active, return_exceptions=True)
+    finally:
+        await stop_browser_pool()
+        await aclose_http_client()
+        print(f"[Worker] {worker_id} stopped")
+
+
+async def _serve(worker_id: str, concurrency: int, exit_when_idle: bool) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+    await run_worker(worker_id=worker_id, concurrency=concurrency, stop=stop, exit_when_idle=exit_when_idle)
+
+
+def _process_main(worker_id: str, concurrency: int, exit_when_idle: bool) -> None:
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(_serve(worker_id, concurrency, exit_when_idle))
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run agent jobs from the job queue")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start on this node")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("MAX_CONCURRENT_SITES", "3")),
+                        help="Jobs run at once per process")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args(argv)
+
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    if args.processes <= 1:
+        _process_main(base_id, args.concurrency, args.exit_when_idle)
+        return
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(target=_process_main, args=(f"{base_id}/{i}", args.concurrency, args.exit_when_idle))
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
 """Tests for agent module with Playwright browser mocking"""
 import pytest
 from unittest.mock import Mock, patch, MagicMock, AsyncMock
-from app.agent import render_report, run_llm_agent_on_site
+from app.agent import run_llm_agent_on_site
+from app.reports import render_report
 from app.models import Step, Goal, SiteResult
 from app.runner import Site
+from app import playbooks
+
+
+@pytest.fixture(autouse=True)
+def fresh_playbooks(monkeypatch):
+    """Give every test an empty in-memory playbook store"""
+    store = playbooks.PlaybookStore()
+    monkeypatch.setattr(playbooks, "_store", store)
+    return store
 
 
 def test_render_report_empty():
@@ -425,3 +435,557 @@ async def test_run_llm_agent_error_handling(mock_classify, mock_plan, mock_playw
     
     # Should complete despite error
     assert result.site_id == "test"
+
+
+@pytest.mark.asyncio
+@patch('app.agent.async_playwright')
+@patch('app.agent.get_browser_pool')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_uses_browser_pool(mock_classify, mock_plan, mock_get_pool, mock_playwright):
+    """Test agent borrows a context from the shared pool instead of launching Chromium"""
+    from contextlib import asynccontextmanager
+
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.goto = AsyncMock()
+    mock_page.url = "https://example.com/success"
+    mock_page.video = None
+    mock_page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="page text")))
+
+    borrowed = []
+
+    class FakePool:
+        @asynccontextmanager
+        async def context(self, **options):
+            borrowed.append(options)
+            yield mock_context
+
+    mock_get_pool.return_value = FakePool()
+    mock_plan.return_value = {"action": "DONE", "target": "success", "reason": "Test complete"}
+    mock_classify.return_value = True
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site=site, goal=Goal.PRICING)
+
+    assert result.site_id == "test"
+    assert len(borrowed) == 1
+    assert "record_video_dir" in borrowed[0]
+    assert not mock_playwright.called
+    assert mock_page.goto.called
+
+
+@pytest.mark.asyncio
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_matrix_loads_site_once(mock_classify, mock_plan, mock_playwright):
+    """Test matrix mode shares one context and the landing snapshot and document across goals"""
+    from app.agent import run_llm_agent_matrix_on_site
+
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    pages = []
+    landing = Mock(ok=True, status=200, headers={"content-type": "text/html", "content-encoding": "br"})
+    landing.body = AsyncMock(return_value=b"<html>landing</html>")
+
+    def new_page():
+        page = AsyncMock()
+        page.url = "https://example.com/"
+        page.video = None
+        page.goto = AsyncMock(return_value=landing)
+        page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="landing text")))
+        pages.append(page)
+        return page
+
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(side_effect=new_page)
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+
+    mock_plan.return_value = {"action": "DONE", "target": "fail", "reason": "Stop"}
+    mock_classify.return_value = False
+
+    goals = [Goal.PRICING, Goal.HELP, Goal.SIGN_UP]
+    site = Site(id="test", name="Test", url="https://example.com")
+    results = await run_llm_agent_matrix_on_site(site, goals)
+
+    assert [r.goal for r in results] == goals
+    assert mock_pw.chromium.launch.call_count == 1
+    assert mock_browser.new_context.call_count == 1
+    assert len(pages) == 3
+    # Landing page text is extracted once and reused as every goal's first planning input
+    assert pages[0].locator.call_count == 1
+    assert all(p.locator.call_count == 0 for p in pages[1:])
+    assert all(call.args[2] == "landing text" for call in mock_plan.call_args_list)
+    # Later tabs are answered with the first tab's document instead of fetching it again
+    assert landing.body.await_count == 1
+    pages[0].route.assert_not_called()
+    for page in pages[1:]:
+        matches, serve = page.route.await_args.args
+        assert matches("https://example.com/") and not matches("https://example.com/pricing")
+        route = AsyncMock()
+        route.request.resource_type = "document"
+        await serve(route)
+        route.fulfill.assert_awaited_once_with(status=200, headers={"content-type": "text/html"}, body=b"<html>landing</html>")
+
+
+@pytest.mark.asyncio
+@patch('app.agent.upload_video_to_s3')
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_on_failure_policy_discards_success_video(mock_classify, mock_plan, mock_playwright, mock_upload):
+    """Test ON_FAILURE policy deletes the recording of a successful site instead of uploading it"""
+    from app.models import VideoSettings, VideoPolicy
+
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+    mock_video = AsyncMock()
+
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.url = "https://example.com/pricing"
+    mock_page.video = mock_video
+    mock_page.mouse = AsyncMock()
+    mock_page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="page text")))
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+
+    mock_plan.return_value = {"action": "SCROLL", "target": "300", "reason": "Look around"}
+    mock_classify.return_value = True
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.PRICING, video=VideoSettings(policy=VideoPolicy.ON_FAILURE, width=640, height=450))
+
+    assert result.success is True
+    assert result.video_url is None
+    assert mock_video.delete.called
+    assert not mock_upload.called
+    options = mock_browser.new_context.call_args.kwargs
+    assert options["record_video_size"] == {"width": 640, "height": 450}
+
+
+@pytest.mark.asyncio
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_intercepts_requests(mock_classify, mock_plan, mock_playwright):
+    """Test agent installs request interception and reports its counters"""
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.url = "https://example.com/"
+    mock_page.video = None
+    mock_page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="page text")))
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+
+    mock_plan.return_value = {"action": "DONE", "target": "fail", "reason": "Stop"}
+    mock_classify.return_value = False
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.PRICING)
+
+    assert mock_context.route.await_args.args[0] == "**/*"
+    assert result.resources is not None
+    assert result.resources.blocked_requests == 0
+
+
+@pytest.mark.asyncio
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_plans_from_dom_digest(mock_classify, mock_plan, mock_playwright):
+    """Test the planner receives the compact digest and body text is not pulled"""
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.url = "https://example.com/"
+    mock_page.video = None
+    mock_page.evaluate = AsyncMock(return_value={
+        "url": "https://example.com/",
+        "title": "Example",
+        "headings": [],
+        "elements": [{"tag": "a", "role": "link", "text": "Pricing", "href": "https://example.com/pricing", "region": "nav"}],
+    })
+    mock_page.locator = Mock()
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+
+    mock_plan.return_value = {"action": "DONE", "target": "fail", "reason": "Stop"}
+    mock_classify.return_value = False
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    await run_llm_agent_on_site(site, Goal.PRICING)
+
+    page_text = mock_plan.call_args.args[2]
+    assert "[link] Pricing -> /pricing @nav" in page_text
+    assert not mock_page.locator.called
+
+
+@pytest.mark.asyncio
+@patch('app.agent.async_playwright')
+@patch('app.agent.get_success_url_set')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_stops_on_success_navigation_event(mock_classify, mock_plan, mock_success_urls, mock_playwright):
+    """Test a framenavigated event to a success URL ends the run without waiting for the planner"""
+    import asyncio
+
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+    listeners = {}
+
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.url = "https://example.com/"
+    mock_page.video = None
+    mock_page.on = Mock(side_effect=lambda event, handler: listeners.setdefault(event, handler))
+    mock_page.remove_listener = Mock()
+    mock_page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="page text")))
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+
+    mock_success_urls.return_value = frozenset({"https://example.com/pricing"})
+    mock_classify.return_value = False
+
+    async def slow_planner(*args, **kwargs):
+        # A redirect lands on the goal while the LLM is still thinking
+        listeners["framenavigated"](Mock(parent_frame=None, url="https://example.com/pricing?ref=nav"))
+        await asyncio.sleep(30)
+        return {"action": "SCROLL", "target": "800", "reason": "never used"}
+
+    mock_plan.side_effect = slow_planner
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await asyncio.wait_for(run_llm_agent_on_site(site, Goal.PRICING), timeout=5)
+
+    assert result.success is True
+    assert result.reason == "https://example.com/pricing"
+    assert mock_plan.call_count == 1
+    mock_page.remove_listener.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch('app.agent.settle')
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_records_settle_time(mock_classify, mock_plan, mock_playwright, mock_settle):
+    """Test each acting step records how long the page took to settle"""
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.url = "https://example.com/"
+    mock_page.video = None
+    mock_page.mouse = AsyncMock()
+    mock_page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="page text")))
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+
+    mock_settle.return_value = 42
+    mock_plan.side_effect = [
+        {"action": "SCROLL", "target": "300", "reason": "Scroll down"},
+        {"action": "DONE", "target": "fail", "reason": "Stop"},
+    ]
+    mock_classify.return_value = False
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.HELP)
+
+    assert result.steps[0].settle_ms == 42
+    assert mock_settle.await_args.args[1] == "https://example.com/"
+
+
+def test_render_report_shows_settle_time():
+    """Test report timing includes the settle wait when recorded"""
+    site = Site(id="test", name="Test Site", url="https://example.com")
+    steps = [Step(index=0, action="SCROLL", target="800", duration_ms=1200, settle_ms=350)]
+    result = SiteResult(site_id="test", site_name="Test Site", url="https://example.com",
+                        success=False, reason="Max steps exhausted without success", steps=steps)
+    report = render_report(site, Goal.HELP, result)
+    assert "**Duration:** 1.20s (settle 0.35s)" in report
+
+
+@pytest.mark.asyncio
+@patch('app.agent.settle')
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_counts_plan_cache_hits(mock_classify, mock_plan, mock_playwright, mock_settle):
+    """Test plan cache hits and misses are rolled up into the site result"""
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.url = "https://example.com/"
+    mock_page.video = None
+    mock_page.mouse = AsyncMock()
+    mock_page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="page text")))
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+
+    mock_settle.return_value = 0
+    mock_plan.side_effect = [
+        {"action": "SCROLL", "target": "300", "reason": "Scroll", "cached": True},
+        {"action": "SCROLL", "target": "300", "reason": "Scroll", "cached": False},
+        {"action": "DONE", "target": "fail", "reason": "Stop"},
+    ]
+    mock_classify.return_value = False
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.HELP)
+
+    assert [s.plan_cached for s in result.steps] == [True, False, None]
+    assert result.plan_cache.hits == 1
+    assert result.plan_cache.misses == 1
+
+
+@pytest.mark.asyncio
+@patch('app.agent.settle')
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_tries_next_candidate_without_replanning(mock_classify, mock_plan, mock_playwright, mock_settle):
+    """Test a CLICK with no locator falls through to the next candidate from the same plan"""
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.url = "https://example.com/"
+    mock_page.video = None
+    mock_page.mouse = AsyncMock()
+    mock_page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="page text")))
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+
+    missing = AsyncMock()
+    missing.scroll_into_view_if_needed = AsyncMock(side_effect=Exception("Timeout"))
+    found = AsyncMock()
+    found.bounding_box = AsyncMock(return_value={"x": 0, "y": 0, "width": 10, "height": 10})
+    mock_page.get_by_text = Mock(side_effect=lambda text, exact=False: Mock(first=missing if text == "Plans" else found))
+
+    mock_settle.return_value = 0
+    mock_plan.side_effect = [
+        {"action": "CLICK", "target": "Plans", "reason": "Best", "cached": False,
+         "alternatives": [{"action": "CLICK", "target": "Pricing", "reason": "Backup"}]},
+        {"action": "DONE", "target": "fail", "reason": "Stop"},
+    ]
+    mock_classify.side_effect = [False, True]
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.PRICING)
+
+    assert mock_plan.call_count == 1
+    assert [s.target for s in result.steps] == ["Plans", "Pricing"]
+    assert [s.candidate_rank for s in result.steps] == [0, 1]
+    assert result.steps[0].error_type == "Exception"
+    assert result.success is True
+
+
+def test_build_result_rolls_up_llm_usage():
+    """Test per-step LLM calls are summed into the site result and its report"""
+    from app.agent import _build_result
+    from app.models import LLMCall
+    site = Site(id="test", name="Test Site", url="https://example.com")
+    steps = [
+        Step(index=0, action="SCROLL", duration_ms=2000,
+             llm=LLMCall(wall_ms=1500, ttfb_ms=900, prompt_tokens=300, completion_tokens=20, requests=1, tokens_estimated=True)),
+        Step(index=1, action="CLICK", duration_ms=500, candidate_rank=1),
+        Step(index=2, action="DONE", duration_ms=800,
+             llm=LLMCall(wall_ms=700, requests=1, fallback=True)),
+    ]
+    result = _build_result(site, Goal.HELP, steps, False, "Planner indicated DONE", None)
+
+    usage = result.llm_usage
+    assert usage.planner_calls == 2 and usage.requests == 2 and usage.fallbacks == 1
+    assert usage.wall_ms == 2200 and usage.ttfb_ms == 900
+    assert usage.prompt_tokens == 300 and usage.completion_tokens == 20 and usage.estimated_calls == 1
+    assert usage.step_ms == 3300
+    assert result.report is None  # rendered on request, not stored
+    assert "**LLM time:** 2.2s over 2 request(s), 320 tokens (1 call(s) estimated)" in render_report(site, Goal.HELP, result)
+
+
+def _replay_page(mock_playwright):
+    """Wire a mocked browser whose page clicks succeed"""
+    mock_pw = AsyncMock()
+    mock_browser = AsyncMock()
+    mock_context = AsyncMock()
+    mock_page = AsyncMock()
+    mock_pw.chromium.launch = AsyncMock(return_value=mock_browser)
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_page.url = "https://example.com/"
+    mock_page.video = None
+    mock_page.mouse = AsyncMock()
+    mock_page.locator = Mock(return_value=AsyncMock(inner_text=AsyncMock(return_value="page text")))
+    locator = AsyncMock()
+    locator.bounding_box = AsyncMock(return_value={"x": 0, "y": 0, "width": 10, "height": 10})
+    mock_page.get_by_text = Mock(return_value=Mock(first=locator))
+    mock_playwright.return_value.__aenter__.return_value = mock_pw
+    mock_playwright.return_value.__aexit__.return_value = AsyncMock()
+    return mock_page
+
+
+@pytest.mark.asyncio
+@patch('app.agent.settle')
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_replays_recorded_path(mock_classify, mock_plan, mock_playwright, mock_settle, fresh_playbooks):
+    """Test a recorded playbook is replayed without calling the planner"""
+    _replay_page(mock_playwright)
+    mock_settle.return_value = 0
+    fresh_playbooks.save(playbooks.Playbook(site_id="test", goal=Goal.PRICING, steps=[
+        playbooks.PlaybookStep(action="CLICK", target="Pricing", url_before="https://example.com/"),
+    ]))
+    mock_classify.return_value = True
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.PRICING)
+
+    assert result.success is True
+    mock_plan.assert_not_called()
+    assert result.steps[0].replayed is True
+    assert result.steps[0].target == "Pricing"
+
+
+@pytest.mark.asyncio
+@patch('app.agent.settle')
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_plans_after_divergence_and_rerecords(mock_classify, mock_plan, mock_playwright, mock_settle, fresh_playbooks):
+    """Test a playbook whose URL no longer matches falls back to planning and is replaced on success"""
+    _replay_page(mock_playwright)
+    mock_settle.return_value = 0
+    fresh_playbooks.save(playbooks.Playbook(site_id="test", goal=Goal.PRICING, steps=[
+        playbooks.PlaybookStep(action="CLICK", target="Old pricing link", url_before="https://example.com/old-home"),
+    ]))
+    mock_plan.return_value = {"action": "CLICK", "target": "Plans", "reason": "Nav link"}
+    mock_classify.return_value = True
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.PRICING)
+
+    assert result.success is True
+    assert mock_plan.call_count == 1
+    assert result.steps[0].replayed is None
+    recorded = fresh_playbooks.get("test", Goal.PRICING)
+    assert [(s.action, s.target, s.url_before) for s in recorded.steps] == [("CLICK", "Plans", "https://example.com/")]
+
+
+@pytest.mark.asyncio
+@patch('app.agent.settle')
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_plans_next_step_while_scroll_settles(mock_classify, mock_plan, mock_playwright, mock_settle):
+    """Test the plan after a SCROLL is requested during the settle and used when the page is unchanged"""
+    import asyncio
+    from app.models import LLMCall
+    _replay_page(mock_playwright)
+
+    async def slow_settle(*args, **kwargs):
+        await asyncio.sleep(0.1)
+        return 100
+
+    async def plan(goal, url, text, recent, step_index, max_steps, deadline=None):
+        await asyncio.sleep(0.05)
+        llm = LLMCall(wall_ms=50, requests=1)
+        if step_index == 0:
+            return {"action": "SCROLL", "target": "800", "reason": "Look further", "llm": llm}
+        return {"action": "DONE", "target": "fail", "reason": "Stop", "llm": llm}
+
+    mock_settle.side_effect = slow_settle
+    mock_plan.side_effect = plan
+    mock_classify.return_value = False
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.HELP)
+
+    assert mock_plan.call_count == 2
+    assert mock_plan.call_args.args[3] == [{"action": "SCROLL", "target": "800", "failed": False}]
+    assert result.steps[1].speculation == "used"
+    assert result.steps[1].overlap_ms >= 40
+    assert result.llm_usage.planner_calls == 2
+    assert result.llm_usage.overlap_ms == result.steps[1].overlap_ms
+
+
+@pytest.mark.asyncio
+@patch('app.agent.settle')
+@patch('app.agent.async_playwright')
+@patch('app.agent.plan_next_action')
+@patch('app.agent.classify_success')
+async def test_run_llm_agent_discards_speculative_plan_when_page_changes(mock_classify, mock_plan, mock_playwright, mock_settle):
+    """Test content loaded during the settle invalidates the speculative plan"""
+    page = _replay_page(mock_playwright)
+    state = {"text": "above the fold"}
+    page.locator = Mock(return_value=Mock(inner_text=AsyncMock(side_effect=lambda **kw: state["text"])))
+
+    async def settle_loads_more(*args, **kwargs):
+        state["text"] = "above the fold, lazy section"
+        return 100
+
+    async def plan(goal, url, text, recent, step_index, max_steps, deadline=None):
+        if step_index == 0:
+            return {"action": "SCROLL", "target": "800", "reason": "Look further"}
+        if "lazy" not in text:
+            return {"action": "CLICK", "target": "Stale", "reason": "From the speculative read"}
+        return {"action": "DONE", "target": "fail", "reason": "Stop"}
+
+    mock_settle.side_effect = settle_loads_more
+    mock_plan.side_effect = plan
+    mock_classify.return_value = False
+
+    site = Site(id="test", name="Test", url="https://example.com")
+    result = await run_llm_agent_on_site(site, Goal.HELP)
+
+    assert mock_plan.call_count == 3
+    assert mock_plan.call_args.args[2] == "above the fold, lazy section"
+    assert result.steps[1].speculation == "discarded"
+    assert result.steps[1].action == "DONE"
+
+
+@pytest.mark.asyncio
+async def test_speculative_plan_only_after_settling_actions():
+    """Test actions without a settle wait to overlap do not start a speculative plan"""
+    import time
+    from app.agent import _start_speculative_plan
+    page = Mock(url="https://example.com/")
+    page.locator = Mock(return_value=Mock(inner_text=AsyncMock(return_value="page text")))
+    assert await _start_speculative_plan(page, Goal.HELP, [], "TYPE", "hello", 0, time.monotonic() + 30) is None
+    page.locator.assert_not_called()
@@ -77,3 +77,376 @@ def test_invalid_goal():
         json={"goal": "invalid-goal-value"}
     )
     assert response.status_code == 422  # Validation error
+
+
+def test_run_matrix_endpoint():
+    """Test matrix endpoint starts a background multi-goal run"""
+    from unittest.mock import patch, AsyncMock
+    with patch('app.main.process_matrix_run', new=AsyncMock()) as mock_process:
+        response = client.post(
+            "/api/run-matrix",
+            json={"goals": [Goal.PRICING.value, Goal.HELP.value]}
+        )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "pending"
+    mock_process.assert_awaited_once_with(data["run_id"], [Goal.PRICING, Goal.HELP], None, None)
+
+
+def test_build_matrix_response_grid():
+    """Test site×goal grid aggregation"""
+    from app.main import build_matrix_response
+    from app.models import SiteResult
+    from app.runner import Site
+
+    def cell(site_id, goal, ok):
+        return SiteResult(site_id=site_id, site_name=site_id, url="https://x", goal=goal, success=ok, reason="r")
+
+    goals = [Goal.PRICING, Goal.HELP]
+    sites = [Site(id="a", name="A", url="https://a"), Site(id="b", name="B", url="https://b")]
+    grid = [
+        [cell("a", Goal.PRICING, True), cell("a", Goal.HELP, False)],
+        [cell("b", Goal.PRICING, True), cell("b", Goal.HELP, True)],
+    ]
+    response = build_matrix_response(goals, sites, grid)
+
+    assert response.total_sites == 2
+    assert response.overall_success_rate == 75.0
+    assert [s.success_rate for s in response.goal_summaries] == [100.0, 50.0]
+    assert response.rows[0].site_id == "a"
+    assert response.rows[0].results[1].goal == Goal.HELP
+
+
+@pytest.mark.asyncio
+async def test_process_reality_check_queue_mode():
+    """Test queue mode hands sites to workers instead of running agents in the API"""
+    from unittest.mock import patch, AsyncMock, ANY
+    from app import main, job_queue
+    from app.runs_store import create_run, get_run
+    from app.runner import Site
+    from app.models import SiteResult
+    sites = [Site(id="a", name="A", url="https://a.com")]
+    cell = SiteResult(site_id="a", site_name="A", url="https://a.com", goal=Goal.HELP, success=True, reason="ok")
+    create_run("queued-run")
+    with patch.object(job_queue, 'EXECUTION_MODE', 'queue'), \
+         patch('app.main._selected_sites', return_value=sites), \
+         patch('app.main.run_sites_via_queue', new=AsyncMock(return_value=[[cell]])) as mock_queue, \
+         patch('app.main.run_llm_agent_on_site') as mock_agent:
+        await main.process_reality_check("queued-run", Goal.HELP)
+    mock_queue.assert_awaited_once_with("queued-run", sites, [Goal.HELP], video=None, on_result=ANY)
+    mock_agent.assert_not_called()
+    run = get_run("queued-run")
+    assert run.status == "done"
+    assert run.result.successful_sites == 1
+
+
+def test_build_matrix_response_totals_llm_usage():
+    """Test run-level LLM usage sums every cell"""
+    from app.main import build_matrix_response
+    from app.runner import Site
+    from app.models import SiteResult, LLMUsage
+    sites = [Site(id="a", name="A", url="https://a.com")]
+    cells = [
+        SiteResult(site_id="a", site_name="A", url="https://a.com", goal=g, success=False, reason="x",
+                   llm_usage=LLMUsage(planner_calls=2, requests=2, wall_ms=1000, prompt_tokens=600))
+        for g in (Goal.PRICING, Goal.HELP)
+    ]
+    response = build_matrix_response([Goal.PRICING, Goal.HELP], sites, [cells])
+    assert response.llm_usage.requests == 4
+    assert response.llm_usage.wall_ms == 2000
+    assert response.llm_usage.prompt_tokens == 1200
+
+
+def test_planner_stats_endpoint():
+    """Test shared planner state is exposed for monitoring"""
+    response = client.get("/api/planner/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["circuit"] in ("closed", "open", "half_open")
+    assert "rate_limiter" in data and "plan_cache" in data
+
+
+@pytest.mark.asyncio
+async def test_process_reality_check_publishes_events():
+    """Test a run publishes its status changes, each site result as it finishes and agent steps"""
+    from unittest.mock import patch
+    from app import main
+    from app.runs_store import create_run, get_run_store
+    from app.runner import Site
+    from app.models import SiteResult, Step
+    sites = [Site(id="a", name="A", url="https://a.com"), Site(id="b", name="B", url="https://b.com")]
+
+    async def fake_agent(site, goal, video=None, on_step=None):
+        on_step(goal, Step(index=0, action="click", target="Pricing", succeeded=True))
+        return SiteResult(site_id=site.id, site_name=site.name, url=site.url, goal=goal, success=True, reason="ok")
+
+    create_run("events-run")
+    with patch('app.main._selected_sites', return_value=sites), \
+         patch('app.main.run_llm_agent_on_site', new=fake_agent):
+        await main.process_reality_check("events-run", Goal.PRICING)
+    events = get_run_store().events_after("events-run")
+    assert [e.type for e in events][0] == "status" and events[0].data == {"status": "running"}
+    assert events[-1].data == {"status": "done"}
+    assert sorted(e.data["site_id"] for e in events if e.type == "site_result") == ["a", "b"]
+    assert sum(1 for e in events if e.type == "step") == 2
+    assert [e.id for e in events] == list(range(1, len(events) + 1))
+
+
+def test_run_events_stream_replays_and_resumes():
+    """Test the SSE endpoint replays a finished run's events and resumes after Last-Event-ID"""
+    from app.runs_store import create_run, update_run_status
+    from app.run_events import publish
+    create_run("sse-run")
+    publish("sse-run", "status", {"status": "running"})
+    publish("sse-run", "site_result", {"index": 0, "site_id": "a"})
+    update_run_status("sse-run", "done")
+    publish("sse-run", "status", {"status": "done"})
+
+    response = client.get("/api/run/sse-run/events")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("retry: ")
+    assert "id: 2\nevent: site_result\ndata: {\"index\": 0, \"site_id\": \"a\"}\n\n" in response.text
+
+    resumed = client.get("/api/run/sse-run/events", headers={"Last-Event-ID": "2"})
+    assert "site_result" not in resumed.text
+    assert "id: 3\nevent: status" in resumed.text
+
+    assert client.get("/api/run/nonexistent-id/events").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_publish_stores_events_off_the_event_loop():
+    """Test publishing only queues the event; a worker thread stores it and then wakes subscribers"""
+    import asyncio
+    import threading
+    from unittest.mock import patch
+    from app import run_events
+    from app.runs_store import create_run, get_run_store
+    create_run("queued-events")
+    store = get_run_store()
+    threads = []
+    original = store.append_event
+
+    def append_event(*args):
+        threads.append(threading.current_thread())
+        return original(*args)
+
+    with patch.object(store, 'append_event', side_effect=append_event):
+        wake = asyncio.Event()
+        run_events._subscribers.setdefault("queued-events", set()).add(wake)
+        try:
+            for i in range(3):
+                run_events.publish("queued-events", "step", {"i": i})
+            assert not threads and not wake.is_set()
+            await asyncio.wait_for(wake.wait(), timeout=2)
+            await run_events.flush()
+        finally:
+            run_events._subscribers.pop("queued-events", None)
+    assert [e.data["i"] for e in store.events_after("queued-events")] == [0, 1, 2]
+    assert threads and threading.main_thread() not in threads
+
+
+def test_list_runs_pages_filters_and_projects():
+    """Test run listing pages newest first, filters by status and goal and leaves out steps unless asked"""
+    from app.runs_store import RUNS, create_run, update_run_status
+    from app.models import RunResponse, SiteResult, Step
+    RUNS.clear()
+    cell = SiteResult(site_id="a", site_name="A", url="https://a.com", goal=Goal.HELP, success=True, reason="ok",
+                      report="# A", steps=[Step(index=0, action="click")])
+    create_run("page-1", [Goal.HELP])
+    update_run_status("page-1", "done", result=RunResponse(
+        goal=Goal.HELP, overall_success_rate=100.0, total_sites=1, successful_sites=1, failed_sites=0, results=[cell]))
+    create_run("page-2", [Goal.PRICING])
+    create_run("page-3", [Goal.HELP])
+
+    first = client.get("/api/runs?limit=2").json()
+    assert [r["id"] for r in first["runs"]] == ["page-3", "page-2"]
+    second = client.get(f"/api/runs?limit=2&cursor={first['next_cursor']}").json()
+    assert [r["id"] for r in second["runs"]] == ["page-1"] and second["next_cursor"] is None
+    assert second["runs"][0]["result"]["total_sites"] == 1
+    assert "results" not in second["runs"][0]["result"]
+
+    assert [r["id"] for r in client.get("/api/runs?goal=HELP").json()["runs"]] == ["page-3", "page-1"]
+    done = client.get("/api/runs?status=done&include=results").json()["runs"]
+    assert [r["id"] for r in done] == ["page-1"]
+    assert "steps" not in done[0]["result"]["results"][0] and "report" not in done[0]["result"]["results"][0]
+    full = client.get("/api/runs?status=done&include=steps,reports").json()["runs"]
+    assert full[0]["result"]["results"][0]["report"] == "# A"
+
+    assert client.get("/api/runs?cursor=not-a-cursor").status_code == 400
+    assert client.get("/api/runs?status=bogus").status_code == 400
+    assert client.get("/api/runs?include=videos").status_code == 400
+
+
+def test_runs_stats_endpoint():
+    """Test run history memory and eviction counters are exposed"""
+    data = client.get("/api/runs/stats").json()
+    assert data["backend"] == "memory"
+    assert {"runs_in_memory", "result_bytes_in_memory", "evictions", "archived"} <= data.keys()
+
+
+def test_finished_run_is_served_from_cache_with_etag():
+    """Test a finished run gets a stable ETag, 304 on If-None-Match, and is encoded only once"""
+    from unittest.mock import patch
+    from app.runs_store import create_run, update_run_status
+    create_run("etag-run")
+    pending = client.get("/api/run/etag-run")
+    assert pending.json()["status"] == "pending"
+    update_run_status("etag-run", "error", error="boom")
+
+    first = client.get("/api/run/etag-run")
+    assert first.json()["error"] == "boom"
+    etag = first.headers["etag"]
+    assert etag != pending.headers["etag"]
+    with patch('app.main.encode_run') as encode:
+        again = client.get("/api/run/etag-run")
+        not_modified = client.get("/api/run/etag-run", headers={"If-None-Match": etag})
+    encode.assert_not_called()
+    assert again.headers["etag"] == etag and again.content == first.content
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+
+def test_run_report_endpoint_renders_on_demand():
+    """Test a site's report is rendered on request, as markdown or HTML, and cached"""
+    from unittest.mock import patch
+    from app.runs_store import create_run, update_run_status
+    from app.models import RunResponse, SiteResult, Step
+    cell = SiteResult(site_id="a", site_name="A", url="https://a.com", goal=Goal.HELP, success=True,
+                      reason="https://a.com/help", steps=[Step(index=0, action="CLICK", target="Help")])
+    create_run("report-run", [Goal.HELP])
+    assert client.get("/api/run/report-run/report/a").status_code == 409
+    update_run_status("report-run", "done", result=RunResponse(
+        goal=Goal.HELP, overall_success_rate=100.0, total_sites=1, successful_sites=1, failed_sites=0, results=[cell]))
+
+    assert client.get("/api/run/report-run").json()["result"]["results"][0]["report"] is None
+    markdown = client.get("/api/run/report-run/report/a")
+    assert markdown.status_code == 200 and markdown.headers["content-type"].startswith("text/markdown")
+    assert markdown.text.startswith("# A — Goal:")
+    from app.reports import render_site_report
+    with patch('app.main.render_site_report', wraps=render_site_report) as render:
+        page = client.get("/api/run/report-run/report/a?format=html")
+        again = client.get("/api/run/report-run/report/a?format=html", headers={"If-None-Match": page.headers["etag"]})
+    assert render.call_count == 1
+    assert again.status_code == 304
+
+    assert client.get("/api/run/report-run/report/zzz").status_code == 404
+    assert client.get("/api/run/report-run/report/a?format=pdf").status_code == 400
+
+
+def _two_sites():
+    from app.runner import Site
+    return [Site(id="fast", name="Fast", url="https://fast.com"), Site(id="slow", name="Slow", url="https://slow.com")]
+
+
+def _fast_and_slow_agent(released):
+    """Agent that finishes "fast" at once and blocks on "slow" until cancelled."""
+    import asyncio
+    from app.models import SiteResult
+
+    async def agent(site, goal, video=None, on_step=None):
+        if site.id == "slow":
+            try:
+                await asyncio.sleep(30)
+            finally:
+                released.set()
+        return SiteResult(site_id=site.id, site_name=site.name, url=site.url, goal=goal, success=True, reason="ok")
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_cancel_run_stops_sites_and_keeps_partial_results():
+    """Test cancelling a running run stops its site tasks and records it cancelled with finished sites"""
+    import asyncio
+    from unittest.mock import patch
+    from app import main
+    from app.runs_store import create_run, get_run
+    released = asyncio.Event()
+    create_run("cancel-run", [Goal.HELP])
+    with patch('app.main._selected_sites', return_value=_two_sites()), \
+         patch('app.main.run_llm_agent_on_site', new=_fast_and_slow_agent(released)):
+        running = asyncio.create_task(main.process_reality_check("cancel-run", Goal.HELP))
+        await asyncio.sleep(0.05)
+        assert (await main.cancel_run("cancel-run"))["status"] == "cancelling"
+        await asyncio.wait_for(running, timeout=2)
+    assert released.is_set()
+    run = get_run("cancel-run")
+    assert run.status == "cancelled"
+    assert [(r.site_id, r.success, r.reason) for r in run.result.results] == [
+        ("fast", True, "ok"), ("slow", False, "Run cancelled")]
+    assert main.get_control("cancel-run") is None
+
+
+@pytest.mark.asyncio
+async def test_run_deadline_stops_unfinished_sites():
+    """Test a whole-run deadline stops the slow site and the run still finishes as done"""
+    import asyncio
+    from unittest.mock import patch
+    from app import main
+    from app.runs_store import create_run, get_run
+    released = asyncio.Event()
+    create_run("deadline-run", [Goal.HELP])
+    with patch('app.main._selected_sites', return_value=_two_sites()), \
+         patch('app.main.run_llm_agent_on_site', new=_fast_and_slow_agent(released)):
+        await asyncio.wait_for(main.process_reality_check("deadline-run", Goal.HELP, deadline_seconds=0.1), timeout=2)
+    run = get_run("deadline-run")
+    assert run.status == "done" and released.is_set()
+    assert run.result.results[1].reason == "Run deadline of 0.1s reached"
+
+
+@pytest.mark.asyncio
+async def test_cancel_before_start_skips_the_run():
+    """Test a run cancelled while pending never starts its agents"""
+    from unittest.mock import patch
+    from app import main
+    from app.runs_store import create_run, get_run
+    create_run("early-cancel")
+    await main.cancel_run("early-cancel")
+    with patch('app.main._selected_sites', return_value=_two_sites()), \
+         patch('app.main.run_llm_agent_on_site') as agent:
+        await main.process_reality_check("early-cancel", Goal.HELP)
+    agent.assert_not_called()
+    assert get_run("early-cancel").status == "cancelled"
+
+
+def test_cancel_endpoint_rejects_missing_and_finished_runs():
+    """Test cancelling an unknown run is a 404 and a finished one a 409"""
+    from app.runs_store import create_run, update_run_status
+    assert client.post("/api/run/nonexistent-id/cancel").status_code == 404
+    create_run("finished-run")
+    update_run_status("finished-run", "error", error="boom")
+    response = client.post("/api/run/finished-run/cancel")
+    assert response.status_code == 409 and "error" in response.json()["detail"]
+
+
+def test_run_request_deadline_must_be_positive():
+    """Test the optional whole-run deadline is validated"""
+    response = client.post("/api/run-reality-check", json={"goal": Goal.PRICING.value, "deadline_seconds": 0})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_run_store_is_used_off_the_event_loop():
+    """Test store reads and writes from endpoints and background runs happen in worker threads"""
+    import threading
+    from unittest.mock import patch
+    from fastapi import BackgroundTasks
+    from app import main, runs_store
+    from app.models import RunRequest
+    threads = []
+
+    def recording(fn):
+        def call(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return fn(*args, **kwargs)
+        return call
+
+    with patch('app.main.create_run', new=recording(runs_store.create_run)), \
+         patch('app.main.update_run_status', new=recording(runs_store.update_run_status)), \
+         patch('app.main.get_run', new=recording(runs_store.get_run)), \
+         patch('app.main._selected_sites', return_value=[]):
+        started = await main.run_reality_check_endpoint(RunRequest(goal=Goal.HELP), BackgroundTasks())
+        await main.process_reality_check(started["run_id"], Goal.HELP)
+        await main.get_run_status(started["run_id"], if_none_match=None)
+    assert len(threads) == 4
+    assert threading.main_thread() not in threads
@@ -0,0 +1,139 @@
+"""Tests for the shared browser pool"""
+import pytest
+from unittest.mock import Mock, patch, AsyncMock
+from app import browser_pool
+from app.browser_pool import BrowserPool, get_browser_pool, start_browser_pool
+
+
+def _mock_playwright(browsers):
+    """Return a patched async_playwright factory launching the given browsers in order."""
+    mock_pw = AsyncMock()
+    mock_pw.chromium.launch = AsyncMock(side_effect=browsers)
+    factory = Mock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=mock_pw)
+    factory.return_value.__aexit__ = AsyncMock(return_value=None)
+    return factory, mock_pw
+
+
+def _mock_browser():
+    browser = AsyncMock()
+    browser.on = Mock()
+    browser.is_connected = Mock(return_value=True)
+    browser.new_context = AsyncMock(side_effect=lambda **kw: AsyncMock())
+    return browser
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_browser_across_contexts():
+    """Test contexts share one browser until the recycle threshold"""
+    browser = _mock_browser()
+    factory, mock_pw = _mock_playwright([browser])
+    with patch('app.browser_pool.async_playwright', factory):
+        pool = BrowserPool(max_contexts=5, max_memory_mb=0)
+        await pool.start()
+        for _ in range(3):
+            async with pool.context(viewport={"width": 800, "height": 600}) as ctx:
+                assert ctx is not None
+        await pool.stop()
+
+    assert mock_pw.chromium.launch.call_count == 1
+    assert browser.new_context.call_count == 3
+    browser.new_context.assert_called_with(viewport={"width": 800, "height": 600})
+    browser.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_pool_recycles_after_max_contexts():
+    """Test a browser is retired after N contexts and closed once drained"""
+    first, second = _mock_browser(), _mock_browser()
+    factory, mock_pw = _mock_playwright([first, second])
+    with patch('app.browser_pool.async_playwright', factory):
+        pool = BrowserPool(max_contexts=2, max_memory_mb=0)
+        await pool.start()
+        async with pool.context():
+            async with pool.context():
+                pass
+            # Third context must come from a fresh browser while the old one is still in use
+            async with pool.context():
+                assert first.close.call_count == 0
+        assert first.close.call_count == 1
+        assert pool.stats()["recycled"] == 1
+        await pool.stop()
+
+    assert mock_pw.chromium.launch.call_count == 2
+    assert first.new_context.call_count == 2
+    assert second.new_context.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_recycles_on_memory_limit():
+    """Test a browser above the memory limit is replaced"""
+    first, second = _mock_browser(), _mock_browser()
+    factory, _ = _mock_playwright([first, second])
+    with patch('app.browser_pool.async_playwright', factory), \
+         patch('app.browser_pool._tree_rss_mb', return_value=4096.0):
+        pool = BrowserPool(max_contexts=0, max_memory_mb=1000)
+        await pool.start()
+        async with pool.context():
+            pass
+        async with pool.context():
+            pass
+        await pool.stop()
+
+    assert first.new_context.call_count == 1
+    assert second.new_context.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_stop_is_not_a_recycle():
+    """Test browsers closed by stop() (their disconnected event) are not counted as recycled"""
+    browser = _mock_browser()
+    factory, _ = _mock_playwright([browser])
+    with patch('app.browser_pool.async_playwright', factory):
+        pool = BrowserPool(max_contexts=5, max_memory_mb=0)
+        await pool.start()
+        async with pool.context():
+            pass
+        await pool.stop()
+    on_disconnected = browser.on.call_args.args[1]
+    on_disconnected(browser)
+    assert pool.stats()["recycled"] == 0
+
+
+def test_tree_rss_counts_each_process_once():
+    """Test processes that are both a launch pid and a descendant of one are summed once"""
+    def proc(pid, children=()):
+        p = Mock(pid=pid)
+        p.children.return_value = list(children)
+        p.memory_info.return_value = Mock(rss=100 * 1024 * 1024)
+        return p
+
+    renderer = proc(3)
+    zygote = proc(2, [renderer])
+    root = proc(1, [zygote, renderer])
+    processes = {1: root, 2: zygote, 3: renderer}
+    fake_psutil = Mock(Process=lambda pid: processes[pid], Error=Exception)
+    with patch.object(browser_pool, 'psutil', fake_psutil):
+        assert browser_pool._tree_rss_mb({1, 2, 3}) == 300.0
+
+
+@pytest.mark.asyncio
+async def test_pool_context_requires_start():
+    """Test borrowing from a stopped pool raises"""
+    pool = BrowserPool()
+    with pytest.raises(RuntimeError):
+        async with pool.context():
+            pass
+
+
+@pytest.mark.asyncio
+async def test_start_browser_pool_failure_falls_back():
+    """Test a failed pool start leaves agents on per-site browsers"""
+    factory = Mock()
+    factory.return_value.__aenter__ = AsyncMock(side_effect=Exception("no chromium"))
+    factory.return_value.__aexit__ = AsyncMock(return_value=None)
+    with patch('app.browser_pool.async_playwright', factory), \
+         patch.object(browser_pool, 'BROWSER_POOL_ENABLED', True):
+        pool = await start_browser_pool()
+    assert pool is None
+    assert get_browser_pool() is None
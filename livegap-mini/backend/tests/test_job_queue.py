@@ -0,0 +1,159 @@
+"""Tests for the site-level job queue"""
+import pytest
+from unittest.mock import patch
+from app import job_queue
+from app.job_queue import Job, SQLiteJobQueue, run_sites_via_queue
+from app.models import Goal, SiteResult, VideoSettings, VideoPolicy
+from app.runner import Site
+
+
+def _result(site_id: str, goal: Goal, success: bool = True) -> SiteResult:
+    return SiteResult(site_id=site_id, site_name=site_id, url=f"https://{site_id}.com",
+                      goal=goal, success=success, reason="ok")
+
+
+def _queue(tmp_path, **kwargs) -> SQLiteJobQueue:
+    return SQLiteJobQueue(str(tmp_path / "jobs.db"), **kwargs)
+
+
+def test_lease_complete_roundtrip(tmp_path):
+    """Test a job is leased once, in order, and its results read back"""
+    queue = _queue(tmp_path)
+    video = VideoSettings(policy=VideoPolicy.OFF)
+    queue.enqueue([
+        Job(id="j1", run_id="r1", site_id="a", goals=[Goal.PRICING], video=video),
+        Job(id="j2", run_id="r1", site_id="b", goals=[Goal.PRICING]),
+    ])
+
+    job = queue.lease("w1")
+    assert job.id == "j1" and job.attempts == 1 and job.video.policy == VideoPolicy.OFF
+    assert queue.lease("w2").id == "j2"
+    assert queue.lease("w3") is None
+
+    assert queue.complete("j1", "w1", [_result("a", Goal.PRICING)])
+    jobs = {j.id: j for j in queue.jobs_for_run("r1")}
+    assert jobs["j1"].status == "done"
+    assert jobs["j1"].results[0].site_id == "a"
+    assert jobs["j2"].status == "leased"
+
+
+def test_incomplete_backend_cannot_be_constructed():
+    """Test a backend missing part of the interface fails when created, not mid-run"""
+    class PartialQueue(job_queue.JobQueue):
+        def enqueue(self, jobs):
+            pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        PartialQueue()
+
+
+def test_expired_lease_is_retried_then_failed(tmp_path):
+    """Test a lost worker's job is re-leased until attempts run out"""
+    queue = _queue(tmp_path, max_attempts=2)
+    queue.enqueue([Job(id="j1", run_id="r1", site_id="a", goals=[Goal.HELP])])
+
+    assert queue.lease("w1", lease_seconds=-1).attempts == 1
+    retry = queue.lease("w2", lease_seconds=-1)
+    assert retry.id == "j1" and retry.attempts == 2
+    assert queue.lease("w3") is None
+    # The first worker can no longer report once the job moved on
+    assert not queue.complete("j1", "w1", [_result("a", Goal.HELP)])
+    assert queue.jobs_for_run("r1")[0].status == "failed"
+
+
+def test_fail_requeues_until_max_attempts(tmp_path):
+    """Test worker-reported errors requeue the job, then fail it"""
+    queue = _queue(tmp_path, max_attempts=2)
+    queue.enqueue([Job(id="j1", run_id="r1", site_id="a", goals=[Goal.HELP])])
+    queue.fail("j1", "w1", "ignored: not leased by w1")
+    assert queue.jobs_for_run("r1")[0].status == "queued"
+
+    queue.lease("w1")
+    queue.fail("j1", "w1", "boom")
+    assert queue.jobs_for_run("r1")[0].status == "queued"
+    queue.lease("w1")
+    queue.fail("j1", "w1", "boom again")
+    job = queue.jobs_for_run("r1")[0]
+    assert job.status == "failed" and job.error == "boom again"
+
+
+@pytest.mark.asyncio
+async def test_run_sites_via_queue_collects_results(tmp_path):
+    """Test the API side waits for workers and fills in failed sites"""
+    queue = _queue(tmp_path, max_attempts=1)
+    sites = [Site(id="a", name="A", url="https://a.com"), Site(id="b", name="B", url="https://b.com")]
+    goals = [Goal.PRICING, Goal.HELP]
+
+    original_enqueue = queue.enqueue
+
+    def enqueue_and_work(jobs):
+        original_enqueue(jobs)
+        first = queue.lease("w1")
+        queue.complete(first.id, "w1", [_result(first.site_id, g) for g in goals])
+        second = queue.lease("w1")
+        queue.fail(second.id, "w1", "RuntimeError: browser crashed")
+
+    with patch.object(queue, 'enqueue', side_effect=enqueue_and_work), \
+         patch.object(job_queue, 'JOB_POLL_SECONDS', 0.01):
+        reported = []
+        grid = await run_sites_via_queue("r1", sites, goals, queue=queue,
+                                         on_result=lambda position, cells: reported.append((position, cells)))
+
+    assert reported == [(0, grid[0]), (1, grid[1])]
+    assert [r.goal for r in grid[0]] == goals
+    assert all(r.success for r in grid[0])
+    assert [r.site_id for r in grid[1]] == ["b", "b"]
+    assert not any(r.success for r in grid[1])
+    assert grid[1][0].reason == "Worker failed: RuntimeError: browser crashed"
+
+
+@pytest.mark.asyncio
+async def test_run_sites_via_queue_times_out(tmp_path):
+    """Test sites without a worker result are reported as failed after the timeout"""
+    queue = _queue(tmp_path)
+    sites = [Site(id="a", name="A", url="https://a.com")]
+    with patch.object(job_queue, 'JOB_RUN_TIMEOUT_SECONDS', 0), \
+         patch.object(job_queue, 'JOB_POLL_SECONDS', 0.01):
+        grid = await run_sites_via_queue("r1", sites, [Goal.HELP], queue=queue)
+    assert grid[0][0].success is False
+    assert grid[0][0].reason == "No worker reported a result in time"
+    # The abandoned job is withdrawn so no worker runs it later
+    assert queue.jobs_for_run("r1")[0].status == "cancelled"
+    assert queue.lease("w1") is None
+
+
+def test_finished_jobs_skips_known_and_unfinished(tmp_path):
+    """Test polling reads only jobs that finished since the caller last looked"""
+    queue = _queue(tmp_path, max_attempts=1)
+    queue.enqueue([Job(id=f"j{i}", run_id="r1", site_id=f"s{i}", goals=[Goal.HELP]) for i in range(3)])
+    assert queue.finished_jobs("r1") == []
+    first = queue.lease("w1")
+    queue.complete(first.id, "w1", [_result(first.site_id, Goal.HELP)])
+    assert [j.id for j in queue.finished_jobs("r1")] == ["j0"]
+    second = queue.lease("w1")
+    queue.fail(second.id, "w1", "boom")
+    assert [j.id for j in queue.finished_jobs("r1", ["j0"])] == ["j1"]
+    assert queue.finished_jobs("r1", ["j0", "j1"]) == []
+
+
+@pytest.mark.asyncio
+async def test_cancel_run_withdraws_unfinished_jobs(tmp_path):
+    """Test cancelling a run keeps finished sites and reports the rest as cancelled"""
+    queue = _queue(tmp_path)
+    sites = [Site(id="a", name="A", url="https://a.com"), Site(id="b", name="B", url="https://b.com"),
+             Site(id="c", name="C", url="https://c.com")]
+    original_enqueue = queue.enqueue
+
+    def enqueue_and_cancel(jobs):
+        original_enqueue(jobs)
+        first = queue.lease("w1")
+        queue.complete(first.id, "w1", [_result(first.site_id, Goal.HELP)])
+        queue.lease("w1")
+        assert queue.cancel_run("r1", "Run cancelled") == 2
+        assert queue.lease("w2") is None
+
+    with patch.object(queue, 'enqueue', side_effect=enqueue_and_cancel), \
+         patch.object(job_queue, 'JOB_POLL_SECONDS', 0.01):
+        grid = await run_sites_via_queue("r1", sites, [Goal.HELP], queue=queue)
+    assert grid[0][0].success
+    assert [cells[0].reason for cells in grid[1:]] == ["Run cancelled", "Run cancelled"]
@@ -0,0 +1,55 @@
+"""Tests for the compiled keyword matcher and link scoring"""
+from app.keyword_matcher import KeywordMatcher, score_digest_elements
+from app.llm import GOAL_KEYWORDS, heuristic_plan, judge_success_from_html
+from app.models import Goal
+
+MATCHER = KeywordMatcher(GOAL_KEYWORDS)
+
+DIGEST = "\n".join([
+    "Title: Acme",
+    "H1: Build faster",
+    "[link] Blog -> /blog @nav",
+    "[link] Plans and pricing -> /pricing @nav",
+    "[button] Get started",
+    "[link] Compare plans -> /compare",
+    "[link] Pricing FAQ -> /legal/pricing-faq @footer",
+])
+
+
+def test_find_prefers_longest_phrase_on_word_boundaries():
+    """Test one scan returns whole-word cues of the goal, longest phrase first"""
+    text = "Talk to sales or read our helpful docs"
+    assert MATCHER.find(text, Goal.TALK_TO_SALES) == ["talk to sales"]
+    assert MATCHER.find(text, Goal.HELP) == ["docs"]  # "helpful" is not "help"
+    assert MATCHER.find(text, Goal.PRICING) == []
+
+
+def test_score_digest_elements_ranks_links():
+    """Test nav placement and success-path hrefs outrank footer mentions"""
+    ranked = score_digest_elements(MATCHER, DIGEST, "https://www.acme.com/", Goal.PRICING,
+                                   {"https://www.acme.com/pricing"})
+    labels = [e.label for e in ranked]
+    assert labels[0] == "Plans and pricing"
+    assert "Blog" not in labels and "Get started" not in labels
+    assert labels.index("Compare plans") < labels.index("Pricing FAQ")
+    assert ranked[0].href == "https://www.acme.com/pricing"
+
+
+def test_heuristic_plan_clicks_best_link_immediately():
+    """Test the heuristic planner clicks a scored link on the first step instead of scrolling"""
+    plan = heuristic_plan(Goal.PRICING, "https://www.acme.com/", DIGEST, [], 0, 8)
+    assert plan["action"] == "CLICK"
+    assert plan["target"] == "Plans and pricing"
+    assert plan["alternatives"][0]["target"] == "Compare plans"
+
+    retry = heuristic_plan(Goal.PRICING, "https://www.acme.com/", DIGEST,
+                           [{"action": "CLICK", "target": "Plans and pricing", "failed": True}], 1, 8)
+    assert retry["target"] == "Compare plans"
+
+
+def test_judge_success_from_html_single_pass():
+    """Test HTML cues are found with the compiled matcher"""
+    ok, reason = judge_success_from_html(Goal.SIGN_UP, "<a>Create account</a><a>Sign up</a>", "https://x.com")
+    assert ok is True
+    assert "create account" in reason and "sign up" in reason
+    assert judge_success_from_html(Goal.CUSTOMERS, "<p>nothing here</p>", "https://x.com")[0] is False
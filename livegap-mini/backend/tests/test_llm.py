@@ -3,6 +3,28 @@ import pytest
 from unittest.mock import Mock, patch, AsyncMock
 from app.llm import plan_next_action, classify_success
 from app.models import Goal
+from app import llm, plan_cache, planner_transport
+
+
+@pytest.fixture(autouse=True)
+def fresh_plan_cache(monkeypatch):
+    """Start every test with an empty in-memory plan cache"""
+    monkeypatch.setattr(plan_cache, "PLAN_CACHE_PATH", "")
+    monkeypatch.setattr(plan_cache, "_plan_cache", None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_planner_transport(monkeypatch):
+    """Start every test with a closed circuit breaker and no retry backoff"""
+    monkeypatch.setattr(planner_transport, "breaker", planner_transport.CircuitBreaker())
+    monkeypatch.setattr(planner_transport, "latencies", planner_transport.LatencyTracker())
+    monkeypatch.setattr(planner_transport, "PLANNER_BACKOFF_BASE_MS", 0)
+
+
+@pytest.fixture(autouse=True)
+def buffered_completions(monkeypatch):
+    """Mocked clients below answer with whole JSON bodies, not streams"""
+    monkeypatch.setattr(llm, "OPENAI_STREAM", False)
 
 
 @pytest.fixture
@@ -17,9 +39,19 @@ def mock_openai_response():
     }
 
 
-@patch('app.llm.httpx.post')
+def _mock_client(response=None, side_effect=None):
+    """Build a stand-in for the shared AsyncClient"""
+    if isinstance(response, Mock):
+        response.status_code = 200
+    client = Mock()
+    client.post = AsyncMock(return_value=response, side_effect=side_effect)
+    return client
+
+
+@pytest.mark.asyncio
+@patch('app.llm.get_http_client')
 @patch('app.llm.os.getenv')
-def test_plan_next_action_with_api_key(mock_getenv, mock_post, mock_openai_response):
+async def test_plan_next_action_with_api_key(mock_getenv, mock_get_client, mock_openai_response):
     """Test plan_next_action with OpenAI API"""
     mock_getenv.side_effect = lambda key, default=None: {
         'OPENAI_API_KEY': 'test-key',
@@ -29,9 +61,9 @@ def test_plan_next_action_with_api_key(mock_getenv, mock_post, mock_openai_respo
     
     mock_response = Mock()
     mock_response.json.return_value = mock_openai_response
-    mock_post.return_value = mock_response
+    mock_get_client.return_value = _mock_client(mock_response)
     
-    result = plan_next_action(
+    result = await plan_next_action(
         goal=Goal.SIGN_UP,
         page_url="https://example.com",
         page_text="Welcome to our site",
@@ -45,12 +77,13 @@ def test_plan_next_action_with_api_key(mock_getenv, mock_post, mock_openai_respo
     assert "reason" in result
 
 
+@pytest.mark.asyncio
 @patch('app.llm.os.getenv')
-def test_plan_next_action_without_api_key(mock_getenv):
+async def test_plan_next_action_without_api_key(mock_getenv):
     """Test plan_next_action falls back without API key"""
     mock_getenv.return_value = None
     
-    result = plan_next_action(
+    result = await plan_next_action(
         goal=Goal.PRICING,
         page_url="https://example.com",
         page_text="Check our prices",
@@ -64,9 +97,10 @@ def test_plan_next_action_without_api_key(mock_getenv):
     assert "reason" in result
 
 
-@patch('app.llm.httpx.post')
+@pytest.mark.asyncio
+@patch('app.llm.get_http_client')
 @patch('app.llm.os.getenv')
-def test_plan_next_action_with_invalid_json(mock_getenv, mock_post):
+async def test_plan_next_action_with_invalid_json(mock_getenv, mock_get_client):
     """Test plan_next_action handles invalid JSON response"""
     mock_getenv.side_effect = lambda key, default=None: {
         'OPENAI_API_KEY': 'test-key',
@@ -76,9 +110,9 @@ def test_plan_next_action_with_invalid_json(mock_getenv, mock_post):
     mock_response.json.return_value = {
         "choices": [{"message": {"content": "invalid json"}}]
     }
-    mock_post.return_value = mock_response
+    mock_get_client.return_value = _mock_client(mock_response)
     
-    result = plan_next_action(
+    result = await plan_next_action(
         goal=Goal.HELP,
         page_url="https://example.com",
         page_text="Need help?",
@@ -91,17 +125,18 @@ def test_plan_next_action_with_invalid_json(mock_getenv, mock_post):
     assert "action" in result
 
 
-@patch('app.llm.httpx.post')
+@pytest.mark.asyncio
+@patch('app.llm.get_http_client')
 @patch('app.llm.os.getenv')
-def test_plan_next_action_api_error(mock_getenv, mock_post):
+async def test_plan_next_action_api_error(mock_getenv, mock_get_client):
     """Test plan_next_action handles API errors"""
     mock_getenv.side_effect = lambda key, default=None: {
         'OPENAI_API_KEY': 'test-key',
     }.get(key, default)
     
-    mock_post.side_effect = Exception("API Error")
+    mock_get_client.return_value = _mock_client(side_effect=Exception("API Error"))
     
-    result = plan_next_action(
+    result = await plan_next_action(
         goal=Goal.CUSTOMERS,
         page_url="https://example.com",
         page_text="Customer testimonials",
@@ -115,13 +150,13 @@ def test_plan_next_action_api_error(mock_getenv, mock_post):
 
 
 @pytest.mark.asyncio
-@patch('app.llm.get_success_urls')
+@patch('app.llm.get_success_url_set')
 async def test_classify_success_matching_url(mock_get_urls):
     """Test classify_success with matching URL"""
-    mock_get_urls.return_value = [
+    mock_get_urls.return_value = frozenset({
         "https://example.com/pricing",
         "https://example.com/plans"
-    ]
+    })
     
     mock_page = AsyncMock()
     mock_page.url = "https://example.com/pricing"
@@ -132,12 +167,12 @@ async def test_classify_success_matching_url(mock_get_urls):
 
 
 @pytest.mark.asyncio
-@patch('app.llm.get_success_urls')
+@patch('app.llm.get_success_url_set')
 async def test_classify_success_non_matching_url(mock_get_urls):
     """Test classify_success with non-matching URL"""
-    mock_get_urls.return_value = [
+    mock_get_urls.return_value = frozenset({
         "https://example.com/pricing"
-    ]
+    })
     
     mock_page = AsyncMock()
     mock_page.url = "https://example.com/home"
@@ -148,10 +183,10 @@ async def test_classify_success_non_matching_url(mock_get_urls):
 
 
 @pytest.mark.asyncio
-@patch('app.llm.get_success_urls')
+@patch('app.llm.get_success_url_set')
 async def test_classify_success_empty_success_urls(mock_get_urls):
     """Test classify_success with no success URLs configured"""
-    mock_get_urls.return_value = []
+    mock_get_urls.return_value = frozenset()
     
     mock_page = AsyncMock()
     mock_page.url = "https://example.com/anywhere"
@@ -161,14 +196,15 @@ async def test_classify_success_empty_success_urls(mock_get_urls):
     assert result is False
 
 
-def test_plan_next_action_with_recent_actions():
+@pytest.mark.asyncio
+async def test_plan_next_action_with_recent_actions():
     """Test plan includes recent action history"""
     recent = [
         {"action": "CLICK", "target": "Menu"},
         {"action": "SCROLL", "target": "500"}
     ]
     
-    result = plan_next_action(
+    result = await plan_next_action(
         goal=Goal.TALK_TO_SALES,
         page_url="https://example.com",
         page_text="Contact our sales team",
@@ -181,9 +217,10 @@ def test_plan_next_action_with_recent_actions():
     assert "reason" in result
 
 
-def test_plan_next_action_last_step():
+@pytest.mark.asyncio
+async def test_plan_next_action_last_step():
     """Test plan on last step suggests DONE"""
-    result = plan_next_action(
+    result = await plan_next_action(
         goal=Goal.HELP,
         page_url="https://example.com/help",
         page_text="Help center",
@@ -194,3 +231,174 @@ def test_plan_next_action_last_step():
     
     assert "action" in result
     # On last step, should consider wrapping up
+
+
+@pytest.mark.asyncio
+async def test_plan_next_action_does_not_block_event_loop(monkeypatch):
+    """Test a slow planner call lets other coroutines run meanwhile"""
+    import asyncio
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    ticks = []
+
+    async def slow_post(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        response = Mock(status_code=200)
+        response.json.return_value = {"choices": [{"message": {"content": '{"action": "SCROLL", "target": "800"}'}}]}
+        return response
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+
+    client = Mock()
+    client.post = slow_post
+    with patch('app.llm.get_http_client', return_value=client):
+        result, _ = await asyncio.gather(
+            plan_next_action(Goal.PRICING, "https://example.com", "text", [], 0, 5),
+            ticker(),
+        )
+    assert result["action"] == "SCROLL"
+    assert len(ticks) == 5
+
+
+@pytest.mark.asyncio
+async def test_get_http_client_is_shared():
+    """Test the pooled AsyncClient is reused within a loop and closable"""
+    from app.llm import get_http_client, aclose_http_client
+    first = get_http_client()
+    second = get_http_client()
+    assert first is second
+    await aclose_http_client()
+    assert first.is_closed
+    third = get_http_client()
+    assert third is not first
+    await aclose_http_client()
+
+
+@pytest.mark.asyncio
+async def test_plan_next_action_served_from_cache(monkeypatch):
+    """Test a repeated page state reuses the LLM decision without a second call"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    response = Mock()
+    response.json.return_value = {"choices": [{"message": {"content": '{"action": "CLICK", "target": "Pricing"}'}}]}
+    client = _mock_client(response)
+    with patch('app.llm.get_http_client', return_value=client):
+        first = await plan_next_action(Goal.PRICING, "https://example.com/", "[link] Pricing", [], 0, 5)
+        second = await plan_next_action(Goal.PRICING, "https://example.com", "[link] Pricing", [], 0, 5)
+        other = await plan_next_action(Goal.PRICING, "https://example.com", "[link] Plans", [], 0, 5)
+
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["target"] == "Pricing"
+    assert other["cached"] is False
+    assert client.post.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_plan_next_action_does_not_cache_fallbacks(monkeypatch):
+    """Test heuristic fallbacks are never stored in the plan cache"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    client = _mock_client(side_effect=Exception("API Error"))
+    with patch('app.llm.get_http_client', return_value=client):
+        first = await plan_next_action(Goal.HELP, "https://example.com", "Help", [], 0, 5)
+        second = await plan_next_action(Goal.HELP, "https://example.com", "Help", [], 0, 5)
+    assert "cached" not in first and "cached" not in second
+    assert client.post.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_plan_next_action_returns_ranked_candidates(monkeypatch):
+    """Test one planner call yields a best action plus ranked alternatives"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    content = (
+        'Here you go: {"candidates": ['
+        '{"action": "CLICK", "target": "Pricing", "reason": "Nav link"}, '
+        '{"action": "JUMP", "target": "x"}, '
+        '{"action": "CLICK", "target": "Plans", "reason": "Footer link"}]}'
+    )
+    response = Mock()
+    response.json.return_value = {"choices": [{"message": {"content": content}}]}
+    with patch('app.llm.get_http_client', return_value=_mock_client(response)):
+        plan = await plan_next_action(Goal.PRICING, "https://example.com", "[link] Pricing", [], 0, 5)
+
+    assert plan["action"] == "CLICK" and plan["target"] == "Pricing"
+    assert plan["alternatives"] == [{"action": "CLICK", "target": "Plans", "reason": "Footer link"}]
+
+
+def test_heuristic_plan_offers_other_keyword_matches():
+    """Test the heuristic planner ranks every matching keyword as a candidate"""
+    from app.llm import heuristic_plan
+    plan = heuristic_plan(Goal.PRICING, "https://example.com", "See pricing and plans", [], 2, 8)
+    assert plan["target"] == "pricing"
+    assert [c["target"] for c in plan["alternatives"]] == ["plans"]
+
+
+@pytest.mark.asyncio
+async def test_plan_next_action_records_usage(monkeypatch):
+    """Test each planner call reports tokens, time to first byte and fallback"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    response = Mock(status_code=200)
+    response.json.return_value = {
+        "choices": [{"message": {"content": '{"action": "CLICK", "target": "Docs"}'}}],
+        "usage": {"prompt_tokens": 310, "completion_tokens": 22},
+    }
+
+    async def post(*args, **kwargs):
+        await kwargs["extensions"]["trace"]("http11.receive_response_headers.complete", {})
+        return response
+
+    client = Mock()
+    client.post = post
+    with patch('app.llm.get_http_client', return_value=client):
+        plan = await plan_next_action(Goal.HELP, "https://example.com", "[link] Docs", [], 0, 5)
+
+    usage = plan["llm"]
+    assert usage.requests == 1
+    assert usage.prompt_tokens == 310 and usage.completion_tokens == 22
+    assert usage.ttfb_ms is not None and usage.wall_ms >= usage.ttfb_ms
+    assert usage.fallback is False and usage.tokens_estimated is False
+
+    with patch('app.llm.get_http_client', return_value=_mock_client(side_effect=Exception("429"))):
+        fallback = await plan_next_action(Goal.HELP, "https://example.com", "other", [], 0, 5)
+    assert fallback["llm"].fallback is True
+    assert fallback["llm"].requests == 1
+
+
+def test_json_scanner_returns_object_as_soon_as_it_closes():
+    """Test the streaming scanner handles split chunks, nested objects and braces in strings"""
+    from app.llm import JSONObjectScanner
+    scanner = JSONObjectScanner()
+    chunks = ['Sure: {"cand', 'idates": [{"action": "CLICK", "target": "Plans {', 'beta}"}', ']}', ' and then some']
+    results = [scanner.feed(c) for c in chunks]
+    assert results[:3] == [None, None, None]
+    assert results[3] == {"candidates": [{"action": "CLICK", "target": "Plans {beta}"}]}
+
+
+def test_json_scanner_skips_invalid_objects():
+    """Test text that only looks like an object is skipped like the buffered parser does"""
+    from app.llm import JSONObjectScanner
+    scanner = JSONObjectScanner()
+    assert scanner.feed('{not json} {"action": "SCROLL", "target": "\\"800\\""}') == {"action": "SCROLL", "target": '"800"'}
+
+
+@pytest.mark.asyncio
+async def test_plan_next_action_streams_and_stops_at_answer(monkeypatch):
+    """Test a streamed completion is parsed early and the rest of the stream is not read"""
+    import httpx
+    from app.fake_llm import app as fake_app, fake
+    monkeypatch.setattr(llm, "OPENAI_STREAM", True)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_ENDPOINT", "http://fake-llm/v1/chat/completions")
+    fake.reset()
+    fake.content = '{"action": "CLICK", "target": "Pricing", "reason": "Nav"}'
+    fake.trailing = " I picked the pricing link." * 5
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app)) as client:
+        with patch('app.llm.get_http_client', return_value=client):
+            plan = await plan_next_action(Goal.PRICING, "https://example.com", "[link] Pricing", [], 0, 5)
+
+    assert plan["action"] == "CLICK" and plan["target"] == "Pricing"
+    assert plan["llm"].fallback is False
+    answer_tokens = len(fake.tokens(fake.content))
+    assert plan["llm"].completion_tokens == answer_tokens < fake.tokens_sent
+    assert plan["llm"].tokens_estimated is True
@@ -124,3 +124,13 @@ def test_run_response_model():
     assert response.successful_sites == 3
     assert response.failed_sites == 1
     assert len(response.results) == 1
+
+
+def test_matrix_run_request_defaults_to_all_goals():
+    """Test MatrixRunRequest covers every goal by default and dedupes"""
+    from app.models import MatrixRunRequest
+    assert MatrixRunRequest().goals == list(Goal)
+    req = MatrixRunRequest(goals=[Goal.PRICING, Goal.HELP, Goal.PRICING])
+    assert req.goals == [Goal.PRICING, Goal.HELP]
+    with pytest.raises(Exception):
+        MatrixRunRequest(goals=[])
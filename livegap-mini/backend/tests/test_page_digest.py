@@ -0,0 +1,63 @@
+"""Tests for the in-page DOM digest"""
+import pytest
+from unittest.mock import AsyncMock
+from app.page_digest import PageDigest, extract_page_digest
+
+
+RAW = {
+    "url": "https://example.com/",
+    "title": "Example — Home",
+    "headings": [{"level": 1, "text": "Work better together"}],
+    "elements": [
+        {"tag": "a", "role": "link", "text": "Pricing", "href": "https://example.com/pricing", "region": "nav"},
+        {"tag": "button", "role": "button", "text": "Book a demo", "href": None, "region": "main"},
+        {"tag": "a", "role": "link", "text": "Status", "href": "https://status.example.io/", "region": "footer"},
+        {"tag": "input", "role": "textbox", "text": "", "placeholder": "Work email", "href": None, "region": "main"},
+    ],
+}
+
+
+def test_from_raw_rejects_non_digest():
+    """Test non-dict evaluate results are rejected"""
+    assert PageDigest.from_raw(None) is None
+    assert PageDigest.from_raw("text") is None
+    assert PageDigest.from_raw({"url": "x"}) is None
+
+
+def test_to_text_renders_compact_lines():
+    """Test digest rendering keeps roles, short hrefs and regions"""
+    text = PageDigest.from_raw(RAW).to_text()
+    lines = text.splitlines()
+    assert lines[0] == "Title: Example — Home"
+    assert lines[1] == "H1: Work better together"
+    assert "[link] Pricing -> /pricing @nav" in lines
+    assert "[button] Book a demo" in lines
+    assert "[link] Status -> status.example.io/ @footer" in lines
+    assert "[textbox] Work email" in lines
+
+
+def test_to_text_is_bounded():
+    """Test the rendering never exceeds the limit"""
+    raw = dict(RAW, elements=[{"tag": "a", "role": "link", "text": f"Link {i}", "href": None} for i in range(500)])
+    assert len(PageDigest.from_raw(raw).to_text(limit=300)) <= 300
+
+
+@pytest.mark.asyncio
+async def test_extract_page_digest_single_evaluate():
+    """Test extraction is a single evaluate round trip with limits"""
+    page = AsyncMock()
+    page.evaluate = AsyncMock(return_value=RAW)
+    digest = await extract_page_digest(page)
+    assert digest.title == "Example — Home"
+    assert len(digest.elements) == 4
+    assert page.evaluate.await_count == 1
+    limits = page.evaluate.await_args.args[1]
+    assert limits["maxElements"] > 0
+
+
+@pytest.mark.asyncio
+async def test_extract_page_digest_handles_errors():
+    """Test evaluate failures return None so callers can fall back"""
+    page = AsyncMock()
+    page.evaluate = AsyncMock(side_effect=Exception("Execution context was destroyed"))
+    assert await extract_page_digest(page) is None
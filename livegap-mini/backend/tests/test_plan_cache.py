@@ -0,0 +1,50 @@
+"""Tests for the LLM plan cache"""
+import pytest
+from unittest.mock import patch
+from app.plan_cache import PlanCache, plan_cache_key
+from app.models import Goal
+
+
+def test_plan_cache_key_tracks_page_state():
+    """Test the key ignores URL noise but changes with page and history"""
+    base = plan_cache_key("m", Goal.PRICING, "https://example.com/", "excerpt", [])
+    assert base == plan_cache_key("m", Goal.PRICING, "https://example.com", "excerpt", [])
+    assert base != plan_cache_key("m", Goal.PRICING, "https://example.com", "other excerpt", [])
+    assert base != plan_cache_key("m", Goal.HELP, "https://example.com", "excerpt", [])
+    assert base != plan_cache_key("m", Goal.PRICING, "https://example.com", "excerpt", [{"action": "SCROLL", "target": "800"}])
+    assert base != plan_cache_key("other-model", Goal.PRICING, "https://example.com", "excerpt", [])
+
+
+@pytest.mark.asyncio
+async def test_plan_cache_lru_and_counters():
+    """Test hits/misses are counted and the oldest entry is evicted"""
+    cache = PlanCache(max_entries=2, ttl_seconds=60)
+    await cache.put("a", {"action": "CLICK", "target": "Pricing"})
+    await cache.put("b", {"action": "SCROLL", "target": "800"})
+    assert (await cache.get("a"))["target"] == "Pricing"  # a is now most recent
+    await cache.put("c", {"action": "DONE", "target": "ok"})
+    assert await cache.get("b") is None
+    assert await cache.get("c") is not None
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 2}
+
+
+@pytest.mark.asyncio
+async def test_plan_cache_ttl_expiry():
+    """Test expired entries are not served"""
+    cache = PlanCache(max_entries=10, ttl_seconds=60)
+    with patch('app.plan_cache.time.time', return_value=1000.0):
+        await cache.put("a", {"action": "CLICK", "target": "Docs"})
+    with patch('app.plan_cache.time.time', return_value=1061.0):
+        assert await cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_plan_cache_disk_tier_survives_restart(tmp_path):
+    """Test a new process picks up plans persisted by an earlier one"""
+    path = str(tmp_path / "plans.db")
+    first = PlanCache(max_entries=10, ttl_seconds=60, path=path)
+    await first.put("a", {"action": "CLICK", "target": "Contact sales"})
+
+    second = PlanCache(max_entries=10, ttl_seconds=60, path=path)
+    assert (await second.get("a"))["target"] == "Contact sales"
+    assert second.hits == 1
@@ -0,0 +1,156 @@
+"""Tests for the resilient planner transport, against the local fake endpoint"""
+import asyncio
+import time
+import httpx
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+from app import planner_transport
+from app.fake_llm import app as fake_app, fake
+from app.llm import plan_next_action
+from app.models import Goal, LLMCall
+from app.planner_transport import CircuitBreaker, LatencyTracker, PlannerUnavailable, post_with_resilience
+
+URL = "http://fake-llm/v1/chat/completions"
+BODY = {"messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Reset the fake endpoint, breaker and latency history between tests"""
+    fake.reset()
+    monkeypatch.setattr(planner_transport, "breaker", CircuitBreaker(threshold=2, reset_seconds=60))
+    monkeypatch.setattr(planner_transport, "latencies", LatencyTracker())
+    monkeypatch.setattr(planner_transport, "PLANNER_BACKOFF_BASE_MS", 0)
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app))
+
+
+@pytest.mark.asyncio
+async def test_retries_429_then_succeeds():
+    """Test a rate-limited request is retried and counted"""
+    fake.push({"status": 429, "retry_after": 0}, {"status": 503})
+    call = LLMCall()
+    async with _client() as client:
+        resp = await post_with_resilience(client, URL, call=call, json=BODY)
+    assert resp.status_code == 200
+    assert call.requests == 3
+    assert fake.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_retry_after_beyond_deadline_gives_up():
+    """Test a Retry-After longer than the remaining budget is not waited out"""
+    fake.push({"status": 429, "retry_after": 60})
+    async with _client() as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            await post_with_resilience(client, URL, deadline=time.monotonic() + 10, json=BODY)
+    assert fake.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_timeout_is_bounded_by_site_deadline():
+    """Test the per-request timeout shrinks with the remaining budget, and no request goes out without one"""
+    response = Mock(status_code=200)
+    client = Mock()
+    client.post = AsyncMock(return_value=response)
+    await post_with_resilience(client, URL, deadline=time.monotonic() + 8, default_timeout=20, json=BODY)
+    timeout = client.post.await_args.kwargs["timeout"]
+    assert 4 < timeout <= 8 - planner_transport.PLANNER_DEADLINE_RESERVE_SECONDS
+
+    with pytest.raises(PlannerUnavailable):
+        await post_with_resilience(client, URL, deadline=time.monotonic() + 2, json=BODY)
+    assert client.post.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_beats_slow_primary(monkeypatch):
+    """Test a request slower than the latency percentile is raced by a duplicate"""
+    monkeypatch.setattr(planner_transport, "PLANNER_HEDGE_PERCENTILE", 95)
+    for _ in range(planner_transport.PLANNER_HEDGE_MIN_SAMPLES):
+        planner_transport.latencies.add(0.02)
+    fake.push({"delay_ms": 2000})
+    call = LLMCall()
+    started = time.monotonic()
+    async with _client() as client:
+        resp = await post_with_resilience(client, URL, call=call, json=BODY)
+    assert resp.status_code == 200
+    assert time.monotonic() - started < 1.5
+    assert call.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_switches_planner_to_heuristic(monkeypatch):
+    """Test repeated failures open the breaker and later plans skip the endpoint"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_ENDPOINT", URL)
+    monkeypatch.setattr(planner_transport, "PLANNER_RETRIES", 0)
+    monkeypatch.setattr("app.plan_cache.PLAN_CACHE_ENABLED", False)
+    fake.error_rate = 1.0
+    async with _client() as client:
+        with patch('app.llm.get_http_client', return_value=client):
+            for _ in range(2):
+                plan = await plan_next_action(Goal.PRICING, "https://example.com", "Pricing", [], 2, 8)
+                assert plan["llm"].fallback is True
+            assert planner_transport.breaker.state == "open"
+            plan = await plan_next_action(Goal.PRICING, "https://example.com", "Pricing", [], 2, 8)
+    assert plan["llm"].fallback is True
+    assert plan["llm"].requests == 0
+    assert plan["action"] == "CLICK"
+    assert fake.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_planner_against_fake_endpoint(monkeypatch):
+    """Test the whole planner path parses the fake endpoint's answer and usage"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_ENDPOINT", URL)
+    monkeypatch.setattr("app.plan_cache.PLAN_CACHE_ENABLED", False)
+    async with _client() as client:
+        with patch('app.llm.get_http_client', return_value=client):
+            plan = await plan_next_action(Goal.HELP, "https://example.com", "Docs", [], 0, 8)
+    assert plan["action"] == "SCROLL"
+    assert plan["llm"].requests == 1
+    assert plan["llm"].prompt_tokens > 0
+
+
+@pytest.mark.asyncio
+async def test_streamed_request_retries_then_returns_open_response():
+    """Test a streamed request is retried on 503 and handed back unread"""
+    fake.push({"status": 503})
+    call = LLMCall()
+    async with _client() as client:
+        resp = await post_with_resilience(client, URL, call=call, stream=True, json={**BODY, "stream": True})
+        assert resp.status_code == 200
+        assert not resp.is_closed
+        lines = [line async for line in resp.aiter_lines() if line]
+        await resp.aclose()
+    assert call.requests == 2
+    assert lines[-1] == "data: [DONE]"
+
+
+@pytest.mark.asyncio
+async def test_cancel_before_hedge_cancels_primary(monkeypatch):
+    """Test cancelling the caller while waiting on the primary request cancels that request too"""
+    monkeypatch.setattr(planner_transport, "PLANNER_HEDGE_PERCENTILE", 95)
+    for _ in range(planner_transport.PLANNER_HEDGE_MIN_SAMPLES):
+        planner_transport.latencies.add(5.0)
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def slow_post(*args, **kwargs):
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    client = Mock()
+    client.post = slow_post
+    caller = asyncio.ensure_future(post_with_resilience(client, URL, default_timeout=20, json=BODY))
+    await started.wait()
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
@@ -0,0 +1,58 @@
+"""Tests for recorded navigation playbooks"""
+from app.models import Goal, Step
+from app.playbooks import Playbook, PlaybookStore
+
+
+def _steps():
+    return [
+        Step(index=0, action="SCROLL", target="800", url_before="https://example.com/"),
+        Step(index=1, action="CLICK", target="Plans", url_before="https://example.com/", error_type="TimeoutError"),
+        Step(index=2, action="CLICK", target="Pricing", url_before="https://example.com/?utm_source=x",
+             url_after="https://example.com/pricing", succeeded=True),
+    ]
+
+
+def test_playbook_keeps_successful_clicks_only():
+    """Test scrolls and failed actions are not recorded"""
+    playbook = Playbook.from_steps("site", Goal.PRICING, _steps())
+    assert [(s.action, s.target) for s in playbook.steps] == [("CLICK", "Pricing")]
+    assert playbook.steps[0].matches("https://example.com/#plans")
+
+
+def test_store_persists_to_sqlite(tmp_path):
+    """Test playbooks recorded by one process are visible to the next"""
+    path = str(tmp_path / "playbooks.db")
+    PlaybookStore(path).record("site", Goal.PRICING, True, _steps())
+    loaded = PlaybookStore(path).get("site", Goal.PRICING)
+    assert loaded is not None
+    assert loaded.steps[0].target == "Pricing"
+
+
+def test_store_drops_playbook_after_repeated_failures(tmp_path):
+    """Test a playbook that keeps failing is forgotten"""
+    store = PlaybookStore(str(tmp_path / "playbooks.db"), max_failures=2)
+    store.record("site", Goal.PRICING, True, _steps())
+    store.record("site", Goal.PRICING, False, [])
+    assert store.get("site", Goal.PRICING).failures == 1
+    store.record("site", Goal.PRICING, False, [])
+    assert store.get("site", Goal.PRICING) is None
+    # A failure without a playbook is a no-op
+    store.record("site", Goal.HELP, False, [])
+    assert store.get("site", Goal.HELP) is None
+
+
+def test_processes_sharing_a_file_see_each_others_changes(tmp_path):
+    """Test a playbook dropped or rewritten by one process is not replayed by another"""
+    path = str(tmp_path / "playbooks.db")
+    first = PlaybookStore(path, max_failures=3)
+    second = PlaybookStore(path, max_failures=3)
+    first.record("site", Goal.PRICING, True, _steps())
+    assert second.get("site", Goal.PRICING) is not None
+    # Failures from both processes add up instead of overwriting each other
+    first.record("site", Goal.PRICING, False, [])
+    second.record("site", Goal.PRICING, False, [])
+    assert first.get("site", Goal.PRICING).failures == 2
+    second.record("site", Goal.PRICING, False, [])
+    assert first.get("site", Goal.PRICING) is None
+    first.record("site", Goal.PRICING, True, _steps()[2:])
+    assert second.get("site", Goal.PRICING).failures == 0
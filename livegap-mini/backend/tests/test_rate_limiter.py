@@ -0,0 +1,123 @@
+"""Tests for the shared planner rate limiter"""
+import asyncio
+import time
+import httpx
+import pytest
+from app import planner_transport, rate_limiter
+from app.fake_llm import app as fake_app, fake
+from app.models import LLMCall
+from app.planner_transport import PlannerUnavailable, post_with_resilience
+from app.rate_limiter import RateLimiter, RateLimitTimeout, estimate_tokens, take
+
+URL = "http://fake-llm/v1/chat/completions"
+
+
+def test_take_is_all_or_nothing():
+    """Test a request short on one bucket takes nothing from the other"""
+    costs = {"requests": (1, 1.0, 5), "tokens": (50, 1.0, 40)}
+    wait, levels = take({"tokens": (10.0, 100.0)}, costs, 100.0)
+    assert wait == pytest.approx(30.0)
+    assert levels == {"tokens": (10.0, 100.0)}
+    wait, levels = take({}, {"requests": (1, 1.0, 5)}, 100.0)
+    assert wait == 0 and levels == {"requests": (4.0, 100.0)}
+
+
+def test_estimate_tokens_counts_prompt_and_max_tokens():
+    """Test tokens are estimated like the provider admits them"""
+    body = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 240}
+    assert estimate_tokens(body) == 340
+    assert estimate_tokens(None) == 0
+
+
+@pytest.mark.asyncio
+async def test_requests_per_minute_are_spread_out():
+    """Test requests beyond the burst wait for the bucket to refill"""
+    limiter = RateLimiter(rpm=1200, burst_seconds=0.1)  # 20/s, burst of 2
+    started = time.monotonic()
+    waits = [await limiter.acquire() for _ in range(4)]
+    assert time.monotonic() - started >= 0.08
+    assert waits[0] < 0.01 and waits[-1] > 0.03
+    assert limiter.stats()["admitted"] == 4
+    assert limiter.stats()["wait_ms_max"] > 0
+
+
+@pytest.mark.asyncio
+async def test_earliest_deadline_goes_first():
+    """Test a step close to its deadline is admitted before one with time to spare"""
+    limiter = RateLimiter(rpm=600, burst_seconds=0.1)  # 10/s, burst of 1
+    await limiter.acquire()
+    order = []
+
+    async def request(name, start_by):
+        await limiter.acquire(start_by=start_by)
+        order.append(name)
+
+    relaxed = asyncio.create_task(request("relaxed", time.monotonic() + 10))
+    await asyncio.sleep(0.01)
+    urgent = asyncio.create_task(request("urgent", time.monotonic() + 1))
+    await asyncio.gather(relaxed, urgent)
+    assert order == ["urgent", "relaxed"]
+
+
+@pytest.mark.asyncio
+async def test_gives_up_when_deadline_cannot_be_met():
+    """Test a waiter that cannot be admitted in time raises instead of waiting"""
+    limiter = RateLimiter(rpm=60, burst_seconds=1)
+    await limiter.acquire()
+    with pytest.raises(RateLimitTimeout):
+        await limiter.acquire(start_by=time.monotonic() + 0.2)
+    assert limiter.stats()["timeouts"] == 1
+    assert limiter.stats()["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_pause_holds_back_requests():
+    """Test a provider 429 pause delays the next admission"""
+    limiter = RateLimiter(rpm=6000)
+    limiter.pause(0.15)
+    started = time.monotonic()
+    await limiter.acquire()
+    assert time.monotonic() - started >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_buckets_are_shared(tmp_path):
+    """Test two limiters on one file draw from the same budget"""
+    path = str(tmp_path / "limits.db")
+    first = RateLimiter(rpm=60, burst_seconds=1, path=path)
+    second = RateLimiter(rpm=60, burst_seconds=1, path=path)
+    await first.acquire()
+    with pytest.raises(RateLimitTimeout):
+        await second.acquire(start_by=time.monotonic() + 0.2)
+
+
+@pytest.mark.asyncio
+async def test_transport_queues_and_pauses_on_429(monkeypatch):
+    """Test planner requests record queue time and a 429 pauses the shared limiter"""
+    limiter = RateLimiter(rpm=6000)
+    monkeypatch.setattr(planner_transport, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(planner_transport, "breaker", planner_transport.CircuitBreaker())
+    fake.reset()
+    limiter.pause(0.15)
+    call = LLMCall()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app)) as client:
+        await post_with_resilience(client, URL, call=call, json={"messages": [], "max_tokens": 10})
+        assert call.queue_ms >= 100
+
+        fake.push({"status": 429, "retry_after": 0.05})
+        resp = await post_with_resilience(client, URL, json={"messages": []})
+    assert resp.status_code == 200
+    assert limiter.stats()["pauses"] == 2
+
+    limiter.pause(5)
+    with pytest.raises(PlannerUnavailable):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app)) as client:
+            await post_with_resilience(client, URL, deadline=time.monotonic() + 4.5, json={"messages": []})
+    assert planner_transport.breaker.failures == 0
+
+
+def test_rate_limiter_disabled_by_default(monkeypatch):
+    """Test no limiter is created without PLANNER_RPM or PLANNER_TPM"""
+    monkeypatch.setattr(rate_limiter, "PLANNER_RPM", 0)
+    monkeypatch.setattr(rate_limiter, "PLANNER_TPM", 0)
+    assert rate_limiter.get_rate_limiter() is None
@@ -0,0 +1,66 @@
+"""Tests for the video recording policy"""
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+from app.models import VideoPolicy, VideoSettings
+from app.recording import resolve_video_settings, context_options, should_keep
+
+
+def test_resolve_defaults_from_env():
+    """Test deployment defaults apply when the run sets nothing"""
+    with patch('app.recording.VIDEO_POLICY', 'on_failure'), \
+         patch('app.recording.VIDEO_WIDTH', 640), \
+         patch('app.recording.VIDEO_HEIGHT', 450):
+        settings = resolve_video_settings()
+    assert settings.policy == VideoPolicy.ON_FAILURE
+    assert (settings.width, settings.height) == (640, 450)
+
+
+def test_resolve_run_override_wins():
+    """Test per-run fields override only what they set"""
+    with patch('app.recording.VIDEO_POLICY', 'always'), patch('app.recording.VIDEO_WIDTH', 640):
+        settings = resolve_video_settings(VideoSettings(policy=VideoPolicy.OFF))
+    assert settings.policy == VideoPolicy.OFF
+    assert settings.width == 640
+
+
+def test_resolve_unknown_env_policy_records():
+    """Test a typo in VIDEO_POLICY keeps recording rather than failing"""
+    with patch('app.recording.VIDEO_POLICY', 'sometimes'):
+        assert resolve_video_settings().policy == VideoPolicy.ALWAYS
+
+
+def test_context_options_off_disables_recording(tmp_path):
+    """Test OFF creates contexts without a video directory"""
+    options = context_options(VideoSettings(policy=VideoPolicy.OFF, width=640, height=450), tmp_path)
+    assert "record_video_dir" not in options
+    assert options["viewport"] == {"width": 1280, "height": 900}
+
+
+def test_context_options_low_res(tmp_path):
+    """Test recording size follows the configured resolution"""
+    options = context_options(VideoSettings(policy=VideoPolicy.ALWAYS, width=640, height=450), tmp_path / "videos")
+    assert options["record_video_dir"] == str(tmp_path / "videos")
+    assert options["record_video_size"] == {"width": 640, "height": 450}
+    assert Path(options["record_video_dir"]).is_dir()
+
+
+def test_context_options_default_size_is_playwrights(tmp_path):
+    """Test no configured size leaves Playwright's scaled-down default; one side keeps the aspect ratio"""
+    with patch('app.recording.VIDEO_WIDTH', None), patch('app.recording.VIDEO_HEIGHT', None):
+        settings = resolve_video_settings()
+    assert "record_video_size" not in context_options(settings, tmp_path)
+    options = context_options(VideoSettings(policy=VideoPolicy.ALWAYS, width=640), tmp_path)
+    assert options["record_video_size"] == {"width": 640, "height": 450}
+
+
+@pytest.mark.parametrize("policy,success,expected", [
+    (VideoPolicy.ALWAYS, True, True),
+    (VideoPolicy.ALWAYS, False, True),
+    (VideoPolicy.ON_FAILURE, True, False),
+    (VideoPolicy.ON_FAILURE, False, True),
+    (VideoPolicy.OFF, False, False),
+])
+def test_should_keep(policy, success, expected):
+    """Test which finished recordings are uploaded"""
+    assert should_keep(VideoSettings(policy=policy, width=640, height=450), success) is expected
@@ -0,0 +1,38 @@
+"""Tests for on-demand site reports"""
+from app.models import Goal, MatrixRow, MatrixRunResponse, SiteResult, Step
+from app.reports import markdown_to_html, render_site_report, site_results
+
+
+def _cell(site_id: str, goal: Goal) -> SiteResult:
+    return SiteResult(site_id=site_id, site_name=site_id.title(), url=f"https://{site_id}.com", goal=goal,
+                      success=False, reason="Time limit reached", steps=[Step(index=0, action="CLICK", target="<a>")])
+
+
+def test_markdown_to_html_escapes_and_formats():
+    """Test headings, lists, bold and code become HTML with page text escaped"""
+    page = markdown_to_html("# Site <x>\n## Summary\n- **Steps:** 1\n- `a<b>`\n\nplain & simple", title="T")
+    assert "<h1>Site &lt;x&gt;</h1>" in page and "<h2>Summary</h2>" in page
+    assert "<ul>\n<li><strong>Steps:</strong> 1</li>\n<li><code>a&lt;b&gt;</code></li>\n</ul>" in page
+    assert "<p>plain &amp; simple</p>" in page and "<title>T</title>" in page
+
+
+def test_site_results_picks_matrix_cell_by_goal():
+    """Test matrix runs have one result per goal and a goal narrows it down"""
+    result = MatrixRunResponse(
+        goals=[Goal.PRICING, Goal.HELP], overall_success_rate=0.0, total_sites=1, goal_summaries=[],
+        rows=[MatrixRow(site_id="a", site_name="A", url="https://a.com",
+                        results=[_cell("a", Goal.PRICING), _cell("a", Goal.HELP)])],
+    )
+    assert len(site_results(result, "a")) == 2
+    [(cell, goal)] = site_results(result, "a", Goal.HELP)
+    assert goal == Goal.HELP and cell.goal == Goal.HELP
+    assert site_results(result, "missing") == []
+
+
+def test_render_site_report_prefers_stored_report():
+    """Test results stored with a report keep it; others are rendered from their steps"""
+    cell = _cell("a", Goal.HELP)
+    assert "**Target:** `<a>`" in render_site_report(cell, Goal.HELP)
+    assert "<code>&lt;a&gt;</code>" in render_site_report(cell, Goal.HELP, format="html")
+    cell.report = "# Stored"
+    assert render_site_report(cell, Goal.HELP) == "# Stored"
@@ -0,0 +1,94 @@
+"""Tests for request interception policy"""
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+from app.resource_policy import ResourcePolicy, ResourceBlocker, policy_for_site, install_resource_blocker
+
+
+def test_blocks_heavy_resource_types():
+    """Test images, media and fonts are blocked by default"""
+    policy = ResourcePolicy()
+    assert policy.should_block("image", "https://example.com/hero.png")
+    assert policy.should_block("font", "https://example.com/inter.woff2")
+    assert policy.should_block("media", "https://example.com/intro.mp4")
+    assert not policy.should_block("document", "https://example.com/pricing")
+    assert not policy.should_block("script", "https://example.com/app.js")
+
+
+def test_blocks_tracker_domains_and_subdomains():
+    """Test tracker hosts are blocked including subdomains and path-scoped entries"""
+    policy = ResourcePolicy()
+    assert policy.should_block("script", "https://www.googletagmanager.com/gtm.js")
+    assert policy.should_block("script", "https://widget.intercom.io/widget/abc")
+    assert policy.should_block("xhr", "https://www.facebook.com/tr/?id=1")
+    assert not policy.should_block("document", "https://www.facebook.com/trending")
+    assert not policy.should_block("script", "https://notgoogletagmanager.com/x.js")
+
+
+def test_allowed_domains_override_blocks():
+    """Test per-site allow list wins over type and domain blocks"""
+    policy = ResourcePolicy(allowed_domains=("hs-scripts.com",))
+    assert not policy.should_block("script", "https://js.hs-scripts.com/123.js")
+
+
+def test_disabled_policy_blocks_nothing():
+    """Test a disabled policy lets everything through"""
+    assert not ResourcePolicy(enabled=False).should_block("image", "https://example.com/a.png")
+
+
+def test_policy_for_site_applies_yaml_overrides():
+    """Test sites.yaml resources block is applied"""
+    with patch('app.resource_policy.resource_overrides_for', return_value={
+        "allow_types": ["font"], "allow_domains": ["Cdn.Example.com"], "block_domains": ["widget.example.net"],
+    }):
+        policy = policy_for_site("example")
+    assert "font" not in policy.blocked_types
+    assert "image" in policy.blocked_types
+    assert policy.allowed_domains == ("cdn.example.com",)
+    assert policy.should_block("script", "https://widget.example.net/w.js")
+
+
+def test_hubspot_override_loaded_from_config():
+    """Test the shipped HubSpot override is picked up"""
+    policy = policy_for_site("hubspot")
+    assert not policy.should_block("script", "https://js.hs-scripts.com/1.js")
+
+
+def _route(resource_type, url):
+    route = Mock()
+    route.request = Mock(resource_type=resource_type, url=url)
+    route.abort = AsyncMock()
+    route.continue_ = AsyncMock()
+    return route
+
+
+@pytest.mark.asyncio
+async def test_blocker_counts_and_splits_stats():
+    """Test blocker aborts/continues requests and reports deltas"""
+    blocker = ResourceBlocker(ResourcePolicy())
+    img = _route("image", "https://example.com/a.png")
+    doc = _route("document", "https://example.com/")
+    await blocker.handle(img)
+    await blocker.handle(doc)
+    img.abort.assert_awaited_once()
+    doc.continue_.assert_awaited_once()
+
+    start = blocker.snapshot()
+    await blocker.handle(_route("script", "https://www.google-analytics.com/analytics.js"))
+    delta = blocker.stats_since(start)
+    assert delta.blocked_requests == 1
+    assert delta.allowed_requests == 0
+    assert delta.blocked_by_type == {"script": 1}
+    assert delta.blocked_by_domain == {"www.google-analytics.com": 1}
+
+
+@pytest.mark.asyncio
+async def test_install_resource_blocker_routes_context():
+    """Test the blocker is installed on the context, or skipped when disabled"""
+    context = AsyncMock()
+    blocker = await install_resource_blocker(context, "intercom")
+    context.route.assert_awaited_once_with("**/*", blocker.handle)
+
+    context = AsyncMock()
+    with patch('app.resource_policy.BLOCK_RESOURCES', False):
+        assert await install_resource_blocker(context, "intercom") is None
+    context.route.assert_not_called()
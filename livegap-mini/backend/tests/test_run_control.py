@@ -0,0 +1,42 @@
+"""Tests for run cancellation and deadlines"""
+import asyncio
+import threading
+import pytest
+from app.run_control import end_control, start_control
+
+
+@pytest.mark.asyncio
+async def test_cancellers_run_off_the_event_loop():
+    """Test blocking cancellers (job queue writes) run in a worker thread, before and after the cancel"""
+    control = start_control("control-run")
+    calls = []
+    done = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def canceller(reason):
+        calls.append((threading.current_thread() is threading.main_thread(), reason))
+        if len(calls) == 2:
+            loop.call_soon_threadsafe(done.set)
+
+    try:
+        control.on_cancel(canceller)
+        control.cancel("Run cancelled")
+        control.on_cancel(canceller)
+        await asyncio.wait_for(done.wait(), timeout=2)
+    finally:
+        end_control("control-run")
+    assert calls == [(False, "Run cancelled"), (False, "Run cancelled")]
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_tracked_tasks():
+    """Test the deadline stops the run's tasks with the deadline as reason"""
+    control = start_control("deadline-control", deadline_seconds=0.05)
+    task = asyncio.create_task(asyncio.sleep(5))
+    control.track(task)
+    try:
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, timeout=2)
+    finally:
+        end_control("deadline-control")
+    assert control.reason == "Run deadline of 0.05s reached"
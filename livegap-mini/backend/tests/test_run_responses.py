@@ -0,0 +1,46 @@
+"""Tests for cached run responses"""
+import json
+from fastapi.encoders import jsonable_encoder
+from app.models import Goal, MatrixRunResponse, MatrixRow, RunResponse, SiteResult, Step
+from app.run_responses import RunResponseCache, encode_run, etag_matches
+from app.runs_store import MemoryRunStore, to_dict
+
+
+def test_encode_run_matches_to_dict():
+    """Test the fast encoding is the same JSON the endpoint used to return"""
+    store = MemoryRunStore({})
+    cell = SiteResult(site_id="a", site_name="A", url="https://a.com", goal=Goal.HELP, success=True, reason="ok",
+                      steps=[Step(index=0, action="click", target="Help")], report="# A")
+    store.create("single", [Goal.HELP])
+    store.transition("single", "done", result=RunResponse(
+        goal=Goal.HELP, overall_success_rate=100.0, total_sites=1, successful_sites=1, failed_sites=0, results=[cell]))
+    store.create("matrix", [Goal.HELP])
+    store.transition("matrix", "done", result=MatrixRunResponse(
+        goals=[Goal.HELP], overall_success_rate=100.0, total_sites=1, goal_summaries=[],
+        rows=[MatrixRow(site_id="a", site_name="A", url="https://a.com", results=[cell])]))
+    store.create("failed")
+    store.transition("failed", "error", error="boom")
+    for run_id in ("single", "matrix", "failed"):
+        run = store.get(run_id)
+        assert json.loads(encode_run(run)) == jsonable_encoder(to_dict(run))
+
+
+def test_cache_is_bounded_lru():
+    """Test the least recently used bodies are dropped to stay under the byte limit"""
+    cache = RunResponseCache(max_bytes=10)
+    cache.put("a", '"1"', b"aaaa")
+    cache.put("b", '"2"', b"bbbb")
+    assert cache.get("a") == ('"1"', b"aaaa")
+    cache.put("c", '"3"', b"cccc")
+    assert cache.get("b") is None and cache.get("a") is not None
+    cache.put("huge", '"4"', b"x" * 11)
+    assert cache.get("huge") is None
+    assert cache.stats()["bytes"] == 8
+
+
+def test_etag_matches():
+    """Test If-None-Match lists, weak tags and the wildcard"""
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"other"', '"abc"')
+    assert not etag_matches(None, '"abc"')
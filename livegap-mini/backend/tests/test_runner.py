@@ -66,3 +66,31 @@ def test_success_urls_for_all_goals():
         for goal in Goal:
             urls = success_urls_for(site_id, goal)
             assert isinstance(urls, list)
+
+
+def test_resource_overrides_for():
+    """Test per-site resource overrides default to an empty dict"""
+    from app.runner import resource_overrides_for
+    assert resource_overrides_for("nonexistent-site-id") == {}
+    assert "allow_domains" in resource_overrides_for("hubspot")
+
+
+def test_success_url_set_is_normalized_and_cached():
+    """Test success URLs are normalized once into a frozenset per (site, goal)"""
+    from app.runner import success_url_set
+    sites = load_sites()
+    site_id = sites[0].id
+    urls = success_url_set(site_id, Goal.PRICING)
+    assert isinstance(urls, frozenset)
+    assert all(u == u.lower() and "?" not in u for u in urls)
+    assert success_url_set(site_id, Goal.PRICING) is urls
+    assert success_url_set("nonexistent-site-id", Goal.PRICING) == frozenset()
+
+
+def test_goal_success_url_set_spans_sites():
+    """Test the per-goal success set combines every site's URLs"""
+    from app.runner import goal_success_url_set, success_url_set
+    sites = load_sites()
+    combined = goal_success_url_set(Goal.PRICING)
+    for site in sites:
+        assert success_url_set(site.id, Goal.PRICING) <= combined
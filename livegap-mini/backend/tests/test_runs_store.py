@@ -1,4 +1,5 @@
 """Tests for runs store module"""
+import time
 import pytest
 from datetime import datetime
 from app.runs_store import (
@@ -149,3 +150,282 @@ def test_to_dict_with_error():
     assert result_dict["status"] == "error"
     assert "error" in result_dict
     assert result_dict["error"] == error_msg
+
+
+def test_update_run_status_rejects_leaving_terminal_status():
+    """Test a finished run cannot be moved back to running"""
+    create_run("run-final")
+    assert update_run_status("run-final", "done") is True
+    assert update_run_status("run-final", "running") is False
+    assert get_run("run-final").status == "done"
+    assert update_run_status("missing", "running") is False
+
+
+def _matrix_result():
+    from app.models import MatrixRunResponse, MatrixRow, GoalSummary
+    cells = {
+        site: [SiteResult(site_id=site, site_name=site.title(), url=f"https://{site}.com", goal=g,
+                          success=(g == Goal.PRICING), reason="r") for g in (Goal.PRICING, Goal.HELP)]
+        for site in ("a", "b")
+    }
+    return MatrixRunResponse(
+        goals=[Goal.PRICING, Goal.HELP],
+        overall_success_rate=50.0,
+        total_sites=2,
+        goal_summaries=[GoalSummary(goal=Goal.PRICING, success_rate=100.0, successful_sites=2, failed_sites=0),
+                        GoalSummary(goal=Goal.HELP, success_rate=0.0, successful_sites=0, failed_sites=2)],
+        rows=[MatrixRow(site_id=s, site_name=s.title(), url=f"https://{s}.com", results=c) for s, c in cells.items()],
+    )
+
+
+def test_incomplete_run_store_cannot_be_constructed():
+    """Test a backend missing part of the interface fails when created"""
+    from app.runs_store import RunStore
+
+    class PartialStore(RunStore):
+        def get(self, run_id):
+            return None
+
+    with pytest.raises(TypeError, match="abstract"):
+        PartialStore()
+
+
+def test_sqlite_store_roundtrip_survives_reopen(tmp_path):
+    """Test runs and per-site results come back intact from a reopened database"""
+    from app.runs_store import SQLiteRunStore
+    path = str(tmp_path / "runs.db")
+    store = SQLiteRunStore(path)
+    single = RunResponse(goal=Goal.HELP, overall_success_rate=100.0, total_sites=1, successful_sites=1,
+                         failed_sites=0, results=[SiteResult(site_id="t", site_name="T", url="https://t.com",
+                                                             success=True, reason="ok")])
+    store.create("r1")
+    store.create("r2")
+    store.create("r3")
+    assert store.transition("r1", "running") and store.transition("r1", "done", result=single)
+    assert store.transition("r2", "done", result=_matrix_result())
+    assert store.transition("r3", "error", error="boom")
+    store.close()
+
+    reopened = SQLiteRunStore(path)
+    assert reopened.get("r1").result == single
+    assert reopened.get("r2").result == _matrix_result()
+    assert reopened.get("r3").error == "boom"
+    assert reopened.get("nope") is None
+    assert [r.id for r in reopened.list_runs()] == ["r3", "r2", "r1"]
+    assert to_dict(reopened.get("r2"))["result"]["rows"][1]["results"][0]["site_id"] == "b"
+
+
+def test_sqlite_store_transitions_are_atomic_across_connections(tmp_path):
+    """Test only one of two workers sharing the file can claim or finish a run"""
+    from app.runs_store import SQLiteRunStore
+    path = str(tmp_path / "runs.db")
+    first, second = SQLiteRunStore(path), SQLiteRunStore(path)
+    first.create("shared")
+    assert first.transition("shared", "running") is True
+    assert second.transition("shared", "running") is False
+    assert second.transition("shared", "error", error="worker 2") is True
+    assert first.transition("shared", "done") is False
+    assert first.get("shared").status == "error"
+
+
+def test_sqlite_store_cancel_transitions(tmp_path):
+    """Test a running run can only be cancelled through "cancelling" and stays cancelled"""
+    from app.runs_store import SQLiteRunStore
+    store = SQLiteRunStore(str(tmp_path / "runs.db"))
+    store.create("r1")
+    assert store.transition("r1", "running")
+    assert store.transition("r1", "cancelled") is False
+    assert store.transition("r1", "cancelling")
+    assert store.transition("r1", "done") is False
+    assert store.transition("r1", "cancelled")
+    assert store.transition("r1", "cancelling") is False
+    assert store.status("r1") == "cancelled"
+
+
+def test_sqlite_store_indexes_status_and_created_at(tmp_path):
+    """Test list and status queries are served by indexes"""
+    import sqlite3
+    from app.runs_store import SQLiteRunStore
+    path = str(tmp_path / "runs.db")
+    SQLiteRunStore(path).close()
+    conn = sqlite3.connect(path)
+    plan = " ".join(str(r) for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM runs WHERE status = 'done' ORDER BY created_at DESC").fetchall())
+    assert "runs_status_created_at" in plan
+
+
+def test_event_log_ids_and_replay_memory():
+    """Test events get increasing ids per run and replay after a given id"""
+    from app.runs_store import MemoryRunStore
+    store = MemoryRunStore({})
+    store.create("r1")
+    store.create("r2")
+    assert store.append_event("r1", "status", {"status": "running"}).id == 1
+    assert store.append_event("r1", "site_result", {"site_id": "a"}).id == 2
+    assert store.append_event("r2", "status", {"status": "running"}).id == 1
+    assert [e.type for e in store.events_after("r1")] == ["status", "site_result"]
+    assert [e.id for e in store.events_after("r1", 1)] == [2]
+    assert store.events_after("missing") == []
+
+
+def test_sqlite_event_log_is_shared_across_connections(tmp_path):
+    """Test events written by one worker are replayed in order by another"""
+    from app.runs_store import SQLiteRunStore
+    path = str(tmp_path / "runs.db")
+    first, second = SQLiteRunStore(path), SQLiteRunStore(path)
+    first.create("r1")
+    first.append_event("r1", "status", {"status": "running"})
+    assert second.append_event("r1", "site_result", {"site_id": "a", "result": {"success": True}}).id == 2
+    events = first.events_after("r1")
+    assert [(e.id, e.type) for e in events] == [(1, "status"), (2, "site_result")]
+    assert events[1].data["result"] == {"success": True}
+    assert first.status("r1") == "pending" and first.status("missing") is None
+
+
+def test_sqlite_list_page_uses_cursor_and_goal_index(tmp_path):
+    """Test SQLite pages follow the cursor without repeats and filter by goal and status"""
+    from app.runs_store import SQLiteRunStore, InvalidCursor
+    store = SQLiteRunStore(str(tmp_path / "runs.db"))
+    for i in range(5):
+        store.create(f"r{i}", [Goal.HELP] if i % 2 == 0 else [Goal.PRICING, Goal.HELP])
+    store.transition("r1", "error", error="boom")
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.list_page(2, cursor=cursor)
+        seen += [r.id for r in page]
+        if cursor is None:
+            break
+    assert seen == ["r4", "r3", "r2", "r1", "r0"]
+    assert [r.id for r in store.list_page(10, goal=Goal.PRICING)[0]] == ["r3", "r1"]
+    assert [r.id for r in store.list_page(10, status="error", goal=Goal.PRICING)[0]] == ["r1"]
+    assert store.get("r3").goals == [Goal.PRICING, Goal.HELP]
+    with pytest.raises(InvalidCursor):
+        store.list_page(2, cursor="bm9wZQ")
+    plan = " ".join(str(r) for r in store._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM runs WHERE (created_at, rowid) < ('z', 1) ORDER BY created_at DESC, rowid DESC"))
+    assert "runs_created_at" in plan and "TEMP B-TREE" not in plan
+
+
+def _done_result(n_sites: int = 1) -> RunResponse:
+    cells = [SiteResult(site_id=f"s{i}", site_name="S", url="https://s.com", goal=Goal.HELP, success=True,
+                        reason="ok", report="# report " * 50) for i in range(n_sites)]
+    return RunResponse(goal=Goal.HELP, overall_success_rate=100.0, total_sites=n_sites, successful_sites=n_sites,
+                       failed_sites=0, results=cells)
+
+
+def test_memory_store_archives_oldest_finished_runs(tmp_path):
+    """Test runs beyond the limit are archived to disk, keep their totals and load back whole"""
+    from app.runs_store import MemoryRunStore
+    store = MemoryRunStore({}, max_runs=2, archive_dir=str(tmp_path))
+    for run_id in ("r1", "r2", "r3"):
+        store.create(run_id, [Goal.HELP])
+        store.transition(run_id, "done", result=_done_result(2))
+    store.create("pending", [Goal.HELP])
+
+    stats = store.stats()
+    assert stats["evictions"] == 2 and stats["runs_in_memory"] == 2 and stats["archived"] == 2
+    assert (tmp_path / "r1.json.gz").exists() and (tmp_path / "r2.json.gz").exists()
+    assert "r1" not in store.runs and "r1" not in store.events
+    assert store.status("r1") == "done"
+    assert store.get("r1").result == _done_result(2)
+    assert store.get("r1").goals == [Goal.HELP]
+    assert store.stats()["archive_loads"] == 2
+    page, _ = store.list_page(10, with_results=False)
+    assert [r.id for r in page] == ["pending", "r3", "r2", "r1"]
+    assert page[-1].result.results == []
+
+
+def test_memory_store_evicts_by_size_and_ttl(tmp_path):
+    """Test the byte limit and TTL archive finished runs but never unfinished ones"""
+    from app.runs_store import MemoryRunStore
+    size = len(_done_result().model_dump_json())
+    store = MemoryRunStore({}, max_bytes=int(size * 1.5), archive_dir=str(tmp_path))
+    store.create("a")
+    store.transition("a", "done", result=_done_result())
+    store.create("b")
+    store.transition("b", "error", result=_done_result(), error="boom")
+    assert store.stats()["archived"] == 1 and store.stats()["result_bytes_in_memory"] == size
+    assert store.get("a").result == _done_result()
+
+    expiring = MemoryRunStore({}, ttl_seconds=0.01, archive_dir="")
+    expiring.create("old")
+    expiring.transition("old", "done", result=_done_result())
+    expiring.create("running")
+    expiring.transition("running", "running")
+    import time
+    time.sleep(0.02)
+    assert expiring.stats()["evictions"] == 1
+    assert expiring.get("old").result.results == [] and expiring.get("running").status == "running"
+
+
+def test_memory_store_memory_and_archive_stay_bounded(tmp_path):
+    """Test evicted runs leave every in-memory structure and the archive keeps only its newest runs"""
+    from app.runs_store import MemoryRunStore
+    store = MemoryRunStore({}, max_runs=5, archive_dir=str(tmp_path), archive_max_runs=20)
+    import os
+    (tmp_path / "left-by-an-earlier-process.json.gz").write_bytes(b"")
+    old = time.time() - 8 * 24 * 3600  # past the default archive TTL
+    os.utime(tmp_path / "left-by-an-earlier-process.json.gz", (old, old))
+    for i in range(1000):
+        store.create(f"r{i}", [Goal.HELP])
+        store.transition(f"r{i}", "done", result=_done_result())
+    assert len(store.runs) == len(store._seqs) == len(store._index) == len(store._seq_of) == 5
+    assert len(store._archived) == len(store._archived_index) == 20 and not store._spilling
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(f"r{i}.json.gz" for i in range(975, 995))
+    assert store.get("r0") is None and store.get("r980").result == _done_result()
+
+    page, cursor = store.list_page(10)
+    assert [r.id for r in page] == [f"r{i}" for i in range(999, 989, -1)]
+    assert page[-1].result == _done_result()  # loaded back from the archive
+    assert len(store.list_page(100, cursor=cursor)[0]) == 15
+    assert store.stats()["archive_removals"] == 975
+
+
+def test_memory_store_writes_archives_outside_the_lock(tmp_path):
+    """Test archive files are written after the store lock is released and runs stay readable meanwhile"""
+    from unittest.mock import patch
+    from app.runs_store import MemoryRunStore, RunArchive
+    store = MemoryRunStore({}, max_runs=1, archive_dir=str(tmp_path))
+    seen = []
+    original = RunArchive.write
+
+    def write(archive, run):
+        seen.append((store._lock.locked(), store.get(run.id).result == run.result))
+        return original(archive, run)
+
+    store.create("a")
+    store.transition("a", "done", result=_done_result())
+    with patch.object(RunArchive, "write", new=write):
+        store.create("b")
+    assert seen == [(False, True)]
+
+
+def test_memory_store_archive_ttl(tmp_path):
+    """Test archived runs are forgotten and their files deleted once past the archive TTL"""
+    from app.runs_store import MemoryRunStore
+    store = MemoryRunStore({}, max_runs=1, archive_dir=str(tmp_path), archive_ttl_seconds=0.05)
+    store.create("a")
+    store.transition("a", "done", result=_done_result())
+    store.create("b")
+    assert (tmp_path / "a.json.gz").exists() and store.status("a") == "done"
+    time.sleep(0.06)
+    store.transition("b", "error", error="boom")
+    assert store.status("a") is None and not (tmp_path / "a.json.gz").exists()
+
+
+def test_memory_store_bounds_event_logs(tmp_path):
+    """Test event logs count towards the byte limit and late events for archived runs are dropped"""
+    from app.runs_store import MemoryRunStore
+    step = {"step": "x" * 1000}
+    store = MemoryRunStore({}, max_bytes=4200, archive_dir=str(tmp_path))
+    store.create("a")
+    for _ in range(4):
+        store.append_event("a", "step", step)
+    assert store.stats()["event_bytes_in_memory"] > 4000
+    store.transition("a", "done", result=_done_result())
+    store.create("b")
+    assert "a" not in store.runs and "a" not in store.events
+    assert store.stats()["event_bytes_in_memory"] == 0
+    assert store.append_event("a", "step", step) is None
+    assert store.append_event("unknown", "step", step) is None
+    assert "a" not in store.events and "unknown" not in store.events
@@ -0,0 +1,117 @@
+"""Tests for adaptive settle waits"""
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from app.settle import settle, pause, _QUIESCENCE_JS
+
+
+def _page(url="https://example.com/"):
+    page = Mock()
+    page.url = url
+    page.evaluate = AsyncMock(return_value=5)
+    page.wait_for_load_state = AsyncMock()
+    return page
+
+
+@pytest.mark.asyncio
+async def test_settle_none_does_not_wait():
+    """Test the none strategy returns immediately"""
+    page = _page()
+    assert await settle(page, page.url, 600, strategy="none") == 0
+    page.evaluate.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_settle_fixed_sleeps_and_can_be_interrupted():
+    """Test fixed strategy sleeps but stops when interrupted"""
+    page = _page()
+    waited = await settle(page, page.url, 50, strategy="fixed")
+    assert waited >= 45
+
+    interrupt = asyncio.Event()
+    asyncio.get_running_loop().call_later(0.02, interrupt.set)
+    started = time.monotonic()
+    await settle(page, page.url, 2000, interrupt=interrupt, strategy="fixed")
+    assert time.monotonic() - started < 1.0
+
+
+@pytest.mark.asyncio
+async def test_settle_adaptive_waits_for_load_after_navigation():
+    """Test a URL change waits for the load state instead of DOM quiescence"""
+    page = _page("https://example.com/pricing")
+    await settle(page, "https://example.com/", 600, strategy="adaptive")
+    page.wait_for_load_state.assert_awaited_once()
+    assert page.wait_for_load_state.await_args.args[0] == "domcontentloaded"
+    page.evaluate.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_settle_adaptive_waits_for_dom_quiescence():
+    """Test same-URL actions wait for mutation quiescence in the page"""
+    page = _page()
+    await settle(page, page.url, 600, strategy="adaptive")
+    page.evaluate.assert_awaited_once()
+    assert "quietMs" in page.evaluate.await_args.args[1]
+    page.wait_for_load_state.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_settle_adaptive_handles_navigation_during_quiescence():
+    """Test a navigation that destroys the evaluate context falls back to the load state"""
+    page = _page()
+
+    async def navigating_evaluate(*args, **kwargs):
+        page.url = "https://example.com/next"
+        raise Exception("Execution context was destroyed")
+
+    page.evaluate = AsyncMock(side_effect=navigating_evaluate)
+    await settle(page, "https://example.com/", 600, strategy="adaptive")
+    page.wait_for_load_state.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_settle_adaptive_is_capped():
+    """Test a page that never settles is abandoned at the timeout"""
+    page = _page()
+
+    async def never(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    page.evaluate = AsyncMock(side_effect=never)
+    with patch('app.settle.SETTLE_TIMEOUT_MS', 100):
+        waited = await settle(page, page.url, 600, strategy="adaptive")
+    assert 90 <= waited < 1000
+
+
+@pytest.mark.asyncio
+async def test_settle_adaptive_default_cap_is_fixed_wait():
+    """Test without a configured cap a busy page is waited on no longer than the fixed strategy would"""
+    page = _page()
+
+    async def never(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    page.evaluate = AsyncMock(side_effect=never)
+    with patch('app.settle.SETTLE_TIMEOUT_MS', 0):
+        waited = await settle(page, page.url, 150, strategy="adaptive")
+    assert 140 <= waited < 500
+    assert page.evaluate.await_args.args[1]["timeoutMs"] <= 150
+
+
+def test_quiescence_ignores_attribute_and_text_churn():
+    """Test only added or removed nodes count as DOM activity"""
+    assert "childList: true" in _QUIESCENCE_JS
+    assert "attributes" not in _QUIESCENCE_JS.split("observer.observe")[1].split(";")[0]
+    assert "characterData" not in _QUIESCENCE_JS
+
+
+@pytest.mark.asyncio
+async def test_pause_only_for_fixed_strategy():
+    """Test cosmetic pre-action pauses are skipped outside the fixed strategy"""
+    started = time.monotonic()
+    await pause(500, strategy="adaptive")
+    assert time.monotonic() - started < 0.1
+    started = time.monotonic()
+    await pause(30, strategy="fixed")
+    assert time.monotonic() - started >= 0.025
@@ -18,3 +18,9 @@ def test_get_success_urls_all_goals():
     for goal in Goal:
         urls = get_success_urls("test-site", goal)
         assert isinstance(urls, list)
+
+
+def test_get_success_url_set():
+    """Test the precompiled success URL set for an unknown site is empty"""
+    from app.success_config import get_success_url_set
+    assert get_success_url_set("test-site", Goal.PRICING) == frozenset()
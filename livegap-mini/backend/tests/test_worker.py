@@ -0,0 +1,88 @@
+"""Tests for the standalone queue worker"""
+import pytest
+from unittest.mock import patch
+from app.job_queue import Job, SQLiteJobQueue
+from app.models import Goal, SiteResult
+from app.runner import Site
+from app.worker import run_worker
+
+
+SITES = [Site(id="a", name="A", url="https://a.com"), Site(id="b", name="B", url="https://b.com")]
+
+
+def _result(site: Site, goal: Goal) -> SiteResult:
+    return SiteResult(site_id=site.id, site_name=site.name, url=site.url, goal=goal, success=True, reason="ok")
+
+
+@pytest.mark.asyncio
+async def test_worker_drains_queue(tmp_path):
+    """Test the worker runs single-goal and matrix jobs and reports results"""
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue([
+        Job(id="j1", run_id="r1", site_id="a", goals=[Goal.PRICING]),
+        Job(id="j2", run_id="r1", site_id="b", goals=[Goal.PRICING, Goal.HELP]),
+    ])
+
+    async def single(site, goal, video=None):
+        return _result(site, goal)
+
+    async def matrix(site, goals, video=None):
+        return [_result(site, g) for g in goals]
+
+    with patch('app.worker.load_sites', return_value=SITES), \
+         patch('app.worker.run_llm_agent_on_site', side_effect=single) as mock_single, \
+         patch('app.worker.run_llm_agent_matrix_on_site', side_effect=matrix) as mock_matrix, \
+         patch('app.worker.start_browser_pool'), \
+         patch('app.worker.stop_browser_pool') as mock_stop, \
+         patch('app.worker.aclose_http_client'):
+        await run_worker(queue, worker_id="w1", concurrency=2, exit_when_idle=True)
+
+    assert mock_single.call_count == 1
+    assert mock_matrix.call_count == 1
+    mock_stop.assert_called_once()
+    jobs = {j.id: j for j in queue.jobs_for_run("r1")}
+    assert jobs["j1"].status == "done" and len(jobs["j1"].results) == 1
+    assert [r.goal for r in jobs["j2"].results] == [Goal.PRICING, Goal.HELP]
+
+
+@pytest.mark.asyncio
+async def test_worker_reports_unknown_site(tmp_path):
+    """Test a job for a site missing from the worker's config fails instead of hanging"""
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), max_attempts=1)
+    queue.enqueue([Job(id="j1", run_id="r1", site_id="missing", goals=[Goal.HELP])])
+    with patch('app.worker.load_sites', return_value=SITES), \
+         patch('app.worker.start_browser_pool'), \
+         patch('app.worker.stop_browser_pool'), \
+         patch('app.worker.aclose_http_client'):
+        await run_worker(queue, worker_id="w1", exit_when_idle=True)
+    job = queue.jobs_for_run("r1")[0]
+    assert job.status == "failed"
+    assert "Unknown site_id" in job.error
+
+
+@pytest.mark.asyncio
+async def test_worker_stops_job_of_cancelled_run(tmp_path):
+    """Test a running job is stopped once its run is cancelled and its lease is refused"""
+    import asyncio
+    from app import worker
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue([Job(id="j1", run_id="r1", site_id="a", goals=[Goal.HELP])])
+    job = queue.lease("w1")
+    stopped = asyncio.Event()
+
+    async def slow(site, goal, video=None):
+        try:
+            await asyncio.sleep(30)
+        finally:
+            stopped.set()
+
+    with patch('app.worker.load_sites', return_value=SITES), \
+         patch('app.worker.run_llm_agent_on_site', side_effect=slow), \
+         patch.object(worker, 'JOB_HEARTBEAT_SECONDS', 0.02):
+        handling = asyncio.create_task(worker._handle_job(queue, job, "w1"))
+        await asyncio.sleep(0.05)
+        assert queue.cancel_run("r1", "Run cancelled") == 1
+        await asyncio.wait_for(handling, timeout=2)
+    assert stopped.is_set()
+    stored = queue.jobs_for_run("r1")[0]
+    assert stored.status == "cancelled" and stored.error == "Run cancelled"
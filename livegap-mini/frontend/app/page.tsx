@@ -55,7 +55,7 @@ type TestRun = {
   results: SiteResult[];
   // For background job tracking
   runId?: string; // Backend run_id
-  status?: "pending" | "running" | "done" | "error"; // Job status
+  status?: "pending" | "running" | "cancelling" | "done" | "error" | "cancelled"; // Job status
 };
 
 const GOAL_SHORT: Record<Goal, string> = {
@@ -98,33 +98,70 @@ export default function HomePage() {
     } catch (_) {}
   }, [testRuns]);
 
-  // Poll for run status updates
+  // Apply a /run/{id} payload (status, and results once done) to the local run
+  function applyRunStatus(localId: string, data: { status: TestRun["status"]; result?: RunResponse }) {
+    setTestRuns(prev => prev.map(r => {
+      if (r.id !== localId) return r;
+
+      // Update status
+      const updated = { ...r, status: data.status };
+
+      // If done (or cancelled with partial results), populate results
+      if ((data.status === "done" || data.status === "cancelled") && data.result) {
+        updated.overallSuccessRate = data.result.overall_success_rate;
+        updated.results = data.result.results;
+      }
+
+      return updated;
+    }));
+  }
+
+  async function fetchRunStatus(run: TestRun) {
+    const res = await fetch(`${API_BASE}/run/${run.runId}`);
+    if (!res.ok) return;
+    applyRunStatus(run.id, await res.json());
+  }
+
+  // Only (re)subscribe when the set of unfinished runs changes, not on every result
+  const activeRunsKey = testRuns
+    .filter(r => r.runId && (r.status === "pending" || r.status === "running" || r.status === "cancelling"))
+    .map(r => `${r.id}|${r.runId}`)
+    .join(",");
+
+  // Live run updates: server-sent events, polling where EventSource is unavailable
   useEffect(() => {
-    const runsToCheck = testRuns.filter(r => r.status === "pending" || r.status === "running");
+    const runsToCheck = testRuns.filter(r => activeRunsKey.split(",").includes(`${r.id}|${r.runId}`));
     if (!runsToCheck.length) return;
 
+    if (typeof EventSource !== "undefined") {
+      const sources = runsToCheck.map(run => {
+        const source = new EventSource(`${API_BASE}/run/${run.runId}/events`);
+        source.addEventListener("site_result", (e) => {
+          const { result } = JSON.parse((e as MessageEvent).data) as { result: SiteResult };
+          setTestRuns(prev => prev.map(r => r.id !== run.id ? r : {
+            ...r,
+            status: "running",
+            results: [...r.results.filter(x => x.site_id !== result.site_id), result],
+          }));
+        });
+        source.addEventListener("status", (e) => {
+          const { status } = JSON.parse((e as MessageEvent).data) as { status: TestRun["status"] };
+          if (status === "done" || status === "error" || status === "cancelled") {
+            source.close();
+            fetchRunStatus(run).catch(err => console.error(`Failed to load run ${run.runId}:`, err));
+          } else {
+            setTestRuns(prev => prev.map(r => r.id === run.id ? { ...r, status } : r));
+          }
+        });
+        return source;
+      });
+      return () => sources.forEach(s => s.close());
+    }
+
     const interval = setInterval(async () => {
       for (const run of runsToCheck) {
-        if (!run.runId) continue;
         try {
-          const res = await fetch(`${API_BASE}/run/${run.runId}`);
-          if (!res.ok) continue;
-          const data = await res.json();
-          
-          setTestRuns(prev => prev.map(r => {
-            if (r.id !== run.id) return r;
-            
-            // Update status
-            const updated = { ...r, status: data.status };
-            
-            // If done, populate results
-            if (data.status === "done" && data.result) {
-              updated.overallSuccessRate = data.result.overall_success_rate;
-              updated.results = data.result.results;
-            }
-            
-            return updated;
-          }));
+          await fetchRunStatus(run);
         } catch (e) {
           console.error(`Failed to poll run ${run.runId}:`, e);
         }
@@ -132,7 +169,8 @@ export default function HomePage() {
     }, 3000); // Poll every 3 seconds
 
     return () => clearInterval(interval);
-  }, [testRuns]);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [activeRunsKey]);
 
   // Auto-select newest run if none selected
   useEffect(() => {
@@ -154,10 +192,21 @@ export default function HomePage() {
     setVideoUrl(null);
   }
 
-  function openReport(r: SiteResult) {
+  // Reports are rendered by the backend on request; older stored runs still carry theirs inline
+  async function openReport(r: SiteResult, run: TestRun) {
     if (r.report) {
       setReportText(r.report);
       setReportSiteName(r.site_name);
+      return;
+    }
+    if (!run.runId) return;
+    try {
+      const res = await fetch(`${API_BASE}/run/${run.runId}/report/${encodeURIComponent(r.site_id)}`);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      setReportText(await res.text());
+      setReportSiteName(r.site_name);
+    } catch (e) {
+      console.error(`Failed to load report for ${r.site_id}:`, e);
     }
   }
   function closeReport() {
@@ -165,6 +214,18 @@ export default function HomePage() {
     setReportSiteName(null);
   }
 
+  // Finished sites keep their results; the run moves to "cancelled" once its agents stop
+  async function cancelRun(run: TestRun) {
+    if (!run.runId) return;
+    try {
+      const res = await fetch(`${API_BASE}/run/${run.runId}/cancel`, { method: "POST" });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      setTestRuns(prev => prev.map(r => r.id === run.id ? { ...r, status: "cancelling" } : r));
+    } catch (e) {
+      console.error(`Failed to cancel run ${run.runId}:`, e);
+    }
+  }
+
   async function createAndRunTest() {
     if (!newTestName.trim()) {
       setError("Test name required");
@@ -307,6 +368,20 @@ export default function HomePage() {
                       <span className="text-xs text-blue-400 font-medium">
                         {activeRun.status === "pending" ? "Queued..." : "Running test..."}
                       </span>
+                      <button
+                        onClick={() => cancelRun(activeRun)}
+                        className="text-xs text-slate-400 hover:text-red-400 underline-offset-2 hover:underline"
+                      >
+                        Cancel
+                      </button>
+                    </div>
+                  )}
+                  {(activeRun.status === "cancelling" || activeRun.status === "cancelled") && (
+                    <div className="flex items-center gap-2">
+                      <div className={`h-2 w-2 rounded-full bg-slate-500 ${activeRun.status === "cancelling" ? "animate-pulse" : ""}`} />
+                      <span className="text-xs text-slate-400 font-medium">
+                        {activeRun.status === "cancelling" ? "Cancelling..." : "Test cancelled"}
+                      </span>
                     </div>
                   )}
                   {activeRun.status === "error" && (
@@ -319,7 +394,7 @@ export default function HomePage() {
                 <div className="flex items-center gap-4">
                   {(() => {
                     // Show placeholder while loading
-                    if (activeRun.status === "pending" || activeRun.status === "running") {
+                    if (activeRun.status === "pending" || activeRun.status === "running" || activeRun.status === "cancelling") {
                       return (
                         <div className="rounded-xl border border-slate-700 bg-slate-800/30 px-6 py-4 text-center">
                           <p className="text-4xl font-semibold leading-none text-slate-500">—</p>
@@ -391,14 +466,14 @@ export default function HomePage() {
                                       className="rounded-md border border-slate-700 px-2 py-1 hover:border-slate-500 hover:bg-slate-800/60"
                                     >Video</button>
                                   )}
-                                  {r.report && (
+                                  {(r.report || activeRun.runId) && (
                                     <button
                                       type="button"
-                                      onClick={() => openReport(r)}
+                                      onClick={() => openReport(r, activeRun)}
                                       className="rounded-md border border-slate-700 px-2 py-1 hover:border-slate-500 hover:bg-slate-800/60"
                                     >Report</button>
                                   )}
-                                  {!r.video_url && !r.report && <span className="text-slate-600">—</span>}
+                                  {!r.video_url && !r.report && !activeRun.runId && <span className="text-slate-600">—</span>}
                                 </div>
                               </td>
                             </tr>